@@ -1,8 +1,6 @@
-from emoji import emojize
-
 __version__ = "2.4.12"
 __description__ = "Quickly Arrange,Quickly Test!"
-__image__ = emojize(fr"""
+_IMAGE = fr"""
               :----.                                                             ::::
              .------            .:::::::::::::::::::::::::::::::::::::::::::::. :---:  ::::::::::::::::::::::::::
             .---::--:                                                           ----
@@ -16,4 +14,13 @@ __image__ = emojize(fr"""
            .
                                                                                     {__description__}:rocket::rocket::rocket:
                                                                                     version:{__version__}
-""")
+"""
+
+
+def __getattr__(name):
+    # 启动图标在首次访问时才渲染，import aomaker不再加载emoji
+    if name == "__image__":
+        from emoji import emojize
+        image = globals()["__image__"] = emojize(_IMAGE)
+        return image
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,8 @@
 # --coding:utf-8--
 import os
+import asyncio
+import inspect
+import weakref
 import importlib
 from types import NoneType
 from typing import List, Dict, Callable, Text, Tuple, Union, Optional
@@ -8,15 +11,17 @@ from dataclasses import dataclass as dc, field
 
 import yaml
 import click
-from jsonpath import jsonpath
 from genson import SchemaBuilder
 
 from aomaker.cache import cache
+from aomaker._jsonpath import jsonpath
+from aomaker._compare import compare
 from aomaker.log import logger
 from aomaker.path import BASEDIR
 from aomaker.exceptions import FileNotFound, YamlKeyError, JsonPathExtractFailed, CompareException
 from aomaker.hook_manager import cli_hook, session_hook
 from aomaker.models import ExecuteAsyncJobCondition
+from aomaker.extension.polling import Poller
 
 
 # def dependence(dependent_api: Callable or str, var_name: Text, imp_module=None, *out_args, **out_kwargs):
@@ -79,24 +84,46 @@ def dependence(dependent_api: Callable or str, var_name: Text, require: bool = F
     """
 
     def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            api_name = func.__name__
-            imp_module = func.__module__
+        api_name = func.__name__
+        imp_module = func.__module__
+
+        def get_dependent_param(kwargs):
+            """返回依赖接口的调用参数，None表示无需调用依赖接口"""
             try:
                 dependent_param = kwargs['dependence'][var_name] if require else dict()
             except KeyError:
                 logger.info(f"==========<{api_name}>前置依赖{var_name}方法未传入依赖参数跳过执行==========")
-                r = func(*args, **kwargs)
-                return r
+                return None
             if not cache.get(var_name) or refresh:
+                return dependent_param
+            logger.info(
+                f"==========<{api_name}>前置依赖已被调用过，本次不再调用,依赖参数{var_name}直接从cache表中读取==========")
+            return None
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                # 并发执行的协程共用一把锁，同一个依赖只调用一次
+                async with _get_dependence_lock(var_name):
+                    dependent_param = get_dependent_param(kwargs)
+                    if dependent_param is not None:
+                        dependence_res, depend_api_info = _call_dependence(dependent_api, api_name, imp_module,
+                                                                           *out_args, **dependent_param)
+                        if inspect.isawaitable(dependence_res):
+                            await dependence_res
+                        logger.info(f"==========<{api_name}>前置依赖<{depend_api_info.get('name')}>结束==========")
+                return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            dependent_param = get_dependent_param(kwargs)
+            if dependent_param is not None:
                 dependence_res, depend_api_info = _call_dependence(dependent_api, api_name, imp_module,
                                                                    *out_args, **dependent_param)
                 depend_api_name = depend_api_info.get("name")
                 logger.info(f"==========<{api_name}>前置依赖<{depend_api_name}>结束==========")
-            else:
-                logger.info(
-                    f"==========<{api_name}>前置依赖已被调用过，本次不再调用,依赖参数{var_name}直接从cache表中读取==========")
 
             r = func(*args, **kwargs)
             return r
@@ -106,6 +133,18 @@ def dependence(dependent_api: Callable or str, var_name: Text, require: bool = F
     return decorator
 
 
+# key: 事件循环，value: {var_name: asyncio.Lock}，asyncio.Lock不能跨事件循环使用
+_dependence_locks = weakref.WeakKeyDictionary()
+
+
+def _get_dependence_lock(var_name: Text) -> asyncio.Lock:
+    locks = _dependence_locks.setdefault(asyncio.get_running_loop(), {})
+    lock = locks.get(var_name)
+    if lock is None:
+        lock = locks[var_name] = asyncio.Lock()
+    return lock
+
+
 def be_dependence(var_name: Text, condition: Union[Dict, bool], jsonpath_expr: str = ""):
     """
     标明此接口被其他接口所依赖，会将其响应结果存储，key为var_name
@@ -116,9 +155,7 @@ def be_dependence(var_name: Text, condition: Union[Dict, bool], jsonpath_expr: s
     """
 
     def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            resp = func(*args, **kwargs)
+        def save_response(args, resp):
             is_execute = _is_execute_cycle_func(resp, condition=condition)
             api_name = func.__name__
             if is_execute:
@@ -139,6 +176,20 @@ def be_dependence(var_name: Text, condition: Union[Dict, bool], jsonpath_expr: s
             else:
                 logger.info(
                     f"==========<{api_name}>已被调用，但响应结果不满足传入条件,不对{var_name}进行存储==========")
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                resp = await func(*args, **kwargs)
+                save_response(args, resp)
+                return resp
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            resp = func(*args, **kwargs)
+            save_response(args, resp)
             return resp
 
         return wrapper
@@ -154,7 +205,7 @@ def async_api(cycle_func: Callable, jsonpath_expr: Union[Text, List], expr_index
     目标接口请求完成后，根据jsonpath表达式从其响应结果中提取异步任务id，
     然后将异步任务id传给轮询函数
 
-    :param cycle_func: 轮询函数
+    :param cycle_func: 轮询函数；传入Poller时，多个任务id（expr_index=":"）会并发轮询
     :param jsonpath_expr: 异步任务id提取表达式
     :param expr_index: jsonpath提取索引，默认为0; 传入':'，获取整个list
     :param condition: 是否执行轮询函数的条件，默认执行。如果传了condition，那么当满足condition时执行cycle_func，不满足不执行。
@@ -170,27 +221,53 @@ def async_api(cycle_func: Callable, jsonpath_expr: Union[Text, List], expr_index
     """
 
     def decorator(func):
+        def get_job_id(resp):
+            """返回异步任务id，None表示不执行轮询函数"""
+            is_execute = _is_execute_cycle_func(resp, condition=condition)
+            if not is_execute:
+                logger.info(f"==========后置异步接口不满足执行条件，不执行<{func.__name__}>==========")
+                return None
+            job_id = _handle_jsonpath_extract(resp, jsonpath_expr, expr_index=expr_index)
+            if job_id is None:
+                if condition is None:
+                    raise JsonPathExtractFailed(res=resp, jsonpath_expr=jsonpath_expr)
+                return None
+            logger.info(
+                f"==========后置异步接口断言开始<{func.__name__}>: 轮询函数<{cycle_func.__name__}>==========")
+            return job_id
+
+        def merge_async_res(resp, async_res):
+            resp.setdefault("async_res", [])
+            if async_res:
+                async_res_list = async_res if isinstance(async_res, list) else [async_res]
+                resp["async_res"].extend(async_res_list)
+            logger.info(f"==========后置异步接口断言结束<{func.__name__}>==========")
+
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                resp = await func(*args, **kwargs)
+                job_id = get_job_id(resp)
+                if job_id is not None:
+                    # 轮询函数可以是普通函数，也可以是协程函数；Poller在当前事件循环上轮询，不阻塞其它用例
+                    if isinstance(cycle_func, Poller):
+                        async_res = await cycle_func.apoll(job_id, *out_args, **out_kwargs)
+                    else:
+                        async_res = cycle_func(job_id, *out_args, **out_kwargs)
+                    if inspect.isawaitable(async_res):
+                        async_res = await async_res
+                    merge_async_res(resp, async_res)
+                return resp
+
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args, **kwargs):
             resp = func(*args, **kwargs)
-            is_execute = _is_execute_cycle_func(resp, condition=condition)
-            if is_execute:
-                job_id = _handle_jsonpath_extract(resp, jsonpath_expr, expr_index=expr_index)
-                if job_id is None:
-                    if condition is None:
-                        raise JsonPathExtractFailed(res=resp, jsonpath_expr=jsonpath_expr)
-                    return resp
-
-                logger.info(
-                    f"==========后置异步接口断言开始<{func.__name__}>: 轮询函数<{cycle_func.__name__}>==========")
+            job_id = get_job_id(resp)
+            if job_id is not None:
                 async_res = cycle_func(job_id, *out_args, **out_kwargs)
-                resp.setdefault("async_res", [])
-                if async_res:
-                    async_res_list = async_res if isinstance(async_res, list) else [async_res]
-                    resp["async_res"].extend(async_res_list)
-                logger.info(f"==========后置异步接口断言结束<{func.__name__}>==========")
-            else:
-                logger.info(f"==========后置异步接口不满足执行条件，不执行<{func.__name__}>==========")
+                merge_async_res(resp, async_res)
             return resp
 
         return wrapper
@@ -496,76 +573,29 @@ def kwargs_handle(cls):
 #         print(assert_exception_detail)
 #     return assert_exception_detail if len(assert_exception_detail) > 0 else None  # 若有异常则返回异常详情，否则返回空
 
-def sort(data: list):
-    if len(data) > 0:
-        if isinstance(data[0], dict):
-            return sorted(data, key=lambda x: ':'.join(
-                f"{k}:{v}" for k, v in sorted(x.items())))  # 用list里的dict按键排序然后使用整个dict的键值对组成一个唯一key
-        elif isinstance(data[0], list):
-            return sorted([sort(data) for data in data], key=lambda x: str(x))
-        else:
-            return sorted(data, key=lambda x: str(x))
-    else:
-        return data
-
-
 def compare_two_dict(expectedDict: dict, aimDict: dict, skip_key=None) -> Optional[dict]:
     """
     朴实无华的匹配算法
     :param expectedDict: 预期结果
     :param aimDict: 实际结果
     :param skip_key: 跳过指定key的对比
-    :return: 若匹配异常则返回assert_exception_detail失败详情，否则返回None
+    :return: 若匹配异常则返回assert_exception_detail失败详情，否则返回None；
+             reason/excepted/real_result为第一处差异，mismatches为全部差异
     """
-    if skip_key is None:
-        skip_key = []
-    assert_exception_detail = dict()
     # 检查数据类型是否相同
     if type(aimDict) != type(expectedDict):
         raise CompareException(
             f"传入类型与预期不符，预期为:【{type(expectedDict).__name__}】, 实际为:【{type(aimDict).__name__}】")
-    try:
-        if isinstance(expectedDict, dict):
-            for k, v in expectedDict.items():  # 比较字典
-                if k in skip_key:  # 跳过指定key的对比
-                    continue
-                if k not in aimDict:  # 实际值缺少这个key直接结束匹配
-                    raise CompareException(f'缺少key:【{k}】', k, "not found key")
-                else:
-                    if isinstance(v, dict):  # v为字典时进入此逻辑
-                        tmp = compare_two_dict(v, aimDict[k], skip_key)
-                        if tmp is not None:
-                            raise CompareException(tmp["reason"], tmp["excepted"], tmp["real_result"])
-                    elif isinstance(v, list):  # v为列表时进入此逻辑
-                        if not isinstance(aimDict[k], list):
-                            raise CompareException(f'【{k}】值类型有误', str(type(v)), str(type(aimDict[k])))
-                        # expected_sorted = sorted(v, key=lambda x: str(x) if isinstance(x, dict) or isinstance(x, list) else x)  # 对列表进行排序，忽略顺序
-                        # actual_sorted = sorted(aimDict[k], key=lambda x: str(x) if isinstance(x, dict) or isinstance(x, list) else x)  # 对列表进行排序，忽略顺序
-                        expected_sorted = sort(v)  # 对列表进行排序，忽略顺序
-                        actual_sorted = sort(aimDict[k])  # 对列表进行排序，忽略顺序
-                        if len(expected_sorted) != len(actual_sorted):  # 对比长度
-                            raise CompareException(f'【{k}】值数组长度有误', str(len(expected_sorted)),
-                                                   str(len(actual_sorted)))
-                        for ev, av in zip(expected_sorted, actual_sorted):
-                            if isinstance(ev, dict):
-                                tmp = compare_two_dict(ev, av, skip_key)
-                                if tmp is not None:
-                                    raise CompareException(tmp["reason"], tmp["excepted"], tmp["real_result"])
-                            else:  # 非dict正常一对一匹配
-                                if ev != av:
-                                    raise CompareException(f'【{k}】值有误', str(ev), str(av))
-                    else:  # 直接比较值
-                        if v != aimDict[k]:
-                            raise CompareException(f'【{k}】值有误', str(v), str(aimDict[k]))
-        else:  # 对于基本数据类型，直接比较
-            if expectedDict != aimDict:
-                raise CompareException('值不匹配', str(expectedDict), str(aimDict))
-    except CompareException as e:
-        reason, excepted, real_result = e.args  # 记录失败对reason、预期值、实际值
-        assert_exception_detail['reason'] = reason
-        assert_exception_detail['excepted'] = excepted
-        assert_exception_detail['real_result'] = real_result
-    return assert_exception_detail if assert_exception_detail else None  # 若有异常则返回异常详情，否则返回空
+    mismatches = compare(expectedDict, aimDict, skip_key)
+    if not mismatches:
+        return None
+    first = mismatches[0]
+    return {
+        'reason': first['reason'],
+        'excepted': first['excepted'],
+        'real_result': first['real_result'],
+        'mismatches': mismatches
+    }
 
 
 if __name__ == '__main__':
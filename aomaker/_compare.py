@@ -0,0 +1,238 @@
+# --coding:utf-8--
+"""
+响应结果对比
+与compare_two_dict原有语义一致：预期dict中的key（skip_key除外）必须都存在于实际结果中，多余的key忽略；列表忽略顺序。
+列表不再排序后逐个对比，而是按多重集合匹配：
+    1.预期元素按结构（各层dict的key）分组，实际元素按同一结构投影为规范形式（可hash，每个元素只计算一次）
+    2.规范形式相同的元素直接配对，整体O(n)
+    3.剩余未配对的元素逐个详细对比，尽量找到能匹配上的元素，否则与差异最少的元素配对并记录差异
+返回全部差异，而不是遇到第一个差异就结束
+"""
+from collections import defaultdict, deque
+from typing import Callable, Dict, List, Sequence
+
+# 剩余未配对元素逐个详细对比的最大对比次数，超过后按顺序配对，避免大量差异时退化为O(n²)
+PAIRWISE_MATCH_LIMIT = 10000
+
+_SCALAR = "scalar"
+_FULL = None
+_CONTAINER = (dict, list)
+
+
+class _ShapeMismatch(Exception):
+    """预期元素与当前分组的结构不一致"""
+
+
+def _mismatch(path: str, reason: str, excepted, real_result) -> dict:
+    return {"path": path, "reason": reason, "excepted": excepted, "real_result": real_result}
+
+
+def _multiset(items) -> tuple:
+    """
+    列表的规范形式：按hash排序后的元组，相等的元素hash相同，因此元素相同的列表结果相等；
+    不同元素hash冲突时可能误判为不相等，由后续的逐个详细对比兜底
+    """
+    return tuple(sorted(items, key=hash))
+
+
+class _Comparator:
+
+    def __init__(self, skip_key: Sequence):
+        self.skip_key = set(skip_key or ())
+        # key: (结构, 是否严格)，value: 投影函数
+        self._projectors: Dict[tuple, Callable] = {}
+
+    # ---------- 规范形式 ----------
+
+    def shape(self, expected):
+        """预期数据的结构：dict为(key, 结构)集合，list为元素结构（元素结构不一致时不投影），标量为_SCALAR"""
+        if isinstance(expected, dict):
+            skip_key = self.skip_key
+            return "dict", frozenset([(k, self.shape(v) if isinstance(v, _CONTAINER) else _SCALAR)
+                                      for k, v in expected.items() if k not in skip_key])
+        if isinstance(expected, list):
+            shapes = {self.shape(item) if isinstance(item, _CONTAINER) else _SCALAR for item in expected}
+            return "list", shapes.pop() if len(shapes) == 1 else _FULL
+        return _SCALAR
+
+    def projector(self, shape, strict: bool = False) -> Callable:
+        """
+        按结构生成投影函数（按结构缓存），数据投影后的规范形式相等即对比无差异
+        strict=False用于实际数据：缺少结构中的key或类型不符时返回唯一对象，不与任何预期元素相等
+        strict=True用于预期数据：数据结构与shape不完全一致时抛出_ShapeMismatch，由调用方重新计算结构
+        """
+        cache_key = (shape, strict)
+        func = self._projectors.get(cache_key)
+        if func is not None:
+            return func
+        if shape is _FULL or shape is _SCALAR:
+            func = self._full_canon
+        elif shape[0] == "dict":
+            # 标量字段直接取值，不再调用投影函数
+            subs = [(k, None if s is _SCALAR else self.projector(s, strict)) for k, s in shape[1]]
+            size = len(subs)
+            skip_key = self.skip_key
+
+            def func(data):
+                if not isinstance(data, dict):
+                    if strict:
+                        raise _ShapeMismatch
+                    return object()
+                if strict and len(data) != size and len(data) != size + sum(1 for k in skip_key if k in data):
+                    raise _ShapeMismatch
+                try:
+                    return tuple([data[k] if p is None else p(data[k]) for k, p in subs])
+                except KeyError:
+                    if strict:
+                        raise _ShapeMismatch
+                    return object()
+        else:
+            sub = shape[1]
+            p = None if sub is _SCALAR else self.projector(sub, strict)
+
+            def func(data):
+                if not isinstance(data, list):
+                    if strict:
+                        raise _ShapeMismatch
+                    return object()
+                return _multiset(data if p is None else map(p, data))
+        self._projectors[cache_key] = func
+        return func
+
+    def _full_canon(self, data):
+        if isinstance(data, dict):
+            return frozenset((k, self._full_canon(v)) for k, v in data.items() if k not in self.skip_key)
+        if isinstance(data, list):
+            return _multiset(map(self._full_canon, data))
+        return data
+
+    @staticmethod
+    def _project_actual(func, data):
+        """投影结果中含不可hash的值（如预期为标量、实际为dict）时视为不匹配"""
+        try:
+            key = func(data)
+            hash(key)
+        except TypeError:
+            return object()
+        return key
+
+    def _project_expected(self, data, current):
+        """
+        预期元素优先按上一个元素的结构投影，结构不一致时重新计算结构
+        :return: (结构, 严格投影函数), 规范形式
+        """
+        if current is not None:
+            try:
+                key = current[1](data)
+                hash(key)
+                return current, key
+            except (_ShapeMismatch, TypeError):
+                pass
+        shape = self.shape(data)
+        current = shape, self.projector(shape, strict=True)
+        try:
+            key = current[1](data)
+            hash(key)
+        except (_ShapeMismatch, TypeError):
+            key = object()
+        return current, key
+
+    # ---------- 详细对比 ----------
+
+    def diff(self, expected, actual, path: str, label, out: List[dict]):
+        if isinstance(expected, dict):
+            if not isinstance(actual, dict):
+                out.append(_mismatch(path, f'【{label}】值类型有误', str(type(expected)), str(type(actual))))
+                return
+            for k, v in expected.items():
+                if k in self.skip_key:
+                    continue
+                if k not in actual:
+                    out.append(_mismatch(f"{path}.{k}", f'缺少key:【{k}】', k, "not found key"))
+                else:
+                    self.diff(v, actual[k], f"{path}.{k}", k, out)
+        elif isinstance(expected, list):
+            if not isinstance(actual, list):
+                out.append(_mismatch(path, f'【{label}】值类型有误', str(type(expected)), str(type(actual))))
+                return
+            self.diff_list(expected, actual, path, label, out)
+        elif expected != actual:
+            out.append(_mismatch(path, f'【{label}】值有误', str(expected), str(actual)))
+
+    def diff_list(self, expected: list, actual: list, path: str, label, out: List[dict]):
+        if len(expected) != len(actual):
+            out.append(_mismatch(path, f'【{label}】值数组长度有误', str(len(expected)), str(len(actual))))
+        elif expected == actual:
+            return
+
+        # 1.预期元素按结构分组，实际元素按同一结构投影，规范形式相同的元素直接配对
+        groups: Dict[object, List[tuple]] = defaultdict(list)
+        current = None
+        for i, item in enumerate(expected):
+            current, key = self._project_expected(item, current)
+            groups[current[0]].append((i, key))
+        unmatched_actual = set(range(len(actual)))
+        unmatched_expected = []
+        for shape, keys in groups.items():
+            project = self.projector(shape)
+            pool = defaultdict(deque)
+            for j in sorted(unmatched_actual):
+                pool[self._project_actual(project, actual[j])].append(j)
+            for i, key in keys:
+                candidates = pool.get(key)
+                if candidates:
+                    unmatched_actual.discard(candidates.popleft())
+                else:
+                    unmatched_expected.append(i)
+        if not unmatched_expected and not unmatched_actual:
+            return
+
+        # 2.剩余元素逐个详细对比：先找完全匹配的元素，再与差异最少的元素配对
+        unmatched_expected.sort()
+        remaining = sorted(unmatched_actual)
+        exhaustive = len(unmatched_expected) * len(remaining) <= PAIRWISE_MATCH_LIMIT
+        diffs = {}
+        pending = []
+        for i in unmatched_expected:
+            found = None
+            if exhaustive:
+                for j in remaining:
+                    tmp = diffs[i, j] = []
+                    self.diff(expected[i], actual[j], f"{path}[{i}]", label, tmp)
+                    if not tmp:
+                        found = j
+                        break
+            if found is None:
+                pending.append(i)
+            else:
+                remaining.remove(found)
+        for i in pending:
+            if not remaining:
+                out.append(_mismatch(f"{path}[{i}]", f'【{label}】缺少元素', str(expected[i]), "not found"))
+                continue
+            j = min(remaining, key=lambda j: len(diffs[i, j])) if exhaustive else remaining[0]
+            remaining.remove(j)
+            if (i, j) in diffs:
+                out.extend(diffs[i, j])
+            else:
+                self.diff(expected[i], actual[j], f"{path}[{i}]", label, out)
+        for j in remaining:
+            out.append(_mismatch(f"{path}[{j}]", f'【{label}】多余元素', "", str(actual[j])))
+
+
+def compare(expected, actual, skip_key: Sequence = None) -> List[dict]:
+    """
+    对比预期结果与实际结果
+    :param expected: 预期结果
+    :param actual: 实际结果
+    :param skip_key: 跳过指定key的对比（作用于所有层级）
+    :return: 差异列表，[{"path":..., "reason":..., "excepted":..., "real_result":...},...]，无差异时为空列表
+    """
+    comparator = _Comparator(skip_key)
+    out = []
+    if isinstance(expected, dict):
+        comparator.diff(expected, actual, "$", "$", out)
+    elif expected != actual:
+        # 非dict的顶层数据直接对比
+        out.append(_mismatch("$", '值不匹配', str(expected), str(actual)))
+    return out
@@ -10,10 +10,30 @@ class DataBase:
     CACHE_RESPONSE = 'response'
     CACHE_WORKER = 'worker'
     CACHE_API_INFO = 'api_info'
+    CACHE_CREATED_AT = 'created_at'
+    CACHE_SIZE = 'size'
     CONFIG_KEY = 'key'
     CONFIG_VALUE = 'value'
     SCHEMA_API_NAME = 'api_name'
     SCHEMA_SCHEMA = 'schema'
+    DURATION_TABLE = 'duration'
+    DURATION_CASE_KEY = 'case_key'
+    DURATION_SECONDS = 'seconds'
+    DURATION_RUNS = 'runs'
+    DURATION_UPDATED_AT = 'updated_at'
+    RESULT_TABLE = 'result'
+    RESULT_CASE_KEY = 'case_key'
+    RESULT_FULL_NAME = 'full_name'
+    RESULT_NAME = 'name'
+    RESULT_STATUS = 'status'
+    RESULT_DESCRIPTION = 'description'
+    RESULT_TRACE = 'trace'
+    RESULT_START = 'start'
+    RESULT_STOP = 'stop'
+    RESULT_CASE_ID = 'case_id'
+    RESULT_PARAMETERS = 'parameters'
+    RESULT_TAGS = 'tags'
+    RESULT_WORKER = 'worker'
 
 
 # log
@@ -0,0 +1,207 @@
+# --coding:utf-8--
+"""
+预编译的jsonpath
+语义与jsonpath包（0.82）的jsonpath(obj, expr)一致（只返回值），区别在于：
+    1.表达式只解析一次：规范化、拆分、过滤/索引表达式的eval代码按表达式LRU缓存
+    2.extract_many把多个表达式合并成前缀树，对同一份数据一次遍历提取全部结果
+求值出现异常时回退到jsonpath包，保证异常和结果与原先一致
+"""
+import re
+import builtins
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple, Union
+
+from jsonpath import jsonpath as _jsonpath, normalize
+
+__all__ = ['jsonpath', 'extract_many', 'compile_path']
+
+# 缓存的表达式数量
+JSONPATH_CACHE_SIZE = 2048
+
+_NAME, _STAR, _DESCEND, _KEYS, _INDEX_EXPR, _FILTER, _SLICE, _UNION = range(8)
+_SLICE_RE = re.compile(r'(-?[0-9]*):(-?[0-9]*):?(-?[0-9]*)$')
+_NOTVAR_RE = re.compile(r"!@\.([a-zA-Z@_0-9-]*)")
+_VAR_RE = re.compile(r'(?<!\\)(@\.[a-zA-Z@_.0-9]+)')
+_AT_RE = re.compile(r'(?<!\\)@')
+_EVAL_GLOBALS = {"__builtins__": builtins}
+
+
+def _brackets(elts: List[str]) -> str:
+    ret = "__obj"
+    for e in elts:
+        ret += f"[{e}]" if e.isdigit() else f"['{e}']"
+    return ret
+
+
+def _varmatch(m) -> str:
+    elts = m.group(1).split('.')
+    if elts[-1] == "length":
+        return f"len({_brackets(elts[1:-1])})"
+    return _brackets(elts[1:])
+
+
+@lru_cache(maxsize=JSONPATH_CACHE_SIZE)
+def _compile_eval(loc: str):
+    """过滤/索引表达式转换为python代码并编译，转换规则与jsonpath包的evalx一致"""
+    loc = loc.replace("@.length", "len(__obj)")
+    loc = loc.replace("&&", " and ").replace("||", " or ")
+    loc = _NOTVAR_RE.sub(lambda m: f"'{m.group(1)}' not in __obj", loc)
+    loc = _VAR_RE.sub(_varmatch, loc)
+    loc = _AT_RE.sub("__obj", loc).replace(r'\@', '@')
+    try:
+        return compile(loc, "<jsonpath>", "eval")
+    except SyntaxError:
+        return None
+
+
+def _evalx(code, obj):
+    if code is None:
+        return False
+    try:
+        return eval(code, _EVAL_GLOBALS, {'__obj': obj})
+    except Exception:
+        return False
+
+
+@lru_cache(maxsize=JSONPATH_CACHE_SIZE)
+def _step(loc: str) -> Tuple:
+    """单个路径片段的解析结果：(类型, 片段, 附加数据)"""
+    if loc == "*":
+        return _STAR, loc, None
+    if loc == "..":
+        return _DESCEND, loc, None
+    if loc == "!":
+        return _KEYS, loc, None
+    if loc.startswith("(") and loc.endswith(")"):
+        return _INDEX_EXPR, loc, _compile_eval(loc)
+    if loc.startswith("?(") and loc.endswith(")"):
+        return _FILTER, loc, _compile_eval(loc[2:-1])
+    m = _SLICE_RE.match(loc)
+    if m:
+        return _SLICE, loc, m.groups()
+    if loc.find(",") >= 0:
+        return _UNION, loc, tuple(re.split(r"'?,'?", loc))
+    return _NAME, loc, None
+
+
+@lru_cache(maxsize=JSONPATH_CACHE_SIZE)
+def compile_path(expr: str) -> Tuple[str, ...]:
+    """表达式规范化并拆分为路径片段"""
+    cleaned_expr = normalize(expr)
+    if cleaned_expr.startswith("$;"):
+        cleaned_expr = cleaned_expr[2:]
+    return tuple(cleaned_expr.split(';')) if cleaned_expr else ()
+
+
+class _Node:
+    """前缀树节点，exprs为在该节点结束的表达式"""
+    __slots__ = ("children", "exprs")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.exprs: List[str] = []
+
+
+class _Extractor:
+
+    def __init__(self, results: Dict[str, list]):
+        self.results = results
+
+    def visit(self, node: _Node, obj):
+        for expr in node.exprs:
+            self.results[expr].append(obj)
+        for loc, child in node.children.items():
+            self.apply(loc, child, obj)
+
+    def apply(self, loc: str, child: _Node, obj):
+        kind, loc, data = _step(loc)
+        if kind == _STAR:
+            self._walk(obj, lambda key: self.apply(str(key), child, obj))
+        elif kind == _DESCEND:
+            self.visit(child, obj)
+            self._walk(obj, lambda key: self.apply("..", child, obj[key]))
+        elif kind == _KEYS:
+            if isinstance(obj, dict):
+                for key in obj:
+                    self.visit(child, key)
+        elif isinstance(obj, dict) and loc in obj:
+            self.visit(child, obj[loc])
+        elif isinstance(obj, list) and loc.isdigit():
+            index = int(loc)
+            if len(obj) > index:
+                self.visit(child, obj[index])
+        elif kind == _INDEX_EXPR:
+            self.apply(str(_evalx(data, obj)), child, obj)
+        elif kind == _FILTER:
+            def match(key):
+                value = obj[key] if isinstance(obj, dict) else obj[int(key)]
+                if _evalx(data, value):
+                    self.apply(str(key), child, obj)
+
+            self._walk(obj, match)
+        elif kind == _SLICE:
+            if isinstance(obj, (dict, list)):
+                for i in self._slice_range(data, len(obj)):
+                    self.apply(str(i), child, obj)
+        elif kind == _UNION:
+            for piece in data:
+                self.apply(piece, child, obj)
+
+    @staticmethod
+    def _walk(obj, func):
+        if isinstance(obj, list):
+            for i in range(len(obj)):
+                func(i)
+        elif isinstance(obj, dict):
+            for key in obj:
+                func(key)
+
+    @staticmethod
+    def _slice_range(groups, objlen: int) -> range:
+        s0, s1, s2 = groups
+        start = int(s0) if s0 else 0
+        end = int(s1) if s1 else objlen
+        step = int(s2) if s2 else 1
+        start = max(0, start + objlen) if start < 0 else min(objlen, start)
+        end = max(0, end + objlen) if end < 0 else min(objlen, end)
+        return range(start, end, step)
+
+
+@lru_cache(maxsize=JSONPATH_CACHE_SIZE)
+def _build_trie(exprs: Tuple[str, ...]) -> _Node:
+    """多个表达式合并为前缀树，建好后只读，按表达式组合缓存"""
+    root = _Node()
+    for expr in exprs:
+        node = root
+        for loc in compile_path(expr):
+            node = node.children.setdefault(loc, _Node())
+        node.exprs.append(expr)
+    return root
+
+
+def extract_many(obj, exprs: Iterable[str]) -> Dict[str, Union[list, bool]]:
+    """
+    一次遍历提取多个表达式
+    :return: {表达式: 结果列表}，与jsonpath包一致，未匹配到时为False
+    """
+    exprs = tuple(dict.fromkeys(exprs))
+    results = {expr: [] for expr in exprs}
+    valid = tuple(expr for expr in exprs if expr)
+    if obj and valid:
+        try:
+            _Extractor(results).visit(_build_trie(valid), obj)
+        except Exception:
+            return {expr: _jsonpath(obj, expr) for expr in exprs}
+    return {expr: results[expr] or False for expr in exprs}
+
+
+def jsonpath(obj, expr: str) -> Union[list, bool]:
+    """与jsonpath.jsonpath(obj, expr)一致：返回匹配值列表，未匹配到时返回False"""
+    if not (expr and obj):
+        return False
+    result = []
+    try:
+        _Extractor({expr: result}).visit(_build_trie((expr,)), obj)
+    except Exception:
+        return _jsonpath(obj, expr)
+    return result or False
@@ -1,6 +1,7 @@
 # --coding:utf-8--
 from aomaker._aomaker import dependence, async_api, update, command, hook, genson, data_maker, dataclass, kwargs_handle, be_dependence
 from aomaker.extension.retry.retry import retry, AoMakerRetry
+from aomaker.extension.polling import Poller
 
 __all__ = [
     'dependence',
@@ -14,5 +15,6 @@ __all__ = [
     'dataclass',
     'retry',
     'AoMakerRetry',
+    'Poller',
     'kwargs_handle'
 ]
@@ -0,0 +1,318 @@
+# --coding:utf-8--
+"""
+协程用例并发执行
+开启后（pytest参数--async-concurrency=N，arun --async-mode），连续的、属于同一个父节点（class/module）的async def用例
+组成一个批次：批次内用例依次setup，然后在同一个事件循环上并发执行（最大并发数N），最后依次生成报告并teardown。
+同步用例、不同父节点的用例仍按pytest原有顺序逐条执行。
+
+注意：
+    1.setup/teardown仍按顺序执行，仅用例函数体并发，夹具（含class/module级夹具）的作用域语义不变
+    2.并发执行期间的allure附件、步骤会按用例缓存，在生成该用例报告时写回，不会串到其它用例上
+    3.批次执行依赖pytest的内部实现（SetupState.stack、Function._initrequest、FixtureDef的缓存），
+      只支持SUPPORTED_PYTEST范围内的版本，
+      开启并发时检查，版本不支持时报错退出而不是静默地以错误的顺序执行夹具
+"""
+import sys
+import time
+import asyncio
+import inspect
+import contextvars
+from contextlib import suppress
+from typing import Dict, List, Optional
+
+import pytest
+import allure_commons
+from _pytest.nodes import Item
+from _pytest.fixtures import FixtureDef
+from _pytest.runner import call_and_report, SetupState
+
+from aomaker.log import logger
+
+# 支持的pytest版本范围：[最低版本, 最高版本)
+SUPPORTED_PYTEST = ((7, 0), (10, 0))
+
+# 当前协程所属的用例
+_current_item: contextvars.ContextVar[Optional[Item]] = contextvars.ContextVar("aomaker_async_item", default=None)
+
+
+def _pytest_version() -> tuple:
+    return tuple(int(part) for part in pytest.__version__.split(".")[:2])
+
+
+def check_pytest_version():
+    """检查当前pytest版本及批次执行依赖的内部接口，不支持时抛出pytest.UsageError"""
+    low, high = SUPPORTED_PYTEST
+    if not low <= _pytest_version() < high:
+        raise pytest.UsageError(f"--async-concurrency仅支持pytest>={'.'.join(map(str, low))},"
+                                f"<{'.'.join(map(str, high))}，当前版本：{pytest.__version__}")
+    if not hasattr(pytest.Function, "_initrequest") or not hasattr(SetupState(), "stack"):
+        raise pytest.UsageError(f"--async-concurrency不支持当前pytest版本：{pytest.__version__}，"
+                                f"缺少依赖的内部接口")
+
+
+def _is_async_item(item: Item) -> bool:
+    return isinstance(item, pytest.Function) and inspect.iscoroutinefunction(item.function)
+
+
+class _Outcome:
+    """协程用例的执行结果"""
+
+    def __init__(self):
+        self.start = None
+        self.stop = None
+        self.exc: Optional[BaseException] = None
+
+
+class _AllureEventBuffer:
+    """
+    并发执行期间接管allure的用例级事件（附件、步骤、标题等），按用例缓存，
+    在该用例的call阶段（allure已将其切换为当前用例）按原顺序重放
+    """
+
+    def __init__(self):
+        # key: 用例，value: [(hook名, 参数),...]
+        self.events: Dict[Item, list] = {}
+
+    def _record(self, hook_name, **kwargs):
+        item = _current_item.get()
+        if item is not None:
+            self.events.setdefault(item, []).append((hook_name, kwargs))
+
+    @allure_commons.hookimpl
+    def attach_data(self, body, name, attachment_type, extension):
+        self._record("attach_data", body=body, name=name, attachment_type=attachment_type, extension=extension)
+
+    @allure_commons.hookimpl
+    def attach_file(self, source, name, attachment_type, extension):
+        self._record("attach_file", source=source, name=name, attachment_type=attachment_type, extension=extension)
+
+    @allure_commons.hookimpl
+    def start_step(self, uuid, title, params):
+        self._record("start_step", uuid=uuid, title=title, params=params)
+
+    @allure_commons.hookimpl
+    def stop_step(self, uuid, exc_type, exc_val, exc_tb):
+        self._record("stop_step", uuid=uuid, exc_type=exc_type, exc_val=exc_val, exc_tb=exc_tb)
+
+    @allure_commons.hookimpl
+    def add_title(self, test_title):
+        self._record("add_title", test_title=test_title)
+
+    @allure_commons.hookimpl
+    def add_description(self, test_description):
+        self._record("add_description", test_description=test_description)
+
+    @allure_commons.hookimpl
+    def add_label(self, label_type, labels):
+        self._record("add_label", label_type=label_type, labels=labels)
+
+    @allure_commons.hookimpl
+    def add_link(self, url, link_type, name):
+        self._record("add_link", url=url, link_type=link_type, name=name)
+
+    def replay(self, item: Item):
+        for hook_name, kwargs in self.events.pop(item, []):
+            getattr(allure_commons.plugin_manager.hook, hook_name)(**kwargs)
+
+
+class AsyncRunnerPlugin:
+    """pytest插件：async def用例在同一个事件循环上并发执行"""
+
+    def __init__(self):
+        self.concurrency = 0
+        self._outcomes: Dict[Item, _Outcome] = {}
+        self._allure_buffer = _AllureEventBuffer()
+        self._allure_listener = None
+
+    def pytest_addoption(self, parser):
+        group = parser.getgroup("aomaker")
+        group.addoption("--async-concurrency", dest="async_concurrency", type=int, default=0,
+                        help="run async def tests concurrently on one event loop with at most N in flight, "
+                             "0 to disable")
+
+    def pytest_configure(self, config):
+        self.concurrency = config.getoption("async_concurrency")
+        if self.concurrency > 0:
+            check_pytest_version()
+        self._allure_listener = config.pluginmanager.getplugin("allure_listener")
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtestloop(self, session):
+        if self.concurrency <= 0:
+            return None
+        if session.testsfailed and not session.config.option.continue_on_collection_errors:
+            raise session.Interrupted(
+                f"{session.testsfailed} error{'s' if session.testsfailed != 1 else ''} during collection")
+        if session.config.option.collectonly:
+            return True
+
+        logger.info(f"<AoMaker> 协程用例并发执行已开启，最大并发数：{self.concurrency}")
+        self.run_items(session, session.items)
+        return True
+
+    def run_items(self, session, items: List[Item], nextitem: Optional[Item] = None):
+        """
+        按顺序执行用例，连续的同父节点协程用例按批次并发执行
+        :param nextitem: items之后将要执行的用例，决定最后一条用例teardown的范围，None表示之后不再执行用例
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            i = 0
+            while i < len(items):
+                item = items[i]
+                j = i + 1
+                if _is_async_item(item):
+                    while j < len(items) and _is_async_item(items[j]) and items[j].parent is item.parent:
+                        j += 1
+                batch_nextitem = items[j] if j < len(items) else nextitem
+                if j - i == 1 and not _is_async_item(item):
+                    item.config.hook.pytest_runtest_protocol(item=item, nextitem=batch_nextitem)
+                else:
+                    self._run_batch(session, items[i:j], batch_nextitem, loop)
+                if session.shouldfail:
+                    raise session.Failed(session.shouldfail)
+                if session.shouldstop:
+                    raise session.Interrupted(session.shouldstop)
+                i = j
+        finally:
+            self._close_loop(loop)
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_pyfunc_call(self, pyfuncitem):
+        """协程用例已并发执行完毕，call阶段直接返回其结果"""
+        outcome = self._outcomes.get(pyfuncitem)
+        if outcome is None:
+            return None
+        self._allure_buffer.replay(pyfuncitem)
+        if outcome.exc is not None:
+            raise outcome.exc
+        return True
+
+    @pytest.hookimpl(hookwrapper=True, tryfirst=True)
+    def pytest_runtest_call(self, item):
+        yield
+        outcome = self._outcomes.get(item)
+        if outcome is None or outcome.start is None or self._allure_listener is None:
+            return
+        # allure中用例的开始/结束时间改为实际并发执行的时间
+        with suppress(Exception):
+            uuid = self._allure_listener._cache.get(item.nodeid)
+            test_result = self._allure_listener.allure_logger.get_test(uuid)
+            test_result.start = int(outcome.start * 1000)
+            test_result.stop = int(outcome.stop * 1000)
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+        result = yield
+        outcome = self._outcomes.get(item)
+        if call.when == "call" and outcome is not None and outcome.start is not None:
+            result.get_result().duration = outcome.stop - outcome.start
+
+    def _run_batch(self, session, batch: List[Item], nextitem: Optional[Item], loop):
+        # 1.依次setup，setup完成后把用例及其function级夹具的缓存从SetupState、FixtureDef中摘下，
+        #   使同一父节点下的下一条用例可以继续setup，并得到自己的function级夹具实例
+        detached = {}
+        detached_fixtures = {}
+        ready = []
+        for item in batch:
+            item.ihook.pytest_runtest_logstart(nodeid=item.nodeid, location=item.location)
+            if hasattr(item, "_request") and not item._request:
+                item._initrequest()
+            rep = call_and_report(item, "setup", log=True)
+            detached[item] = session._setupstate.stack.pop(item, None)
+            detached_fixtures[item] = self._detach_fixtures(item)
+            if rep.passed and not item.config.getoption("setuponly", False):
+                ready.append(item)
+
+        # 2.并发执行用例函数体
+        for item in ready:
+            self._outcomes[item] = _Outcome()
+        if ready:
+            logger.info(f"<AoMaker> 协程用例并发执行：{batch[0].parent.nodeid}，用例数：{len(ready)}")
+            self._intercept_allure(True)
+            try:
+                loop.run_until_complete(self._run_concurrently(ready))
+            finally:
+                self._intercept_allure(False)
+
+        # 3.依次生成call报告并teardown
+        for k, item in enumerate(batch):
+            item_nextitem = batch[k + 1] if k + 1 < len(batch) else nextitem
+            if item in self._outcomes:
+                call_and_report(item, "call", log=True)
+            if detached[item] is not None:
+                session._setupstate.stack[item] = detached[item]
+            self._attach_fixtures(detached_fixtures[item])
+            call_and_report(item, "teardown", log=True, nextitem=item_nextitem)
+            self._outcomes.pop(item, None)
+            self._allure_buffer.events.pop(item, None)
+            item._request = False
+            item.funcargs = None
+            item.ihook.pytest_runtest_logfinish(nodeid=item.nodeid, location=item.location)
+
+    def _detach_fixtures(self, item: Item) -> list:
+        """
+        取下用例已setup的function级夹具的缓存值和finalizer，否则下一条用例setup时会直接复用该缓存；
+        allure按夹具定义记录夹具所属的报告容器，同样取下，使每条用例的夹具有各自的容器
+        :return: [(夹具定义, 缓存值, finalizer列表, allure容器),...]，teardown前由_attach_fixtures放回
+        """
+        request = getattr(item, "_request", None)
+        states = []
+        for fixturedef in (request._fixture_defs.values() if request else ()):
+            if not isinstance(fixturedef, FixtureDef) or fixturedef.scope != "function":
+                continue
+            if fixturedef.cached_result is None:
+                continue
+            container = self._allure_listener._cache.pop(fixturedef) if self._allure_listener else None
+            states.append((fixturedef, fixturedef.cached_result, list(fixturedef._finalizers), container))
+            fixturedef.cached_result = None
+            fixturedef._finalizers.clear()
+        return states
+
+    def _attach_fixtures(self, states: list):
+        for fixturedef, cached_result, finalizers, container in states:
+            fixturedef.cached_result = cached_result
+            fixturedef._finalizers[:] = finalizers
+            if container is not None:
+                self._allure_listener._cache._items[id(fixturedef)] = container
+
+    async def _run_concurrently(self, items: List[Item]):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_item(item: Item):
+            async with semaphore:
+                _current_item.set(item)
+                outcome = self._outcomes[item]
+                outcome.start = time.time()
+                try:
+                    funcargs = item.funcargs
+                    await item.obj(**{arg: funcargs[arg] for arg in item._fixtureinfo.argnames})
+                except (KeyboardInterrupt, SystemExit):
+                    raise
+                except BaseException as e:
+                    outcome.exc = e
+                finally:
+                    outcome.stop = time.time()
+
+        await asyncio.gather(*(run_item(item) for item in items))
+
+    def _intercept_allure(self, enable: bool):
+        """并发执行期间由_AllureEventBuffer代替allure listener接收用例级事件"""
+        if self._allure_listener is None:
+            return
+        if enable:
+            allure_commons.plugin_manager.unregister(self._allure_listener)
+            allure_commons.plugin_manager.register(self._allure_buffer)
+        else:
+            allure_commons.plugin_manager.unregister(self._allure_buffer)
+            allure_commons.plugin_manager.register(self._allure_listener)
+
+    @staticmethod
+    def _close_loop(loop):
+        try:
+            async_base_api = sys.modules.get("aomaker.base.async_base_api")
+            if async_base_api is not None:
+                loop.run_until_complete(async_base_api.async_client_pool.aclose())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
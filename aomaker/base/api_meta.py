@@ -0,0 +1,101 @@
+# --coding:utf-8--
+"""
+接口调用方信息
+BaseApi子类中定义的公开方法在类创建时被包装，调用时把接口信息（类名、方法名、文档首行、模块）记录到contextvar中，
+响应回调直接读取，不再逐层查找调用栈；接口信息按(类, 方法)解析一次后缓存。
+"""
+import inspect
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+
+__all__ = ['ApiMeta', 'current_api_meta', 'bind_api_meta', 'api_meta_scope']
+
+
+@dataclass(frozen=True)
+class ApiMeta:
+    class_name: str
+    method: str
+    doc: str
+    module: str
+
+    @property
+    def api_name(self) -> str:
+        return f"{self.class_name}.{self.method}"
+
+    @property
+    def caller_name(self) -> str:
+        return f"{self.class_name}.{self.method} {self.doc}"
+
+
+_current_api: contextvars.ContextVar[Optional[ApiMeta]] = contextvars.ContextVar("aomaker_api_meta", default=None)
+# key: (实际调用的类, 方法名)，value: ApiMeta
+_meta_cache: Dict[Tuple[type, str], ApiMeta] = {}
+
+
+def current_api_meta() -> Optional[ApiMeta]:
+    return _current_api.get()
+
+
+def _first_line(doc: Optional[str]) -> str:
+    return doc.split("\n")[0].strip() if doc else ""
+
+
+def _get_meta(cls: type, func: Callable) -> ApiMeta:
+    key = (cls, func.__name__)
+    meta = _meta_cache.get(key)
+    if meta is None:
+        # 与原先一致：文档取实例上该方法（可能被子类覆盖）的文档首行
+        method_ref = getattr(cls, func.__name__, func)
+        meta = _meta_cache[key] = ApiMeta(class_name=cls.__name__,
+                                          method=func.__name__,
+                                          doc=_first_line(method_ref.__doc__),
+                                          module=func.__module__)
+    return meta
+
+
+def bind_api_meta(func: Callable) -> Callable:
+    """包装接口方法，调用期间记录接口信息"""
+    if getattr(func, "__api_meta_bound__", False):
+        return func
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(self, *args, **kwargs):
+            token = _current_api.set(_get_meta(type(self), func))
+            try:
+                return await func(self, *args, **kwargs)
+            finally:
+                _current_api.reset(token)
+
+        async_wrapper.__api_meta_bound__ = True
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        token = _current_api.set(_get_meta(type(self), func))
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            _current_api.reset(token)
+
+    wrapper.__api_meta_bound__ = True
+    return wrapper
+
+
+@contextmanager
+def api_meta_scope(api_obj):
+    """
+    直接调用send_http（未经过接口方法）时，以<类名>.send_http作为接口信息
+    """
+    if _current_api.get() is not None:
+        yield
+        return
+    token = _current_api.set(ApiMeta(class_name=type(api_obj).__name__, method="send_http", doc="",
+                                     module=type(api_obj).__module__))
+    try:
+        yield
+    finally:
+        _current_api.reset(token)
@@ -0,0 +1,130 @@
+# --coding:utf-8--
+"""
+协程版BaseApi
+基于httpx.AsyncClient，请求/响应处理与BaseApi一致：send_http、_payload_schema、响应回调（日志、allure、jsonschema）
+httpx为可选依赖：pip install aomaker[async]
+"""
+import asyncio
+import weakref
+from http.cookiejar import CookieJar
+
+from aomaker.base.base_api import BaseApi
+from aomaker.base.api_meta import api_meta_scope, current_api_meta
+from aomaker.base.session_pool import _BlockAllCookies
+from aomaker.credential import credential_manager
+from aomaker.exceptions import HttpRequestError
+from aomaker.extension.retry.retry import AoMakerAsyncRetry
+from aomaker.log import logger
+from aomaker.metrics import metrics, timed_callback, current_timing
+
+
+def _import_httpx():
+    try:
+        import httpx
+    except ImportError as e:
+        raise ImportError("AsyncBaseApi依赖httpx，请先安装：pip install aomaker[async]") from e
+    return httpx
+
+
+class AsyncClientPool:
+    """
+    httpx.AsyncClient池
+    AsyncClient与事件循环绑定，每个事件循环持有一个AsyncClient并在整个运行期间复用连接池
+    """
+
+    def __init__(self):
+        # key: 事件循环，value: 该事件循环上的AsyncClient
+        self._clients = weakref.WeakKeyDictionary()
+
+    def get_client(self, max_connections: int, max_keepalive_connections: int, timeout):
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None or client.is_closed:
+            httpx = _import_httpx()
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_keepalive_connections),
+                timeout=timeout,
+                # 与同步会话池一致，不保存服务端下发的cookie
+                cookies=CookieJar(policy=_BlockAllCookies()),
+            )
+            self._clients[loop] = client
+        return client
+
+    async def aclose(self):
+        """关闭当前事件循环上的AsyncClient"""
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None and not client.is_closed:
+            await client.aclose()
+            logger.debug("<AoMaker> httpx AsyncClient已关闭")
+
+
+async_client_pool = AsyncClientPool()
+
+
+class AsyncBaseApi(BaseApi):
+    """
+    协程版BaseApi，接口方法定义为async def，调用时await：
+        class Job(AsyncBaseApi):
+            async def get_job(self, job_id):
+                http_data = {"api_path": "/job", "method": "get", "params": {"job_id": job_id}}
+                return await self.send_http(http_data)
+    """
+    HTTP_MAX_CONNECTIONS = 100  # 单个事件循环的最大连接数
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = 20  # 最大keep-alive连接数
+    HTTP_TIMEOUT = None  # 单位：s，与requests一致默认不超时
+
+    async def send_http(self, http_data, **kwargs):
+        response = await self._send_http(http_data, **kwargs)
+        if self.IS_CHECK_RESPONSE_OK is True:
+            response.raise_for_status()
+
+        if self.RESPONSE_TO_JSON is False:
+            return response
+
+        res = getattr(response, "json_data")
+        if res is None:
+            return getattr(response, "text_data")
+        return res
+
+    async def _send_http(self, http_data, **kwargs):
+        # token刷新（登录、等待其它进程）不能阻塞事件循环
+        await credential_manager.aensure_fresh()
+        payload = self._prepare_payload(http_data, ensure_fresh=False)
+        with api_meta_scope(self), metrics.timing(current_api_meta().api_name) as timing:
+            response = await self.request(**payload, **kwargs)
+            timing.status = response.status_code
+            # httpx的事件钩子作用于整个client，这里直接调用响应回调，行为与requests的response hook一致
+            timed_callback(self._response_callback(payload, self.SET_SCHEMA_CONDITION,
+                                                   self._schema_sample_rate()))(response)
+        return response
+
+    async def request(self, method, url, **kwargs):
+        kwargs = self._to_httpx_kwargs(kwargs)
+
+        async def client_request():
+            client = async_client_pool.get_client(self.HTTP_MAX_CONNECTIONS, self.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                                                  self.HTTP_TIMEOUT)
+            timing = current_timing()
+            if timing is not None:
+                # 由httpx的trace事件计算建立连接、首字节耗时
+                kwargs.setdefault("extensions", {"trace": timing.httpx_trace})
+            return await client.request(method=method, url=url, **kwargs)
+
+        if self.IS_HTTP_RETRY:
+            async for attempt in AoMakerAsyncRetry(counts=self.HTTP_RETRY_COUNTS, interval=self.HTTP_RETRY_INTERVAL,
+                                                   exception_type=HttpRequestError):
+                with attempt:
+                    return await client_request()
+        else:
+            return await client_request()
+
+    @staticmethod
+    def _to_httpx_kwargs(kwargs: dict) -> dict:
+        """requests风格的请求参数转换为httpx参数"""
+        kwargs = {k: v for k, v in kwargs.items() if v is not None}
+        data = kwargs.get("data")
+        if isinstance(data, (str, bytes)):
+            # httpx中原始请求体使用content
+            kwargs["content"] = kwargs.pop("data")
+        return kwargs
@@ -4,19 +4,24 @@ import json
 from typing import Union, Dict
 
 import allure
+import allure_commons
 import requests
-from requests import sessions
 from json.decoder import JSONDecodeError
 from emoji import emojize
 from jinja2 import Template
 from dataclasses import is_dataclass
 
-from aomaker.log import logger, aomaker_logger
-from aomaker.cache import Config, Cache, schema
-from aomaker._aomaker import genson, _is_execute_cycle_func
+from aomaker.log import logger, get_aomaker_logger
+from aomaker.cache import Config, Cache
+from aomaker.snapshot import session_snapshot
+from aomaker.credential import credential_manager
+from aomaker.metrics import metrics, timed_callback
+from aomaker._aomaker import _is_execute_cycle_func
+from aomaker.schema_capture import schema_capture
 from aomaker.exceptions import HttpRequestError
 from aomaker.aomaker import AoMakerRetry
-from aomaker.path import API_DIR
+from aomaker.base.session_pool import session_pool
+from aomaker.base.api_meta import bind_api_meta, current_api_meta, api_meta_scope
 
 template = """
 {{tag}}
@@ -48,28 +53,62 @@ template = """
 {% endif -%}
 {{tag}}
 """
-
-
-def _render_template(template_str, data):
-    temp = Template(template_str)
-    return temp.render(data)
-
-
-def response_callback(payload: dict, condition: Union[Dict, bool]):
+# 模板只在导入时编译一次
+_TEMPLATE = Template(template)
+_TAG = "=" * 100
+EMOJI_API = emojize(":A_button_(blood_type):")
+EMOJI_REQ = emojize(":rocket:")
+EMOJI_REP = emojize(":check_mark_button:")
+
+# 日志中响应体超过该长度（字节）时截断输出
+LOG_BODY_MAX_LENGTH = 10 * 1024
+# allure附件中响应体超过该长度（字节）时不再缩进格式化
+ALLURE_PRETTY_MAX_LENGTH = 100 * 1024
+# allure附件中响应体超过该长度（字节）时，直接附加原始响应内容，不再重新序列化
+ALLURE_RAW_BODY_MIN_LENGTH = 1024 * 1024
+
+
+def _log_body(response, resp_body, body_size: int):
+    """日志中输出的响应体，超长时截断"""
+    if body_size <= LOG_BODY_MAX_LENGTH:
+        return resp_body
+    head = response.content[:LOG_BODY_MAX_LENGTH].decode(response.encoding or "utf-8", errors="replace")
+    return f"{head}...(已截断，共{body_size}字节)"
+
+
+def _allure_enabled() -> bool:
+    """是否有allure插件接收附件（未指定--alluredir时没有）"""
+    return bool(allure_commons.plugin_manager.hook.attach_data.get_hookimpls())
+
+
+def _attach_to_allure(allure_info: dict, response, resp_body, body_size: int, caller_name: str):
+    if body_size > ALLURE_RAW_BODY_MIN_LENGTH:
+        # 超大响应体直接附加原始内容，请求信息单独附加
+        allure.attach(json.dumps(allure_info, indent=2, separators=(',', ':'), ensure_ascii=False),
+                      name=caller_name,
+                      attachment_type=allure.attachment_type.JSON)
+        attachment_type = allure.attachment_type.JSON if hasattr(response, "json_data") \
+            else allure.attachment_type.TEXT
+        allure.attach(response.content, name=f"{caller_name} Response Body", attachment_type=attachment_type)
+        return
+    allure_info['response_body'] = resp_body
+    if body_size > ALLURE_PRETTY_MAX_LENGTH:
+        body = json.dumps(allure_info, separators=(',', ':'), ensure_ascii=False)
+    else:
+        body = json.dumps(allure_info, indent=2, separators=(',', ':'), ensure_ascii=False)
+    allure.attach(body, name=caller_name, attachment_type=allure.attachment_type.JSON)
+
+
+def response_callback(payload: dict, condition: Union[Dict, bool], sample_rate: float = 1.0):
     def inner(response: requests.models.Response, *args, **kwargs):
-        api_caller = _get_api_frame()
-        caller_class_obj = api_caller.f_locals['self']
-        caller_of_class = caller_class_obj.__class__.__name__
-        caller_of_method = api_caller.f_code.co_name
-        caller_name = f"{caller_of_class}.{caller_of_method}"
-        method_ref = getattr(caller_class_obj, caller_of_method, None)
-        doc = method_ref.__doc__ if method_ref and method_ref.__doc__ else ""
-        doc = doc.split("\n")[0].strip() if doc else ""
-        caller_name = f"{caller_name} {doc}"
+        api_meta = current_api_meta()
+        caller_of_method = api_meta.method
+        caller_name = api_meta.caller_name
 
         print_info, allure_info, std_logger = _handle_print_info(payload, response, caller_name)
 
-        if response.ok:
+        # 兼容httpx.Response（没有ok属性），与requests.Response.ok判断一致
+        if response.status_code < 400:
             try:
                 resp_body = response.json()
             except JSONDecodeError as msg:
@@ -79,42 +118,32 @@ def response_callback(payload: dict, condition: Union[Dict, bool]):
             else:
                 setattr(response, "json_data", resp_body)
 
-            # info['response_body'] = resp_body
-            print_info['response_body'] = resp_body
-            allure_info['response_body'] = resp_body
-            print_info = _render_template(template, print_info)
-            std_logger(print_info)
+            body_size = len(response.content)
+
+            def render():
+                print_info['response_body'] = _log_body(response, resp_body, body_size)
+                return _TEMPLATE.render(print_info)
+
+            # 没有sink接收该级别日志时不渲染
+            std_logger("{}", render)
 
             if isinstance(resp_body, dict):
                 is_execute = _is_execute_cycle_func(resp_body, condition)
                 if is_execute:
-                    to_schema = genson(resp_body)
-                    schema.set(caller_of_method, to_schema)
-                    logger.debug(f'接口{caller_name}的响应jsonschema已保存到schema表中')
+                    if schema_capture.capture(caller_of_method, resp_body, sample_rate):
+                        logger.debug(f'接口{caller_name}的响应jsonschema已保存到schema表中')
                 else:
                     logger.debug(f'接口{caller_name}运行后不满足jsonschema存储条件')
 
-            try:
-                allure.attach(json.dumps(allure_info, indent=2, separators=(',', ':'), ensure_ascii=False),
-                              name=caller_name,
-                              attachment_type=allure.attachment_type.JSON)
-            except Exception:
-                pass
+            if _allure_enabled():
+                try:
+                    _attach_to_allure(allure_info, response, resp_body, body_size, caller_name)
+                except Exception:
+                    pass
 
     return inner
 
 
-def _get_api_frame():
-    current_frame = inspect.currentframe()
-    outer_frames = inspect.getouterframes(current_frame)
-    for frame_info in outer_frames:
-        frame = frame_info.frame
-        code = frame.f_code
-        filename = frame_info.filename
-        if API_DIR in filename and not code.co_name.startswith('send_http'):
-            return frame
-
-
 def _handle_print_info(request_payload, response, caller_name):
     url = request_payload.get('url')
     params = request_payload.get('params')
@@ -139,8 +168,9 @@ def _handle_print_info(request_payload, response, caller_name):
         allure_info['request_data'] = req_data
     if req_json:
         allure_info['request_json'] = req_json
-    log_current_level = aomaker_logger.get_level()
-    std_logger = logger.info
+    log_current_level = get_aomaker_logger().get_level()
+    lazy_logger = logger.opt(lazy=True)
+    std_logger = lazy_logger.info
     if log_current_level == 10:
         info.update({
             "method": request_payload.get('method'),
@@ -148,11 +178,11 @@ def _handle_print_info(request_payload, response, caller_name):
             "status_code": response.status_code,
             "elapsed": response.elapsed.total_seconds(),
         })
-        std_logger = logger.debug
-    print_info = {"tag": "=" * 100,
-                  "emoji_api": emojize(":A_button_(blood_type):"),
-                  "emoji_req": emojize(":rocket:"),
-                  "emoji_rep": emojize(":check_mark_button:"),
+        std_logger = lazy_logger.debug
+    print_info = {"tag": _TAG,
+                  "emoji_api": EMOJI_API,
+                  "emoji_req": EMOJI_REQ,
+                  "emoji_rep": EMOJI_REP,
                   **info}
     return print_info, allure_info, std_logger
 
@@ -164,12 +194,31 @@ class BaseApi:
     IS_CHECK_RESPONSE_OK = True
     RESPONSE_TO_JSON = True
     SET_SCHEMA_CONDITION = True
+    SCHEMA_SAMPLE_RATE = 1.0  # 响应jsonschema采样率，0~1
+    SCHEMA_SAMPLE_RATES = {}  # 按接口方法名单独配置采样率，如：{"list_jobs": 0.1}
+    HTTP_POOL_CONNECTIONS = 10  # 缓存的host连接池数量
+    HTTP_POOL_MAXSIZE = 10  # 单个host的最大keep-alive连接数
+
+    def __init_subclass__(cls, **kwargs):
+        """包装子类中定义的接口方法，调用时记录接口信息，供响应回调使用"""
+        super().__init_subclass__(**kwargs)
+        for name, attr in list(vars(cls).items()):
+            if name.startswith("_") or name in vars(BaseApi) or not inspect.isfunction(attr):
+                continue
+            setattr(cls, name, bind_api_meta(attr))
 
     def __init__(self):
         self.cache = Cache()
-        self.config = Config().get_all()
+        # 优先读取主进程发布的会话快照，未发布时（如未经arun直接实例化）从数据库读取
+        snapshot = session_snapshot.get()
+        if snapshot is None:
+            self.config = Config().get_all()
+            self._headers = self.cache.get('headers')
+        else:
+            self.config = dict(snapshot.config)
+            self._headers = dict(snapshot.headers)
         self._host = self.config.get('host')
-        self._headers = self.cache.get('headers')
+        self._headers_generation = credential_manager.generation
         self._response_callback = response_callback
 
     def send_http(self, http_data, **kwargs):
@@ -186,6 +235,15 @@ class BaseApi:
         return res
 
     def _send_http(self, http_data, **kwargs):
+        payload = self._prepare_payload(http_data)
+        with api_meta_scope(self), metrics.timing(current_api_meta().api_name) as timing:
+            hooks = self.get_response_hook(payload)
+            response = self.request(**payload, hooks=hooks, **kwargs)
+            timing.status = response.status_code
+            timing.ttfb = response.elapsed.total_seconds()
+        return response
+
+    def _prepare_payload(self, http_data, ensure_fresh: bool = True) -> dict:
         if is_dataclass(http_data):
             http_data = http_data.all_fields
             dic = {}
@@ -194,23 +252,33 @@ class BaseApi:
                     dic[k] = v
             http_data = dic
 
+        self._sync_headers(ensure_fresh)
         new_headers = http_data.get("headers")
         payload = self._payload_schema(**http_data)
 
         if new_headers:
-            headers = self._headers
-            headers.update(new_headers)
-            payload["headers"] = headers
+            # 合并到新的dict，单次请求的headers不影响实例和全局headers
+            payload["headers"] = {**(self._headers or {}), **new_headers}
+        return payload
 
-        hooks = self.get_response_hook(payload)
-        response = self.request(**payload, hooks=hooks, **kwargs)
-        return response
+    def _sync_headers(self, ensure_fresh: bool = True):
+        """
+        token轮换后（版本号变化），用新的全局headers覆盖实例headers中的同名字段
+        :param ensure_fresh: 是否先检查token有效期，AsyncBaseApi已在协程中检查过时为False
+        """
+        if ensure_fresh:
+            credential_manager.ensure_fresh()
+        generation = credential_manager.generation
+        if generation != self._headers_generation:
+            self._headers = {**(self._headers or {}), **credential_manager.headers()}
+            self._headers_generation = generation
 
     def request(self, method, url, **kwargs):
 
         def session_request():
-            with sessions.Session() as session:
-                return session.request(method=method, url=url, **kwargs)
+            session = session_pool.get_session(url, pool_connections=self.HTTP_POOL_CONNECTIONS,
+                                               pool_maxsize=self.HTTP_POOL_MAXSIZE)
+            return session.request(method=method, url=url, **kwargs)
 
         if self.IS_HTTP_RETRY:
             for attempt in AoMakerRetry(counts=self.HTTP_RETRY_COUNTS, interval=self.HTTP_RETRY_INTERVAL,
@@ -222,7 +290,13 @@ class BaseApi:
 
     def get_response_hook(self, payload: dict) -> dict:
 
-        return {"response": self._response_callback(payload, self.SET_SCHEMA_CONDITION)}
+        return {"response": timed_callback(
+            self._response_callback(payload, self.SET_SCHEMA_CONDITION, self._schema_sample_rate()))}
+
+    def _schema_sample_rate(self) -> float:
+        api_meta = current_api_meta()
+        method = api_meta.method if api_meta else None
+        return self.SCHEMA_SAMPLE_RATES.get(method, self.SCHEMA_SAMPLE_RATE)
 
     def _payload_schema(self, **kwargs):
         api_path = kwargs.get('api_path', '')
@@ -1,17 +1,56 @@
 # --coding:utf-8--
 import json
 from json import JSONDecodeError
-from typing import Any
+from typing import Any, Iterable
 
-from jsonpath import jsonpath
-from jsonschema import validate, ValidationError
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
 
 from aomaker.log import logger
-from aomaker.cache import Schema
+from aomaker.cache import schema
+from aomaker._jsonpath import jsonpath, extract_many
 from aomaker._aomaker import compare_two_dict
 from aomaker.exceptions import SchemaNotFound, CaseError, CompareException
 
 
+class _ValidatorCache:
+    """
+    jsonschema校验器缓存，每个api_name保留一个已编译的校验器
+    以schema表中的json文本判断是否变化：schema表被修改后，缓存层在下次读取时回源，文本变化即重新编译
+    """
+
+    def __init__(self):
+        # key: api_name，value: (schema文本的hash, 校验器)
+        self._validators = {}
+
+    def get(self, api_name: str):
+        text = schema.get(api_name, raw=True)
+        if text is None:
+            self._validators.pop(api_name, None)
+            return None
+        text_hash = hash(text)
+        cached = self._validators.get(api_name)
+        if cached is not None and cached[0] == text_hash:
+            return cached[1]
+        json_schema = json.loads(text)
+        validator_cls = validator_for(json_schema)
+        validator_cls.check_schema(json_schema)
+        validator = validator_cls(json_schema)
+        self._validators[api_name] = (text_hash, validator)
+        return validator
+
+
+_validator_cache = _ValidatorCache()
+
+
+def _get_validator(api_name: str):
+    validator = _validator_cache.get(api_name)
+    if validator is None:
+        logger.error('jsonschema未找到！')
+        raise SchemaNotFound(api_name)
+    return validator
+
+
 class BaseTestcase:
 
     @staticmethod
@@ -99,16 +138,30 @@ class BaseTestcase:
         :param api_name: 存放在schema表中的对应key名
         :return:
         """
-        json_schema = Schema().get(api_name)
-        if json_schema is None:
-            logger.error('jsonschema未找到！')
-            raise SchemaNotFound(api_name)
-        try:
-            validate(instance, schema=json_schema)
-        except ValidationError as msg:
-            logger.error(msg)
+        validator = _get_validator(api_name)
+        error = best_match(validator.iter_errors(instance))
+        if error is not None:
+            logger.error(error)
             raise AssertionError
 
+    @staticmethod
+    def assert_schema_many(instances: Iterable, api_name):
+        """
+        批量Assert JSON Schema，所有实例共用一个校验器，校验完全部实例后统一报告错误
+        :param instances: 请求响应结果列表
+        :param api_name: 存放在schema表中的对应key名
+        :return:
+        """
+        validator = _get_validator(api_name)
+        errors = []
+        for index, instance in enumerate(instances):
+            for error in validator.iter_errors(instance):
+                errors.append(f"[{index}]{error.json_path[1:]}: {error.message}")
+        if errors:
+            msg = f"schema断言失败，api_name：{api_name}，错误数：{len(errors)}\n" + "\n".join(errors)
+            logger.error(msg)
+            raise AssertionError(msg)
+
     @staticmethod
     def assert_in(actual_value, expected_value, msg: str = ""):
         assert isinstance(
@@ -168,6 +221,9 @@ class BaseTestcase:
             'condition': eval,
             'resp': self.assert_resp_value
         }
+        # 取值类断言的jsonpath对resp一次遍历提取
+        extracted = extract_many(resp, (info[0] for expected in assert_info for key, info in expected.items()
+                                        if key in ('eq', 'neq', 'gt', 'ge', 'lt', 'le', 'resp')))
         for expected in assert_info:
             for key, info in expected.items():
                 msg = info[-1] if len(info) >= 3 else ""
@@ -175,7 +231,7 @@ class BaseTestcase:
                     raise CaseError(f'此类型断言时需传入值替换占位符: {key}')
                 match key:
                     case 'eq' | 'neq' | 'gt' | 'ge' | 'lt' | 'le':
-                        actual_value = jsonpath(resp, info[0])[0]
+                        actual_value = extracted[info[0]][0]
                         assert_func[key](actual_value, info[1], msg)
                     case 'in' | 'nin':
                         try:
@@ -196,7 +252,7 @@ class BaseTestcase:
                             raise CaseError(f'此类型下执行的语句需要为条件语句: {info[0].format(**others)}')
                         assert actual_value == info[1], msg
                     case 'resp':
-                        actual_value = jsonpath(resp, info[0])[0]
+                        actual_value = extracted[info[0]][0]
                         if not isinstance(info[1], str):
                             raise CaseError(f'此类型下需传入预期响应结果的转义字符串')
                         try:
@@ -0,0 +1,140 @@
+# --coding:utf-8--
+import os
+import time
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Dict, Tuple
+
+from requests import sessions
+from requests.adapters import HTTPAdapter, DEFAULT_POOLSIZE
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from aomaker.log import logger
+from aomaker.metrics import note_connect
+
+
+class _BlockAllCookies(DefaultCookiePolicy):
+    """会话复用后不保存服务端下发的cookie，保持与每次新建Session一致的行为"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class _TimedConnectMixin:
+    """新建连接（DNS解析+TCP连接+TLS握手）的耗时计入当前请求的connect阶段"""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            note_connect(time.perf_counter() - start)
+
+
+class _TimedHTTPConnection(_TimedConnectMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TimedHTTPConnectionPool,
+                                                   "https": _TimedHTTPSConnectionPool}
+
+
+class SessionPool:
+    """
+    HTTP会话池
+    每个worker（线程/进程）持有一个独立的requests.Session，在整个运行期间复用，
+    每个host挂载独立的连接池并保持keep-alive，避免每次请求都重新建立TCP连接和TLS握手
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # key: 线程ident，value: 该线程持有的Session，用于结束时统一关闭
+        self._sessions: Dict[int, sessions.Session] = {}
+        # key: 线程ident，value: 该线程Session已挂载的host
+        self._mounted: Dict[int, set] = {}
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def get_session(self, url: str, pool_connections: int = DEFAULT_POOLSIZE,
+                    pool_maxsize: int = DEFAULT_POOLSIZE) -> sessions.Session:
+        """
+        获取当前worker的Session，并确保目标host已挂载连接池
+        :param url: 请求地址
+        :param pool_connections: 缓存的host连接池数量
+        :param pool_maxsize: 单个host连接池的最大连接数
+        :return: Session
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._new_session(pool_connections, pool_maxsize)
+        host_prefix, is_new = self._host_prefix(url)
+        if is_new:
+            adapter = _TimedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+            session.mount(host_prefix, adapter)
+        return session
+
+    def close(self):
+        """关闭当前进程内所有Session及其连接池"""
+        with self._lock:
+            all_sessions = list(self._sessions.values())
+            self._sessions.clear()
+            self._mounted.clear()
+        for session in all_sessions:
+            session.close()
+        self._local = threading.local()
+        if all_sessions:
+            logger.debug(f"<AoMaker> HTTP会话池已关闭，共释放{len(all_sessions)}个Session")
+
+    def _new_session(self, pool_connections, pool_maxsize) -> sessions.Session:
+        session = sessions.Session()
+        session.cookies.set_policy(_BlockAllCookies())
+        default_adapter = _TimedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        session.mount("https://", default_adapter)
+        session.mount("http://", default_adapter)
+        ident = threading.get_ident()
+        with self._lock:
+            # 线程结束后ident会被新线程复用，旧线程的Session不会再被使用，关闭以释放其连接池
+            stale = self._sessions.get(ident)
+            self._sessions[ident] = session
+            self._mounted[ident] = set()
+        if stale is not None:
+            stale.close()
+        self._local.session = session
+        return session
+
+    def _host_prefix(self, url: str) -> Tuple[str, bool]:
+        scheme, _, rest = url.partition("://")
+        host_prefix = f"{scheme}://{rest.split('/', 1)[0]}/"
+        mounted = self._mounted.get(threading.get_ident())
+        if mounted is None or host_prefix in mounted:
+            return host_prefix, False
+        mounted.add(host_prefix)
+        return host_prefix, True
+
+    def _reset_after_fork(self):
+        # 子进程不能复用父进程的socket，直接丢弃（不close，避免影响父进程的TLS连接）
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._mounted = {}
+
+
+session_pool = SessionPool()
@@ -1,106 +1,414 @@
 # --coding:utf-8--
-import sqlite3
 import json
+import time
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
 
-from jsonpath import jsonpath
 from multiprocessing import current_process
 from threading import current_thread
 
-from aomaker.database.sqlite import SQLiteDB
+from aomaker._jsonpath import jsonpath
+from aomaker.database.sqlite import SQLiteDB, DB_PATH, set_initializer
+from aomaker.database.migrations import migrate
 from aomaker._constants import DataBase
 from aomaker.exceptions import JsonPathExtractFailed
 from aomaker.log import logger
 
 
+class MemoryTier:
+    """
+    进程内缓存层，位于SQLite表之前，写入时同步落库（write-through）
+    通过PRAGMA data_version感知其它连接/进程对数据库的提交，一旦变化即整体失效
+    缓存的是json文本，容器类型在读取时重新反序列化，避免调用方修改返回值污染缓存
+    同一进程内同一张表的所有实例共用一个缓存层（见get_tier），
+    data_version按连接计数，因此每个线程记录自己连接上次看到的版本；
+    线程首次使用时无法得知其它线程填充缓存之后数据库是否被修改，同样清空缓存
+    未命中时的回填（fill）以查询前的写入代数为准：查询期间本进程有过写入或失效时不回填，
+    避免旧行覆盖其它线程刚写入的新值（写入方连接的data_version不会因自己的提交而变化，无法靠validate发现）；
+    batch()事务内的写入先从缓存中移除，提交后才写入缓存，事务内的查询结果也不回填，事务内读取自己写过的key时使用事务内的值
+    统计中的round_trips为读写表数据的次数，每次读写前检查data_version的查询单独计入version_checks
+    取舍：命中时仍需一次PRAGMA data_version查询和一次json.loads，换取对其它进程提交的即时可见，
+    省下的是表数据的查询（round_trips），而不是全部的数据库往返
+    """
+    _MISSING = object()
+
+    def __init__(self, db: SQLiteDB):
+        self._db = db
+        self._data = {}
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        # 写入代数：每次写入、移除、失效加1
+        self._generation = 0
+        self.all_loaded = False
+        db.connection_manager.add_rollback_listener(self.clear)
+        db.connection_manager.add_commit_listener(self._apply_pending)
+        self.hits = 0
+        self.misses = 0
+        self.round_trips = 0
+        self.version_checks = 0
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        """查询表数据前记录，回填时传给fill"""
+        return self._generation
+
+    def validate(self):
+        """检查数据库是否被其它连接修改过（当前线程首次检查时视为已修改），是则清空缓存"""
+        connection = self._db.connection
+        version = connection.execute("PRAGMA data_version").fetchone()[0]
+        seen = (id(connection), version)
+        with self._lock:
+            self.version_checks += 1
+            if getattr(self._local, "seen", None) != seen:
+                if self._data or self.all_loaded:
+                    self.invalidations += 1
+                self._data.clear()
+                self.all_loaded = False
+                self._generation += 1
+            self._local.seen = seen
+
+    def lookup(self, key):
+        """
+        :return: 命中时返回缓存的行，未命中返回MemoryTier._MISSING
+        """
+        self.validate()
+        with self._lock:
+            if self._in_batch() and key in self._pending():
+                # 事务内写过的key读取自己的写入，不使用其它线程回填的已提交数据
+                row = self._pending()[key]
+            else:
+                row = self._data.get(key, self._MISSING)
+            if row is self._MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return row
+
+    def fill(self, key, row, generation: int) -> bool:
+        """
+        查询结果回填
+        :param generation: 查询前的写入代数，之后有过写入时不回填
+        :return: 是否已回填
+        """
+        with self._lock:
+            if generation != self._generation or self._in_batch():
+                return False
+            self._data[key] = row
+            return True
+
+    def fill_all(self, rows: Iterable, generation: int) -> bool:
+        """全表查询结果回填，成功时标记all_loaded"""
+        with self._lock:
+            if generation != self._generation or self._in_batch():
+                return False
+            for key, row in rows:
+                self._data[key] = row
+            self.all_loaded = True
+            return True
+
+    def put(self, key, row):
+        """写入方落库后调用；batch()事务内先移除，提交后再写入"""
+        with self._lock:
+            self._generation += 1
+            if self._in_batch():
+                self._data.pop(key, None)
+                self._pending()[key] = row
+            else:
+                self._data[key] = row
+
+    def discard(self, key):
+        with self._lock:
+            self._generation += 1
+            self._data.pop(key, None)
+            if self._in_batch():
+                # 提交时再移除一次，事务内的查询回源
+                self._pending()[key] = self._MISSING
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+            self.all_loaded = False
+            self._local.pending = {}
+
+    def _in_batch(self) -> bool:
+        return self._db.connection_manager.batch_depth > 0
+
+    def _pending(self) -> dict:
+        """当前线程batch()事务内待写入缓存的行"""
+        pending = getattr(self._local, "pending", None)
+        if pending is None:
+            pending = self._local.pending = {}
+        return pending
+
+    def _apply_pending(self):
+        pending = getattr(self._local, "pending", None)
+        if not pending:
+            return
+        self._local.pending = {}
+        with self._lock:
+            self._generation += 1
+            for key, row in pending.items():
+                if row is self._MISSING:
+                    self._data.pop(key, None)
+                else:
+                    self._data[key] = row
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def count_round_trip(self):
+        self.round_trips += 1
+
+    @property
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "round_trips": self.round_trips,
+                "version_checks": self.version_checks, "invalidations": self.invalidations}
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+def get_tier(db: SQLiteDB, table: str) -> MemoryTier:
+    """获取(数据库文件, 表)对应的进程内缓存层"""
+    key = (db.connection_manager.db_path, table)
+    with _tiers_lock:
+        tier = _tiers.get(key)
+        if tier is None:
+            tier = _tiers[key] = MemoryTier(db)
+        return tier
+
+
+_session_listeners: List[Callable[[], None]] = []
+
+
+def add_session_listener(listener: Callable[[], None]):
+    """注册会话数据（config表、共享headers）变更的监听函数，写入完成后在写入方进程中调用"""
+    _session_listeners.append(listener)
+
+
+def _notify_session_change():
+    for listener in _session_listeners:
+        listener()
+
+
+def _loads(text):
+    """json文本反序列化，None表示数据不存在"""
+    if text is None:
+        return None
+    return json.loads(text)
+
+
 class Config(SQLiteDB):
     def __init__(self):
         super(Config, self).__init__()
         self.table = DataBase.CONFIG_TABLE
+        self.tier = get_tier(self, self.table)
 
     def set(self, key: str, value):
-        sql = f"""insert into {self.table}(key,value) values (:key,:value)"""
+        sql = f"""insert into {self.table}(key,value) values (:key,:value)
+                  on conflict(key) do update set value=excluded.value"""
         value = json.dumps(value)
-        try:
-            self.execute_sql(sql, (key, value))
-        except sqlite3.IntegrityError as ie:
-            logger.debug(f"config全局配置已加载=====>key: {key}, value: {value}")
-            self.connection.commit()
-            sql = "update {} set value=? where key=?".format(self.table)
-            self.execute_sql(sql, (value, key))
+        self.tier.validate()
+        self.tier.count_round_trip()
+        self.execute_sql(sql, (key, value))
+        self.tier.put(key, value)
+        _notify_session_change()
 
     def get(self, key: str):
-        sql = f"""select value from {self.table} where key=:key"""
-        query_res = self.query_sql(sql, (key,))
-        try:
-            res = query_res[0][0]
-        except IndexError:
-            return None
-        res = json.loads(res)
+        res = self.tier.lookup(key)
+        if res is MemoryTier._MISSING:
+            generation = self.tier.generation
+            sql = f"""select value from {self.table} where key=:key"""
+            self.tier.count_round_trip()
+            query_res = self.query_sql(sql, (key,))
+            try:
+                res = query_res[0][0]
+            except IndexError:
+                res = None
+            self.tier.fill(key, res, generation)
+        return _loads(res)
 
-        return res
+    def set_many(self, mapping: Dict):
+        """
+        批量写入配置，单个事务内executemany + upsert，已存在的key直接更新
+        :param mapping: {key:value,...}
+        """
+        rows = [(key, json.dumps(value)) for key, value in mapping.items()]
+        if not rows:
+            return
+        sql = f"""insert into {self.table}(key,value) values (?,?)
+                  on conflict(key) do update set value=excluded.value"""
+        self.tier.validate()
+        self.tier.count_round_trip()
+        self.executemany_sql(sql, rows)
+        for key, value in rows:
+            self.tier.put(key, value)
+        _notify_session_change()
+
+    def get_many(self, keys: Iterable[str]) -> dict:
+        """
+        批量读取配置，缓存层未命中的key合并为一次查询
+        :return: {key:value,...}，不存在的key值为None
+        """
+        texts = {}
+        missing = []
+        for key in keys:
+            res = self.tier.lookup(key)
+            if res is MemoryTier._MISSING:
+                missing.append(key)
+            else:
+                texts[key] = res
+        if missing:
+            generation = self.tier.generation
+            sql = f"""select key,value from {self.table} where key in ({','.join('?' * len(missing))})"""
+            self.tier.count_round_trip()
+            found = dict(self.query_sql(sql, missing))
+            for key in missing:
+                texts[key] = found.get(key)
+                self.tier.fill(key, texts[key], generation)
+        return {key: _loads(text) for key, text in texts.items()}
 
     def get_all(self) -> dict:
         """
         获取config表所有数据
         :return: {key:value,...}
         """
+        self.tier.validate()
+        if self.tier.all_loaded:
+            self.tier.hits += 1
+            return {k: json.loads(v) for k, v in self.tier.items() if v is not None}
+        self.tier.misses += 1
+        generation = self.tier.generation
+        self.tier.count_round_trip()
         all_data = self.select_data(self.table)
-        dic = {}
-        for m in all_data:
-            dic[m[0]] = json.loads(m[1])
-        return dic
+        self.tier.fill_all(((m[0], m[1]) for m in all_data), generation)
+        return {m[0]: json.loads(m[1]) for m in all_data}
 
     def clear(self):
         """清空表"""
         sql = """delete from {}""".format(self.table)
+        self.tier.count_round_trip()
         self.execute_sql(sql)
+        self.tier.clear()
+        _notify_session_change()
 
     def del_(self, where: dict = None):
         """根据条件删除"""
         sql = """delete from {}""".format(self.table)
         if where is not None:
             sql += ' where {};'.format(self.dict_to_str_and(where))
+        self.tier.count_round_trip()
         self.execute_sql(sql)
+        self.tier.clear()
+        _notify_session_change()
 
 
 class Schema(SQLiteDB):
     def __init__(self):
         super(Schema, self).__init__()
         self.table = DataBase.SCHEMA_TABLE
+        self.tier = get_tier(self, self.table)
 
     def set(self, key: str, value):
-        sql = f"""insert into {self.table} (api_name,schema) values (:key,:value)"""
-        try:
-            self.execute_sql(sql, (key, json.dumps(value)))
-        except sqlite3.IntegrityError:
+        if self.tier.lookup(key) not in (MemoryTier._MISSING, None):
             logger.debug(f"Schema表插入重复数据，key: {key},已被忽略！")
-            self.connection.commit()
+            return
+        sql = f"""insert into {self.table} (api_name,schema) values (:key,:value)
+                  on conflict(api_name) do nothing"""
+        self.tier.count_round_trip()
+        self.execute_sql(sql, (key, json.dumps(value)))
+        # 可能因其它进程已写入而被忽略，下次读取时回源
+        self.tier.discard(key)
 
-    def get(self, key: str):
-        sql = f"""select schema from {self.table} where api_name=:key"""
-        query_res = self.query_sql(sql, (key,))
-        try:
-            res = query_res[0][0]
-        except IndexError:
-            return None
-        res = json.loads(res)
+    def update(self, key: str, value):
+        """写入jsonschema，已存在时覆盖（用于合并新样本后的schema）"""
+        sql = f"""insert into {self.table} (api_name,schema) values (:key,:value)
+                  on conflict(api_name) do update set schema=excluded.schema"""
+        value = json.dumps(value)
+        self.tier.validate()
+        self.tier.count_round_trip()
+        self.execute_sql(sql, (key, value))
+        self.tier.put(key, value)
 
-        return res
+    def set_many(self, mapping: Dict):
+        """
+        批量写入jsonschema，单个事务内executemany，与set一致：已存在的api_name保持不变
+        :param mapping: {api_name:schema,...}
+        """
+        rows = [(key, json.dumps(value)) for key, value in mapping.items()]
+        if not rows:
+            return
+        sql = f"""insert into {self.table} (api_name,schema) values (?,?) on conflict(api_name) do nothing"""
+        self.tier.validate()
+        self.tier.count_round_trip()
+        self.executemany_sql(sql, rows)
+        for key, _ in rows:
+            # 无法得知哪些行因冲突被忽略，下次读取时回源
+            self.tier.discard(key)
+
+    def get_many(self, keys: Iterable[str]) -> dict:
+        """
+        批量读取jsonschema
+        :return: {api_name:schema,...}，不存在的值为None
+        """
+        texts = {}
+        missing = []
+        for key in keys:
+            res = self.tier.lookup(key)
+            if res is MemoryTier._MISSING:
+                missing.append(key)
+            else:
+                texts[key] = res
+        if missing:
+            generation = self.tier.generation
+            sql = f"""select api_name,schema from {self.table} where api_name in ({','.join('?' * len(missing))})"""
+            self.tier.count_round_trip()
+            found = dict(self.query_sql(sql, missing))
+            for key in missing:
+                texts[key] = found.get(key)
+                self.tier.fill(key, texts[key], generation)
+        return {key: _loads(text) for key, text in texts.items()}
+
+    def get(self, key: str, raw: bool = False):
+        """
+        :param raw: 为True时返回未反序列化的json文本
+        """
+        res = self.tier.lookup(key)
+        if res is MemoryTier._MISSING:
+            generation = self.tier.generation
+            sql = f"""select schema from {self.table} where api_name=:key"""
+            self.tier.count_round_trip()
+            query_res = self.query_sql(sql, (key,))
+            try:
+                res = query_res[0][0]
+            except IndexError:
+                res = None
+            self.tier.fill(key, res, generation)
+        return res if raw else _loads(res)
 
     def clear(self):
         sql = """delete from {}""".format(self.table)
+        self.tier.count_round_trip()
         self.execute_sql(sql)
+        self.tier.clear()
 
     def del_(self, where: dict = None):
         """根据条件删除"""
         sql = """delete from {}""".format(self.table)
         if where is not None:
             sql += ' where {};'.format(self.dict_to_str_and(where))
+        self.tier.count_round_trip()
         self.execute_sql(sql)
+        self.tier.clear()
 
     def count(self):
         """数量统计"""
         sql = f"""select count(*) from {self.table}"""
+        self.tier.count_round_trip()
         try:
             res = self.query_sql(sql)[0][0]
         except IndexError:
@@ -109,48 +417,167 @@ class Schema(SQLiteDB):
         return res
 
 
+# 共享命名空间在cache表中的worker列取值
+SHARED_NAMESPACE = "__shared__"
+# 始终读写共享命名空间的key（兼容原有headers全局共享的行为）
+SHARED_KEYS = frozenset({"headers"})
+# 共享命名空间中的token状态（有效期、版本号），由aomaker.credential维护
+CREDENTIAL_KEY = "__credential__"
+# 写入后需要刷新会话快照的共享数据
+SESSION_KEYS = SHARED_KEYS | {CREDENTIAL_KEY}
+
+
+class WorkerNamespace:
+    """
+    单个worker私有的内存缓存，只有该worker（线程或进程）读写，不经过数据库
+    行为{"response": json文本, "api_info": json文本}，读取时重新反序列化，避免调用方修改返回值污染缓存
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._rows: Dict[str, dict] = {}
+        # worker内的协程/用户自建线程可能同时访问
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        return self._rows.get(key)
+
+    def set(self, key: str, response: str, api_info: Optional[str]) -> bool:
+        """与原有语义一致：已存在的key被忽略（原值为null时覆盖）"""
+        with self._lock:
+            row = self._rows.get(key)
+            if row is not None and row["response"] not in (None, "null"):
+                return False
+            self._rows[key] = {"response": response, "api_info": api_info}
+            return True
+
+    def update(self, key: str, response: str) -> bool:
+        with self._lock:
+            row = self._rows.get(key)
+            if row is None:
+                return False
+            self._rows[key] = {"response": response, "api_info": row["api_info"]}
+            return True
+
+    def pop(self, key: str) -> Optional[dict]:
+        with self._lock:
+            return self._rows.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+    def remove_where(self, conditions: dict) -> int:
+        """
+        按与Cache.del_相同的条件删除：var_name、response、api_info的值按json文本比较，
+        值为None时与sql中的"=null"一致，不匹配任何行
+        :return: 删除的行数
+        """
+        conditions = {field: None if value is None else str(value) for field, value in conditions.items()}
+        if None in conditions.values():
+            return 0
+        with self._lock:
+            keys = [key for key, row in self._rows.items()
+                    if all((key if field == DataBase.CACHE_VAR_NAME else row[field]) == value
+                           for field, value in conditions.items())]
+            for key in keys:
+                del self._rows[key]
+        return len(keys)
+
+    def keys(self) -> List[str]:
+        return list(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+
+_namespaces: Dict[str, WorkerNamespace] = {}
+_namespaces_lock = threading.Lock()
+
+
+def get_namespace(worker: str = None) -> WorkerNamespace:
+    """获取worker的私有命名空间，默认为当前worker"""
+    worker = worker or _get_worker()
+    namespace = _namespaces.get(worker)
+    if namespace is None:
+        with _namespaces_lock:
+            namespace = _namespaces.setdefault(worker, WorkerNamespace(worker))
+    return namespace
+
+
 class Cache(SQLiteDB):
+    """
+    用例间传递的缓存数据，分为两层命名空间：
+    1.worker命名空间：每个worker（线程或进程）私有的内存缓存，set/get/update默认读写这里，worker之间互不干扰也无锁竞争
+    2.共享命名空间：cache表中worker为__shared__的行，存放headers等全局数据，所有worker可读，
+      通过set_shared/get_shared读写，由promote将worker命名空间的数据显式提升为共享数据
+    SHARED_KEYS中的key（headers）始终读写共享命名空间
+
+    注意：
+    1.worker命名空间的数据保存在进程内存中，运行期间不会淘汰，只在clear/del_或运行结束时释放；
+      常驻worker（--persistent）在整个运行期间累积所有用例缓存的响应，缓存大响应时请及时用del_({"var_name": key})删除不再需要的数据
+    2.worker命名空间的数据不再写入cache表，直接查询cache表的工具（如查看缓存）只能看到共享命名空间的数据，
+      需要在worker之外查看的数据请用set_shared写入或promote提升为共享数据
+    3.select_field只支持response、api_info两列
+    """
+    SELECT_FIELDS = (DataBase.CACHE_RESPONSE, DataBase.CACHE_API_INFO)
+    # del_支持的条件字段，worker命名空间中的行只有这些字段
+    DEL_FIELDS = (DataBase.CACHE_VAR_NAME, DataBase.CACHE_WORKER, DataBase.CACHE_RESPONSE, DataBase.CACHE_API_INFO)
+
     def __init__(self):
         super(Cache, self).__init__()
         self.table = DataBase.CACHE_TABLE
+        self.tier = get_tier(self, self.table)
+
+    # ---------- worker命名空间 ----------
 
     def set(self, key: str, value, api_info=None):
-        sql = f"""insert into {self.table} (var_name,response,worker) values (:key,:value,:worker)"""
-        worker = _get_worker()
-        if self.get(key) is not None:
-            logger.debug(f"缓存插入重复数据, key:{key}，worker:{worker}，已被忽略！")
-            return
-        try:
-            if api_info:
-                sql = f"""insert into {self.table} (var_name,response,worker,api_info) values (:key,:value,:worker,:api_info)"""
-                self.execute_sql(sql, (key, json.dumps(value), worker, json.dumps(api_info)))
-            else:
-                self.execute_sql(sql, (key, json.dumps(value), worker))
-        except sqlite3.IntegrityError as e:
-            raise e
+        if not self.set_many({key: value}, api_info=api_info):
+            logger.debug(f"缓存插入重复数据, key:{key}，worker:{_get_worker()}，已被忽略！")
 
-    def update(self, key, value):
-        key_value = {"response": json.dumps(value)}
-        worker = _get_worker()
-        condition = {"worker": worker, "var_name": key}
-        self.update_data(self.table, key_value, where=condition)
-        logger.info(f"缓存数据更新完成, 表：{self.table},\n var_name: {key},\n response: {value},\n worker: {worker}")
+    def set_many(self, mapping: Dict, api_info=None):
+        """
+        批量写入缓存，与set一致：已存在的key被忽略（原值为null时覆盖）
+        :param mapping: {var_name:value,...}
+        :param api_info: 依赖接口信息，作用于本批所有key
+        :return: 实际写入的行数
+        """
+        api_info = json.dumps(api_info) if api_info else None
+        shared = {key: value for key, value in mapping.items() if key in SHARED_KEYS}
+        written = self._write_shared(shared, api_info, overwrite=False) if shared else 0
+        namespace = None
+        for key, value in mapping.items():
+            if key in SHARED_KEYS:
+                continue
+            namespace = namespace or get_namespace()
+            written += namespace.set(key, json.dumps(value), api_info)
+        return written
 
     def get(self, key: str, select_field="response"):
-        worker = _get_worker()
-        if key == "headers":
-            sql = f"""select {select_field} from {self.table} where var_name=:key"""
-            query_res = self.query_sql(sql, (key,))
-        else:
-            sql = f"""select {select_field} from {self.table} where var_name=:key and worker=:worker"""
-            query_res = self.query_sql(sql, (key, worker))
-        try:
-            res = query_res[0][0]
-        except IndexError:
+        self._check_select_field(select_field)
+        row = self._get_shared_row(key) if key in SHARED_KEYS else get_namespace().get(key)
+        if row is None:
             return None
-        res = json.loads(res)
+        return _loads(row[select_field])
 
-        return res
+    def get_many(self, keys: Iterable[str], select_field="response") -> dict:
+        """
+        批量读取缓存
+        :return: {var_name:value,...}，不存在的值为None
+        """
+        return {key: self.get(key, select_field) for key in keys}
+
+    def update(self, key, value):
+        if key in SHARED_KEYS:
+            self.set_shared(key, value)
+            return
+        response = json.dumps(value)
+        get_namespace().update(key, response)
+        logger.info(f"缓存数据更新完成, 表：{self.table},\n var_name: {key},\n response: {value},\n worker: {_get_worker()}")
+
+    def _check_select_field(self, select_field: str):
+        if select_field not in self.SELECT_FIELDS:
+            raise ValueError(f"缓存不支持读取字段：{select_field}，可选：{'、'.join(self.SELECT_FIELDS)}")
 
     def get_by_jsonpath(self, key: str, jsonpath_expr, expr_index: int = 0):
         res = self.get(key)
@@ -160,15 +587,229 @@ class Cache(SQLiteDB):
         extract_var = extract_var[expr_index]
         return extract_var
 
+    # ---------- 共享命名空间 ----------
+
+    def set_shared(self, key: str, value, api_info=None):
+        """写入共享数据，已存在时覆盖，所有worker可见"""
+        self._write_shared({key: value}, json.dumps(api_info) if api_info else None, overwrite=True)
+
+    def set_shared_many(self, mapping: Dict):
+        """在同一个事务中写入多个共享数据，其它worker不会读到只更新了一部分的数据"""
+        if mapping:
+            self._write_shared(mapping, None, overwrite=True)
+
+    def get_shared(self, key: str, select_field="response"):
+        self._check_select_field(select_field)
+        row = self._get_shared_row(key)
+        if row is None:
+            return None
+        return _loads(row[select_field])
+
+    def promote(self, *keys: str) -> int:
+        """
+        将当前worker命名空间中的数据提升为共享数据（覆盖共享命名空间中的同名数据）
+        :return: 提升的key数量，worker命名空间中不存在的key忽略
+        """
+        namespace = get_namespace()
+        rows = {}
+        for key in keys:
+            row = namespace.get(key)
+            if row is not None:
+                rows[key] = row
+        if not rows:
+            return 0
+        created_at = time.time()
+        self.tier.validate()
+        self.tier.count_round_trip()
+        self.executemany_sql(self._upsert_sql(overwrite=True),
+                             [(key, row["response"], SHARED_NAMESPACE, row["api_info"], created_at,
+                               len(row["response"])) for key, row in rows.items()])
+        for key in rows:
+            self.tier.discard(key)
+        if SESSION_KEYS.intersection(rows):
+            _notify_session_change()
+        return len(rows)
+
+    def _upsert_sql(self, overwrite: bool) -> str:
+        sql = f"""insert into {self.table} (var_name,response,worker,api_info,created_at,size)
+                  values (?,?,?,?,?,?)
+                  on conflict(var_name,worker) do update set
+                  response=excluded.response,api_info=excluded.api_info,
+                  created_at=excluded.created_at,size=excluded.size"""
+        if not overwrite:
+            sql += f" where {self.table}.response is null or {self.table}.response='null'"
+        return sql
+
+    def _write_shared(self, mapping: Dict, api_info: Optional[str], overwrite: bool) -> int:
+        created_at = time.time()
+        rows = []
+        for key, value in mapping.items():
+            value = json.dumps(value)
+            rows.append((key, value, SHARED_NAMESPACE, api_info, created_at, len(value)))
+        sql = self._upsert_sql(overwrite)
+        self.tier.validate()
+        self.tier.count_round_trip()
+        if len(rows) == 1:
+            written = self.execute_sql(sql, rows[0]).rowcount
+        else:
+            written = self.executemany_sql(sql, rows)
+        for key in mapping:
+            self.tier.discard(key)
+        if SESSION_KEYS.intersection(mapping):
+            _notify_session_change()
+        return written
+
+    def _get_shared_row(self, key: str) -> Optional[dict]:
+        row = self.tier.lookup(key)
+        if row is not MemoryTier._MISSING:
+            return row
+        generation = self.tier.generation
+        sql = f"""select response,api_info from {self.table} where var_name=? and worker=?"""
+        self.tier.count_round_trip()
+        query_res = self.query_sql(sql, (key, SHARED_NAMESPACE))
+        try:
+            response, api_info = query_res[0]
+        except IndexError:
+            row = None
+        else:
+            row = {"response": response, "api_info": api_info}
+        self.tier.fill(key, row, generation)
+        return row
+
+    # ---------- 清理 ----------
+
     def clear(self):
+        """清空共享数据和当前进程内所有worker的命名空间"""
         sql = """delete from {}""".format(self.table)
+        self.tier.count_round_trip()
         self.execute_sql(sql)
+        self.tier.clear()
+        with _namespaces_lock:
+            for namespace in _namespaces.values():
+                namespace.clear()
 
     def del_(self, where: dict = None):
-        """根据条件删除"""
+        """
+        根据条件删除，条件同时作用于当前进程内的worker命名空间
+        worker命名空间中只有var_name、worker、response、api_info，按其它字段删除时抛出ValueError
+        """
+        where = where or {}
+        unsupported = set(where) - set(self.DEL_FIELDS)
+        if unsupported:
+            raise ValueError(f"缓存不支持按字段删除：{'、'.join(sorted(unsupported))}，可选：{'、'.join(self.DEL_FIELDS)}")
         sql = """delete from {}""".format(self.table)
-        if where is not None:
+        if where:
             sql += ' where {};'.format(self.dict_to_str_and(where))
+        self.tier.count_round_trip()
+        self.execute_sql(sql)
+        self.tier.clear()
+        with _namespaces_lock:
+            namespaces = [ns for name, ns in _namespaces.items()
+                          if DataBase.CACHE_WORKER not in where or where[DataBase.CACHE_WORKER] == name]
+        conditions = {field: value for field, value in where.items() if field != DataBase.CACHE_WORKER}
+        for namespace in namespaces:
+            if conditions:
+                namespace.remove_where(conditions)
+            else:
+                namespace.clear()
+
+
+class Duration(SQLiteDB):
+    # 历史耗时按指数移动平均更新，新一次耗时所占权重
+    SMOOTHING = 0.5
+
+    def __init__(self):
+        super(Duration, self).__init__()
+        self.table = DataBase.DURATION_TABLE
+
+    def record_many(self, mapping: Dict[str, float]) -> int:
+        """
+        批量记录用例耗时
+        :param mapping: {用例key:耗时(秒),...}
+        :return: 写入行数
+        """
+        now = time.time()
+        rows = [(key, seconds, now) for key, seconds in mapping.items()]
+        if not rows:
+            return 0
+        sql = f"""insert into {self.table}
+                  ({DataBase.DURATION_CASE_KEY},{DataBase.DURATION_SECONDS},{DataBase.DURATION_UPDATED_AT})
+                  values (?,?,?)
+                  on conflict({DataBase.DURATION_CASE_KEY}) do update set
+                  {DataBase.DURATION_SECONDS}={DataBase.DURATION_SECONDS}*{1 - self.SMOOTHING}
+                                             +excluded.{DataBase.DURATION_SECONDS}*{self.SMOOTHING},
+                  {DataBase.DURATION_RUNS}={DataBase.DURATION_RUNS}+1,
+                  {DataBase.DURATION_UPDATED_AT}=excluded.{DataBase.DURATION_UPDATED_AT}"""
+        return self.executemany_sql(sql, rows)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, float]:
+        """
+        批量读取用例历史耗时
+        :return: {用例key:耗时(秒),...}，没有历史记录的key不返回
+        """
+        keys = list(keys)
+        res = {}
+        # sqlite单条语句的参数个数有上限，分批查询
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            sql = f"""select {DataBase.DURATION_CASE_KEY},{DataBase.DURATION_SECONDS} from {self.table}
+                      where {DataBase.DURATION_CASE_KEY} in ({','.join('?' * len(part))})"""
+            res.update(self.query_sql(sql, part))
+        return res
+
+    def clear(self):
+        sql = """delete from {}""".format(self.table)
+        self.execute_sql(sql)
+
+
+class CaseResult(SQLiteDB):
+    """用例执行结果，各worker在用例结束时写入，同一用例（重试）以最后写入为准"""
+    COLUMNS = (DataBase.RESULT_CASE_KEY, DataBase.RESULT_FULL_NAME, DataBase.RESULT_NAME, DataBase.RESULT_STATUS,
+               DataBase.RESULT_DESCRIPTION, DataBase.RESULT_TRACE, DataBase.RESULT_START, DataBase.RESULT_STOP,
+               DataBase.RESULT_CASE_ID, DataBase.RESULT_PARAMETERS, DataBase.RESULT_TAGS, DataBase.RESULT_WORKER)
+
+    def __init__(self):
+        super(CaseResult, self).__init__()
+        self.table = DataBase.RESULT_TABLE
+
+    def record_many(self, rows: Iterable[dict]) -> int:
+        """
+        批量写入用例结果
+        :param rows: [{列名: 值,...},...]，parameters、tags为列表
+        :return: 写入行数
+        """
+        values = []
+        for row in rows:
+            row = dict(row)
+            row[DataBase.RESULT_PARAMETERS] = json.dumps(row.get(DataBase.RESULT_PARAMETERS) or [])
+            row[DataBase.RESULT_TAGS] = json.dumps(row.get(DataBase.RESULT_TAGS) or [])
+            values.append(tuple(row.get(column) for column in self.COLUMNS))
+        if not values:
+            return 0
+        sql = f"""insert or replace into {self.table} ({','.join(self.COLUMNS)})
+                  values ({','.join('?' * len(self.COLUMNS))})"""
+        return self.executemany_sql(sql, values)
+
+    def get_all(self) -> list:
+        """
+        读取全部用例结果
+        :return: [{列名: 值,...},...]，按开始时间排序
+        """
+        sql = f"""select {','.join(self.COLUMNS)} from {self.table} order by {DataBase.RESULT_START}"""
+        rows = []
+        for values in self.query_sql(sql):
+            row = dict(zip(self.COLUMNS, values))
+            row[DataBase.RESULT_PARAMETERS] = json.loads(row[DataBase.RESULT_PARAMETERS] or "[]")
+            row[DataBase.RESULT_TAGS] = json.loads(row[DataBase.RESULT_TAGS] or "[]")
+            rows.append(row)
+        return rows
+
+    def count(self) -> int:
+        sql = """select count(*) from {}""".format(self.table)
+        return self.query_sql(sql)[0][0]
+
+    def clear(self):
+        sql = """delete from {}""".format(self.table)
         self.execute_sql(sql)
 
 
@@ -182,6 +823,10 @@ def _get_worker():
     return worker[run_mode]
 
 
+set_initializer(DB_PATH, migrate)
+
 cache = Cache()
 config = Config()
 schema = Schema()
+duration = Duration()
+case_result = CaseResult()
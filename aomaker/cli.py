@@ -4,26 +4,23 @@ import sys
 from typing import List, Text
 
 import click
-from ruamel.yaml import YAML
-from emoji import emojize
 from click_help_colors import HelpColorsGroup, version_option
 
-from aomaker import __version__, __image__
+from aomaker import __version__
 from aomaker._constants import Conf
-from aomaker.log import logger, AoMakerLogger
 from aomaker.path import CONF_DIR, AOMAKER_YAML_PATH
 from aomaker.hook_manager import cli_hook
 from aomaker.param_types import QUOTED_STR
-from aomaker.scaffold import create_scaffold
-from aomaker.make import main_make
-from aomaker.make_testcase import main_case, main_make_case
-from aomaker.extension.har_parse import main_har2yaml
-from aomaker.extension.recording import filter_expression, main_record
-from aomaker.utils.utils import load_yaml
-from aomaker.models import AomakerYaml
+from aomaker.extension.recording import filter_expression
 
+# 各子命令的依赖（渲染模板、pydantic模型、pytest/allure、mitmproxy等）在子命令执行时才导入，
+# aomaker --help及每个子命令的启动只加载自身用到的模块
 SUBCOMMAND_RUN_NAME = "run"
-yaml = YAML()
+
+
+def emojize(text: str) -> str:
+    from emoji import emojize as _emojize
+    return _emojize(text)
 
 
 class OptionHandler:
@@ -49,6 +46,7 @@ class OptionHandler:
 @version_option(version=__version__, prog_name="aomaker", message_color="green")
 @click.pass_context
 def main(ctx):
+    from aomaker import __image__
     click.echo(__image__)
     if ctx.invoked_subcommand is None:
         click.echo(ctx.get_help())
@@ -68,13 +66,43 @@ def main(ctx):
               help="Distribute each test package under the test suite to a different worker.")
 @click.option("--dist-file", "d_file", help="Distribute each test file under the test package to a different worker.")
 @click.option("--dist-mark", "d_mark", help="Distribute each test mark to a different worker.", type=QUOTED_STR)
+@click.option("--dynamic", help="Collect tests first and let long-lived workers pull them in small chunks "
+                                "(multi-process mode). Dist mode only groups tests.", is_flag=True)
+@click.option("--chunk-size", "chunk_size", default=10, type=int, show_default=True,
+              help="Number of tests per chunk in dynamic mode.")
+@click.option("--persistent", is_flag=True,
+              help="Multi-process mode: preload modules in the parent and keep one warm pytest session per worker, "
+                   "feeding it test chunks like --dynamic.")
+@click.option("--collect-once", "collect_once", is_flag=True,
+              help="Collect tests once in the parent and send each dist group's node IDs to a worker "
+                   "(multi-process/multi-thread mode).")
+@click.option("--lpt", help="Balance tests across workers by historical durations, longest first "
+                            "(multi-process/multi-thread mode). Dist mode only selects tests.", is_flag=True)
+@click.option("--async-mode", "async_mode", is_flag=True,
+              help="Run async def tests concurrently on one event loop (per process/thread).")
+@click.option("--concurrency", default=100, type=int, show_default=True,
+              help="Max number of async tests in flight in async mode; number of workers in load mode.")
+@click.option("--load", multiple=True,
+              help="Load mode: drive an AO method or scenario function ('module:Class.method' or 'module:function') "
+                   "instead of running pytest. Can be given multiple times.")
+@click.option("--rps", default=0, type=float, show_default=True,
+              help="Target requests per second across all workers in load mode (0: unlimited).")
+@click.option("--duration", default=60, type=float, show_default=True, help="Duration in seconds of load mode.")
+@click.option("--live-report", "live_report", default=0, type=float, show_default=True,
+              help="Refresh reports/aomaker.html every N seconds during the run (0: only once at the end).")
 @click.option("--no_login", help="Don't login and make headers.", is_flag=True, flag_value=False, default=True)
 @click.option("--no_gen", help="Don't generate allure reports.", is_flag=True, flag_value=False, default=True)
 @click.pass_context
-def run(ctx, env, log_level, mp, mt, d_suite, d_file, d_mark, no_login, no_gen, processes, **custom_kwargs):
+def run(ctx, env, log_level, mp, mt, d_suite, d_file, d_mark, dynamic, chunk_size, persistent, collect_once, lpt,
+        async_mode, concurrency, load, rps, duration, live_report, no_login, no_gen, processes, **custom_kwargs):
     pytest_args = ctx.args
+    if async_mode:
+        pytest_args.append(f"--async-concurrency={concurrency}")
+    load_options = {"scenarios": list(load), "rps": rps, "concurrency": concurrency, "duration": duration} \
+        if load else None
     _run(ctx, env, log_level, mp, mt, d_suite, d_file, d_mark, no_login, no_gen, pytest_args, processes,
-         **custom_kwargs)
+         dynamic=dynamic, chunk_size=chunk_size, lpt=lpt, live_interval=live_report, persistent=persistent,
+         collect_once=collect_once, load_options=load_options, **custom_kwargs)
 
 
 @main.command()
@@ -85,6 +113,7 @@ def create(project_name):
     Arguments:\n
     PROJECT_NAME: Name of the project to create.
     """
+    from aomaker.scaffold import create_scaffold
     create_scaffold(project_name)
     click.echo(emojize(":beer_mug: 项目脚手架创建完成！"))
 
@@ -99,6 +128,7 @@ def make(file_path, template):
     Arguments:\n
     FILE_PATH: Specify YAML/Swagger file path.The file suffix must be '.yaml','.yml' or '.json'.
     """
+    from aomaker.make import main_make
     main_make(file_path, template)
     click.echo(emojize(":beer_mug: Api Object渲染完成！"))
 
@@ -111,6 +141,7 @@ def case(file_path):
     Arguments:\n
     FILE_PATH: YAML file path.
     """
+    from aomaker.make_testcase import main_case
     main_case(file_path)
     click.echo(emojize(":beer_mug: 用例脚本编写完成！"))
 
@@ -123,6 +154,7 @@ def mcase(file_path):
     Arguments:\n
     FILE_PATH: YAML file path.
     """
+    from aomaker.make_testcase import main_make_case
     main_make_case(file_path)
     click.echo(emojize(":beer_mug: 测试用例生产完成！"))
 
@@ -152,6 +184,7 @@ def har2y(har_path, yaml_path, filter_str, exclude_str, save_response, save_head
             self.save_response = save_response
             self.save_headers = save_headers
 
+    from aomaker.extension.har_parse import main_har2yaml
     main_har2yaml(Args())
     click.echo(emojize(":beer_mug: har转换yaml完成！"))
 
@@ -185,11 +218,13 @@ def record(file_name, filter_str, port, flow_detail, save_response, save_headers
             self.save_response = save_response
             self.save_headers = save_headers
 
+    from aomaker.extension.recording import main_record
     main_record(Args())
 
 
 def _run(ctx, env, log_level, mp, mt, d_suite, d_file, d_mark, no_login, no_gen, pytest_args, processes,
-         **custom_kwargs):
+         dynamic=False, chunk_size=10, lpt=False, live_interval=0, persistent=False,
+         collect_once=False, load_options=None, **custom_kwargs):
     if len(sys.argv) == 2:
         ctx.exit(ctx.get_help())
     # 执行自定义参数
@@ -199,21 +234,28 @@ def _run(ctx, env, log_level, mp, mt, d_suite, d_file, d_mark, no_login, no_gen,
         set_conf_file(env)
     if log_level != "info":
         click.echo(emojize(f":rocket:<AoMaker>切换日志等级：{log_level}"))
+        from aomaker.log import AoMakerLogger
         AoMakerLogger.change_level(log_level)
     login_obj = _handle_login(no_login)
+    if load_options:
+        click.echo("🚀<AoMaker> 压测模式准备启动...")
+        from aomaker.load import load_run
+        load_run(login=login_obj, **load_options)
+        ctx.exit()
     from aomaker.runner import run as runner_run, processes_run, threads_run
     if mp:
         click.echo("🚀<AoMaker> 多进程模式准备启动...")
         processes_run(_handle_dist_mode(d_mark, d_file, d_suite), login=login_obj, extra_args=pytest_args,
-                      is_gen_allure=no_gen, process_count=processes)
+                      is_gen_allure=no_gen, process_count=processes, dynamic=dynamic, chunk_size=chunk_size,
+                      lpt=lpt, live_interval=live_interval, persistent=persistent, collect_once=collect_once)
         ctx.exit()
     elif mt:
         click.echo("🚀<AoMaker> 多线程模式准备启动...")
         threads_run(_handle_dist_mode(d_mark, d_file, d_suite), login=login_obj, extra_args=pytest_args,
-                    is_gen_allure=no_gen)
+                    is_gen_allure=no_gen, lpt=lpt, live_interval=live_interval, collect_once=collect_once)
         ctx.exit()
     click.echo("🚀<AoMaker> 单进程模式准备启动...")
-    runner_run(pytest_args, login=login_obj, is_gen_allure=no_gen)
+    runner_run(pytest_args, login=login_obj, is_gen_allure=no_gen, live_interval=live_interval)
     ctx.exit()
 
 
@@ -227,6 +269,8 @@ def _handle_login(is_login: bool):
 
 
 def set_conf_file(env):
+    from ruamel.yaml import YAML
+    yaml = YAML()
     conf_path = os.path.join(CONF_DIR, Conf.CONF_NAME)
     if os.path.exists(conf_path):
         with open(conf_path) as f:
@@ -272,6 +316,8 @@ def _handle_aomaker_yaml() -> List[Text]:
     if not os.path.exists(AOMAKER_YAML_PATH):
         click.echo(emojize(f':confounded_face: aomaker策略文件{AOMAKER_YAML_PATH}不存在！'))
         sys.exit(1)
+    from aomaker.utils.utils import load_yaml
+    from aomaker.models import AomakerYaml
     yaml_data = load_yaml(AOMAKER_YAML_PATH)
     content = AomakerYaml(**yaml_data)
     targets = content.target
@@ -321,14 +367,29 @@ def main_run(env: str = None,
              d_suite: str = None,
              d_file: str = None,
              d_mark: str = None,
+             dynamic: bool = False,
+             chunk_size: int = None,
+             persistent: bool = False,
+             collect_once: bool = False,
+             lpt: bool = False,
+             async_mode: bool = False,
+             concurrency: int = None,
+             load: List[str] = None,
+             rps: float = None,
+             duration: float = None,
+             live_report: float = None,
              no_login: bool = True,
              no_gen: bool = True,
              pytest_args: List[str] = None,
              **custom_kwargs):
+    from aomaker import __image__
     print(__image__)
     cli_hook()
 
     from click.testing import CliRunner
+    from aomaker.log import get_aomaker_logger
+    # CliRunner执行期间会替换sys.stdout，日志输出需在此之前创建，否则控制台日志会被CliRunner捕获
+    get_aomaker_logger()
     runner = CliRunner()
     args = []
 
@@ -346,6 +407,28 @@ def main_run(env: str = None,
         args.extend(["--dist-file", d_file])
     if d_mark:
         args.extend(["--dist-mark", d_mark])
+    if dynamic:
+        args.append("--dynamic")
+    if chunk_size:
+        args.extend(["--chunk-size", str(chunk_size)])
+    if persistent:
+        args.append("--persistent")
+    if collect_once:
+        args.append("--collect-once")
+    if lpt:
+        args.append("--lpt")
+    if async_mode:
+        args.append("--async-mode")
+    if concurrency:
+        args.extend(["--concurrency", str(concurrency)])
+    for scenario in load or []:
+        args.extend(["--load", scenario])
+    if rps:
+        args.extend(["--rps", str(rps)])
+    if duration:
+        args.extend(["--duration", str(duration)])
+    if live_report:
+        args.extend(["--live-report", str(live_report)])
     if not no_login:
         args.append("--no_login")
     if not no_gen:
@@ -361,10 +444,11 @@ def main_run(env: str = None,
 
     result = runner.invoke(run, args=args, standalone_mode=False)
     if result.exit_code != 0:
-        from aomaker.cache import cache, config
+        from aomaker.cache import cache
+        from aomaker.snapshot import session_snapshot
+        session_snapshot.close()
         cache.clear()
-        cache.close()
-        config.close()
+        cache.close_all()
         raise result.exception
 
 
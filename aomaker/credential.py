@@ -0,0 +1,227 @@
+# --coding:utf-8--
+"""
+token有效期跟踪与headers轮换
+BaseLogin.TOKEN_TTL（或重写token_ttl）声明token有效期后：
+1.主进程登录后记录token状态（版本号、过期时间、刷新时间）到共享命名空间，随会话快照发布给各worker
+2.主进程启动后台线程，在刷新时间到达时重新登录，新headers和token状态在同一个事务中写入，所有worker同时切换
+3.BaseApi每次请求前检查token状态：版本号变化时切换为新headers；token已过期（如后台刷新失败）时同步刷新，
+  AsyncBaseApi在线程池中刷新，不阻塞事件循环
+刷新是single-flight的：进程内由锁保证只有一个线程登录，进程间通过token状态中的租约（refreshing_until）保证只有一个进程登录，
+其它进程等待新版本发布，不会重复登录
+"""
+import os
+import time
+import asyncio
+import threading
+import functools
+from typing import Mapping, Optional, Tuple
+
+from aomaker.cache import cache, CREDENTIAL_KEY
+from aomaker.snapshot import session_snapshot
+from aomaker.log import logger
+
+# 登录的最长耗时（秒），超过后租约失效，其它进程可以接手刷新
+LOGIN_TIMEOUT = 60
+# 刷新失败后的重试间隔（秒）
+RETRY_INTERVAL = 10
+# 等待其它进程刷新时的轮询间隔（秒）
+POLL_INTERVAL = 0.2
+
+
+class CredentialManager:
+
+    def __init__(self):
+        self.login_obj = None
+        self.refresh_count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+        # 登录期间的请求（如login中调用了BaseApi）不再触发刷新
+        self._local = threading.local()
+
+    def start(self, login_obj, resp_login=None):
+        """
+        登录完成后记录token状态，声明了有效期时启动后台刷新线程
+        :param login_obj: BaseLogin对象，为None时不跟踪
+        :param resp_login: 登录接口的响应，传给login_obj.token_ttl
+        """
+        self.login_obj = login_obj
+        ttl = login_obj.token_ttl(resp_login) if login_obj else None
+        cache.set_shared(CREDENTIAL_KEY, self._new_state(1, ttl))
+        if ttl:
+            self._stop.clear()
+            self._refresher = threading.Thread(target=self._loop, name="aomaker-credential", daemon=True)
+            self._refresher.start()
+            logger.info(f"<AoMaker> token有效期：{ttl}s，将在过期前{self._ahead(ttl)}s自动刷新")
+
+    def stop(self):
+        self._stop.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+        self.login_obj = None
+
+    @property
+    def state(self) -> Mapping:
+        """当前token状态：{"generation": 版本号, "expires_at": 过期时间, "refresh_at": 刷新时间, ...}"""
+        snapshot = session_snapshot.get()
+        if snapshot is not None:
+            return snapshot.credential
+        return cache.get_shared(CREDENTIAL_KEY) or {}
+
+    @property
+    def generation(self) -> int:
+        return self.state.get("generation", 0)
+
+    @staticmethod
+    def headers() -> dict:
+        """当前全局headers"""
+        snapshot = session_snapshot.get()
+        if snapshot is not None:
+            return dict(snapshot.headers)
+        return cache.get_shared("headers") or {}
+
+    def ensure_fresh(self):
+        """请求前调用：到达刷新时间且本进程没有后台刷新线程时刷新，token已过期时等待刷新完成"""
+        due = self._due()
+        if due is not None:
+            self.refresh(*due)
+
+    async def aensure_fresh(self):
+        """
+        协程版ensure_fresh，供AsyncBaseApi使用
+        登录和等待其它进程刷新都是阻塞的，放到线程池中执行，不阻塞事件循环上的其它协程
+        """
+        due = self._due()
+        if due is None:
+            return
+        if self.login_obj is None:
+            # 本进程不能登录，在事件循环上轮询等待其它进程发布新版本
+            if due[1]:
+                await self._await_generation(due[0])
+            return
+        await asyncio.get_running_loop().run_in_executor(None, functools.partial(self.refresh, *due))
+
+    def _due(self) -> Optional[Tuple[int, bool]]:
+        """
+        检查是否需要刷新
+        :return: 不需要刷新时返回None，否则返回(当前版本号, token是否已过期)
+        """
+        state = self.state
+        refresh_at = state.get("refresh_at")
+        if not refresh_at or getattr(self._local, "logging_in", False):
+            return None
+        now = time.time()
+        if now < refresh_at:
+            return None
+        expired = now >= state["expires_at"]
+        # 后台线程或其它进程正在刷新时，token过期前不必等待
+        if not expired and (self._refresher is not None or (state.get("refreshing_until") or 0) > now):
+            return None
+        return state["generation"], expired
+
+    def refresh(self, expected_generation: int = None, wait: bool = False) -> bool:
+        """
+        重新登录并轮换headers
+        :param expected_generation: 只在当前版本号等于该值时刷新，已被其它线程/进程刷新时直接返回
+        :param wait: 其它进程正在刷新时，是否等待新版本发布
+        :return: 本次是否由当前进程完成了刷新
+        """
+        if self.login_obj is None:
+            # 本进程没有登录对象（如spawn启动的worker），只能等待其它进程刷新
+            if wait and expected_generation is not None:
+                self._wait_generation(expected_generation)
+            return False
+        with self._lock:
+            state = cache.get_shared(CREDENTIAL_KEY) or {}
+            generation = state.get("generation", 0)
+            if expected_generation is not None and generation != expected_generation:
+                return False
+            if not self._acquire_lease(generation):
+                if wait:
+                    self._wait_generation(generation)
+                return False
+            self._local.logging_in = True
+            try:
+                resp = self.login_obj.login()
+                headers = self.login_obj.make_headers(resp)
+                ttl = self.login_obj.token_ttl(resp)
+            except Exception as e:
+                self._release_lease(generation)
+                logger.error(f"<AoMaker> token刷新失败：{e}")
+                return False
+            finally:
+                self._local.logging_in = False
+            # headers与token状态在同一个事务中写入，worker不会读到新旧混合的数据
+            cache.set_shared_many({"headers": headers, CREDENTIAL_KEY: self._new_state(generation + 1, ttl)})
+            self.refresh_count += 1
+        logger.info(f"<AoMaker> token已刷新，当前版本：{generation + 1}")
+        return True
+
+    def _loop(self):
+        while True:
+            refresh_at = self.state.get("refresh_at")
+            if not refresh_at:
+                return
+            if self._stop.wait(max(refresh_at - time.time(), 0)):
+                return
+            if not self.refresh(self.generation, wait=True) and time.time() >= self.state.get("refresh_at", 0):
+                # 刷新失败（未被其它进程刷新），稍后重试
+                if self._stop.wait(RETRY_INTERVAL):
+                    return
+
+    def _ahead(self, ttl: float) -> float:
+        """提前刷新的时长，不超过有效期的一半"""
+        return min(self.login_obj.TOKEN_REFRESH_AHEAD, ttl / 2)
+
+    def _new_state(self, generation: int, ttl: Optional[float]) -> dict:
+        now = time.time()
+        return {
+            "generation": generation,
+            "refreshed_at": now,
+            "expires_at": now + ttl if ttl else None,
+            "refresh_at": now + ttl - self._ahead(ttl) if ttl else None,
+            "refreshing_until": None,
+        }
+
+    @staticmethod
+    def _acquire_lease(generation: int) -> bool:
+        """在数据库写锁内检查并设置租约，同一版本只有一个进程能获得"""
+        with cache.batch():
+            state = cache.get_shared(CREDENTIAL_KEY) or {}
+            if state.get("generation", 0) != generation or (state.get("refreshing_until") or 0) > time.time():
+                return False
+            state["refreshing_until"] = time.time() + LOGIN_TIMEOUT
+            cache.set_shared(CREDENTIAL_KEY, state)
+        return True
+
+    @staticmethod
+    def _release_lease(generation: int):
+        with cache.batch():
+            state = cache.get_shared(CREDENTIAL_KEY) or {}
+            if state.get("generation", 0) == generation:
+                state["refreshing_until"] = None
+                cache.set_shared(CREDENTIAL_KEY, state)
+
+    def _wait_generation(self, generation: int):
+        """等待其它进程发布新版本，最长等待LOGIN_TIMEOUT"""
+        deadline = time.time() + LOGIN_TIMEOUT
+        while self.generation == generation and time.time() < deadline:
+            time.sleep(POLL_INTERVAL)
+
+    async def _await_generation(self, generation: int):
+        """协程版_wait_generation"""
+        deadline = time.time() + LOGIN_TIMEOUT
+        while self.generation == generation and time.time() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def _after_fork(self):
+        # 后台刷新线程不会被fork到子进程，子进程在请求时按需刷新
+        self._lock = threading.Lock()
+        self._refresher = None
+
+
+credential_manager = CredentialManager()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=credential_manager._after_fork)
@@ -0,0 +1,103 @@
+# --coding:utf-8--
+"""
+aomaker.db 表结构迁移
+数据库版本记录在PRAGMA user_version中，连接首次建立时按版本号顺序执行未应用的迁移
+"""
+import sqlite3
+from typing import Callable, List, Tuple
+
+from aomaker._constants import DataBase as DB
+
+
+def _table_exists(connection: sqlite3.Connection, table: str) -> bool:
+    sql = "select 1 from sqlite_master where type='table' and name=?"
+    return connection.execute(sql, (table,)).fetchone() is not None
+
+
+def _columns(connection: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+
+
+def _v1_cache_upsert(connection: sqlite3.Connection):
+    """cache表：(var_name, worker)唯一索引，新增created_at、size列"""
+    # 建立唯一索引前清理重复数据，保留最早写入的一行（与此前读取时返回的行一致）
+    connection.execute(f"""delete from {DB.CACHE_TABLE} where rowid not in
+                           (select min(rowid) from {DB.CACHE_TABLE}
+                            group by {DB.CACHE_VAR_NAME},{DB.CACHE_WORKER})""")
+    columns = _columns(connection, DB.CACHE_TABLE)
+    if DB.CACHE_CREATED_AT not in columns:
+        connection.execute(f"alter table {DB.CACHE_TABLE} add column {DB.CACHE_CREATED_AT} real")
+    if DB.CACHE_SIZE not in columns:
+        connection.execute(f"alter table {DB.CACHE_TABLE} add column {DB.CACHE_SIZE} integer")
+    connection.execute(f"""update {DB.CACHE_TABLE}
+                           set {DB.CACHE_SIZE}=length({DB.CACHE_RESPONSE}),
+                               {DB.CACHE_CREATED_AT}=cast(strftime('%s','now') as real)
+                           where {DB.CACHE_SIZE} is null""")
+    connection.execute(f"""create unique index if not exists {DB.CACHE_TABLE}_{DB.CACHE_VAR_NAME}_{DB.CACHE_WORKER}_uindex
+                           on {DB.CACHE_TABLE} ({DB.CACHE_VAR_NAME},{DB.CACHE_WORKER})""")
+
+
+def _v2_duration(connection: sqlite3.Connection):
+    """新增duration表：记录每条用例的历史执行耗时，用于按耗时均衡分配用例"""
+    connection.execute(f"""create table if not exists {DB.DURATION_TABLE}(
+                           {DB.DURATION_CASE_KEY} text primary key,
+                           {DB.DURATION_SECONDS} real not null,
+                           {DB.DURATION_RUNS} integer not null default 1,
+                           {DB.DURATION_UPDATED_AT} real)""")
+
+
+def _v3_result(connection: sqlite3.Connection):
+    """新增result表：各worker在用例结束时写入执行结果，用于运行中/结束时直接汇总报告"""
+    connection.execute(f"""create table if not exists {DB.RESULT_TABLE}(
+                           {DB.RESULT_CASE_KEY} text primary key,
+                           {DB.RESULT_FULL_NAME} text,
+                           {DB.RESULT_NAME} text,
+                           {DB.RESULT_STATUS} text not null,
+                           {DB.RESULT_DESCRIPTION} text,
+                           {DB.RESULT_TRACE} text,
+                           {DB.RESULT_START} integer,
+                           {DB.RESULT_STOP} integer,
+                           {DB.RESULT_CASE_ID} text,
+                           {DB.RESULT_PARAMETERS} text,
+                           {DB.RESULT_TAGS} text,
+                           {DB.RESULT_WORKER} text)""")
+
+
+# (版本号, 迁移函数)，版本号递增
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _v1_cache_upsert),
+    (2, _v2_duration),
+    (3, _v3_result),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(connection: sqlite3.Connection) -> int:
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(connection: sqlite3.Connection):
+    """
+    将数据库迁移到最新版本
+    基础表（config/cache/schema）尚未创建时不做任何事，由脚手架建表后再调用
+    """
+    if get_version(connection) >= LATEST_VERSION:
+        return
+    if not all(_table_exists(connection, t) for t in (DB.CONFIG_TABLE, DB.CACHE_TABLE, DB.SCHEMA_TABLE)):
+        return
+    if connection.in_transaction:
+        connection.commit()
+    # 多进程同时连接时，由拿到写锁的进程执行迁移，其余进程在锁内重新确认版本后跳过
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        current = get_version(connection)
+        for version, migration in MIGRATIONS:
+            if version > current:
+                migration(connection)
+                connection.execute(f"PRAGMA user_version={version}")
+    except BaseException:
+        connection.rollback()
+        raise
+    else:
+        connection.commit()
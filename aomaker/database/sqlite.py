@@ -1,13 +1,152 @@
 import os
+import time
 import sqlite3
 import threading
+from contextlib import contextmanager
+from typing import Dict, List, Callable, Iterable, Optional
 
 from aomaker._constants import DataBase
 from aomaker.path import DB_DIR
 
 DB_PATH = os.path.join(DB_DIR, DataBase.DB_NAME)
 
-lock = threading.RLock()
+BUSY_TIMEOUT = 30  # 单位：s，等待其它连接释放写锁的时长
+BUSY_RETRY_COUNTS = 5
+BUSY_RETRY_INTERVAL = 0.05  # 单位：s，重试间隔，按次数指数增长
+
+
+def _is_busy_error(e: sqlite3.OperationalError) -> bool:
+    msg = str(e).lower()
+    return "locked" in msg or "busy" in msg
+
+
+def retry_on_busy(func, *args, **kwargs):
+    """数据库被锁（database is locked）时退避重试"""
+    for attempt in range(BUSY_RETRY_COUNTS):
+        try:
+            return func(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            if not _is_busy_error(e) or attempt == BUSY_RETRY_COUNTS - 1:
+                raise
+            time.sleep(BUSY_RETRY_INTERVAL * 2 ** attempt)
+
+
+class ConnectionManager:
+    """
+    SQLite连接管理
+    每个线程（及fork出的每个进程）持有自己的连接，不再共享连接和游标；
+    连接开启WAL日志与synchronous=NORMAL，读写互不阻塞，多进程并发写入时依赖busy_timeout排队
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.initializer: Optional[Callable[[sqlite3.Connection], None]] = None
+        self._initialized = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._rollback_listeners: List[Callable] = []
+        self._commit_listeners: List[Callable] = []
+        self._pid = os.getpid()
+
+    @property
+    def batch_depth(self) -> int:
+        """当前线程batch()的嵌套层数，大于0时语句不单独提交"""
+        return getattr(self._local, "batch_depth", 0)
+
+    @batch_depth.setter
+    def batch_depth(self, depth: int):
+        self._local.batch_depth = depth
+
+    def add_rollback_listener(self, listener: Callable):
+        """注册事务回滚时的回调，用于丢弃回滚前已写入的进程内缓存"""
+        self._rollback_listeners.append(listener)
+
+    def notify_rollback(self):
+        for listener in self._rollback_listeners:
+            listener()
+
+    def add_commit_listener(self, listener: Callable):
+        """注册batch()事务提交后的回调，用于将事务内的写入应用到进程内缓存"""
+        self._commit_listeners.append(listener)
+
+    def notify_commit(self):
+        for listener in self._commit_listeners:
+            listener()
+
+    def get(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def close(self):
+        """关闭当前线程的连接，之后再次使用时会重新建立连接，其它线程的连接不受影响"""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            return
+        self._local.connection = None
+        with self._lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+        connection.close()
+        self.notify_rollback()
+
+    def close_all(self):
+        """关闭所有线程的连接（进程结束前调用），之后再次使用时会重新建立连接"""
+        with self._lock:
+            connections = self._connections
+            self._connections = []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+        self.notify_rollback()
+
+    def _connect(self) -> sqlite3.Connection:
+        # 连接仍会在结束时由其它线程统一关闭，因此关闭同线程检查
+        connection = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        retry_on_busy(connection.execute, "PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        if self.initializer is not None and not self._initialized:
+            # 每个进程只需执行一次（如表结构迁移）
+            with self._lock:
+                if not self._initialized:
+                    retry_on_busy(self.initializer, connection)
+                    self._initialized = True
+        return connection
+
+    def _reset_after_fork(self):
+        # 子进程丢弃父进程的连接（不关闭，避免影响父进程）
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._pid = os.getpid()
+
+
+_managers: Dict[str, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_connection_manager(db_path: str) -> ConnectionManager:
+    """同一数据库文件在进程内共用一个连接管理器"""
+    db_path = os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(db_path)
+        if manager is None:
+            manager = _managers[db_path] = ConnectionManager(db_path)
+        return manager
+
+
+def set_initializer(db_path: str, initializer: Callable[[sqlite3.Connection], None]):
+    """设置数据库文件在进程内首次建立连接时执行的初始化函数"""
+    get_connection_manager(db_path).initializer = initializer
 
 
 class SQLiteDB:
@@ -15,24 +154,88 @@ class SQLiteDB:
     def __init__(self, db_path=DB_PATH):
         """
         Connect to the sqlite database
+        连接在当前线程首次使用时才建立
         """
-        # check_same_thread=False
-        self.connection = sqlite3.connect(db_path, check_same_thread=False)
-        self.cursor = self.connection.cursor()
+        self.db_path = db_path
+        self.connection_manager = get_connection_manager(db_path)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        return self.connection_manager.get()
+
+    @property
+    def cursor(self) -> sqlite3.Cursor:
+        return self.connection.cursor()
 
     def close(self):
         """
         Close the database connection
+        只关闭当前线程的连接，同一数据库文件上的其它表对象、其它线程不受影响
         """
-        self.connection.close()
+        self.connection_manager.close()
+
+    def close_all(self):
+        """关闭当前进程内该数据库文件的所有连接，用于会话结束时的清理"""
+        self.connection_manager.close_all()
 
     def execute_sql(self, sql: str, *args, **kwargs):
         """
         Execute SQL
         """
-        with lock:
-            self.cursor.execute(sql, *args, **kwargs)
-            self.connection.commit()
+        connection = self.connection
+        if self.connection_manager.batch_depth:
+            # batch()内由事务统一提交/回滚
+            return connection.execute(sql, *args, **kwargs)
+
+        def execute():
+            try:
+                cursor = connection.execute(sql, *args, **kwargs)
+                connection.commit()
+            except sqlite3.OperationalError:
+                connection.rollback()
+                raise
+            return cursor
+
+        return retry_on_busy(execute)
+
+    def executemany_sql(self, sql: str, seq_of_parameters: Iterable):
+        """
+        Execute SQL with executemany，整批语句在一个事务中提交
+        return: 受影响的行数
+        """
+        with self.batch() as db:
+            return db.connection.executemany(sql, seq_of_parameters).rowcount
+
+    @contextmanager
+    def batch(self):
+        """
+        批量写入上下文，上下文内当前线程在该数据库上的所有语句处于同一事务，
+        正常退出时提交一次，发生异常时整体回滚；支持嵌套，只有最外层负责提交
+        example:
+            with cache.batch():
+                config.set_many({...})
+                cache.set('headers', headers)
+        """
+        manager = self.connection_manager
+        connection = self.connection
+        is_outermost = manager.batch_depth == 0
+        if is_outermost:
+            # 立即获取写锁，避免事务中途由读锁升级为写锁时与其它进程死锁
+            retry_on_busy(connection.execute, "BEGIN IMMEDIATE")
+        manager.batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            manager.batch_depth -= 1
+            if is_outermost:
+                connection.rollback()
+                manager.notify_rollback()
+            raise
+        else:
+            manager.batch_depth -= 1
+            if is_outermost:
+                retry_on_busy(connection.commit)
+                manager.notify_commit()
 
     def insert_data(self, table: str, data: dict):
         """
@@ -50,12 +253,8 @@ class SQLiteDB:
         Query SQL
         return: query data
         """
-        data_list = []
-        with lock:
-            rows = self.cursor.execute(sql, *args, **kwargs)
-            for row in rows:
-                data_list.append(row)
-            return data_list
+        connection = self.connection
+        return retry_on_busy(lambda: connection.execute(sql, *args, **kwargs).fetchall())
 
     def select_data(self, table: str, where: dict = None):
         """
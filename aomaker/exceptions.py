@@ -77,3 +77,13 @@ class ParamsException(AoMakerException):
 class CompareException(AoMakerException):
     def __init__(self, *args):
         super().__init__(*args)
+
+
+class PollingTimeout(AoMakerException):
+    def __init__(self, pending, timeout, results=None):
+        self.pending = pending
+        self.timeout = timeout
+        self.results = results
+
+    def __str__(self):
+        return f'轮询超时（{self.timeout}s），未完成的任务：{self.pending}'
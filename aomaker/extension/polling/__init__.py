@@ -0,0 +1,4 @@
+# --coding:utf-8--
+from aomaker.extension.polling.polling import Poller
+
+__all__ = ['Poller']
@@ -0,0 +1,258 @@
+# --coding:utf-8--
+"""
+异步任务轮询引擎
+多个任务id同时轮询：每个任务按各自的下次查询时间排入小顶堆，到期的任务提交到线程池（或事件循环）查询，
+未完成的任务按退避系数逐步拉长查询间隔；支持整体超时时间和批量查询接口。
+
+example：
+    def check_job(job_id):
+        res = job.describe_jobs(job_id)
+        status = res["job_set"][0]["status"]
+        # 返回None表示任务未结束，继续轮询
+        return res if status in ("successful", "failed") else None
+
+    job_poller = Poller(check_job, interval=2, max_interval=20, timeout=600)
+
+    @async_api(job_poller, "$.job_id", expr_index=":")
+    def run_jobs(self): ...
+"""
+import time
+import heapq
+import random
+import asyncio
+import inspect
+import functools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional
+
+from aomaker.log import logger
+from aomaker.exceptions import PollingTimeout
+
+
+class _Schedule:
+    """轮询调度状态：下次查询时间小顶堆、各任务当前间隔、查询结果"""
+
+    def __init__(self, poller: "Poller", job_ids: list):
+        self.poller = poller
+        self.job_ids = job_ids
+        self.deadline = time.monotonic() + poller.timeout if poller.timeout else None
+        self.results: Dict[int, Any] = {}
+        self.intervals = [poller.interval] * len(job_ids)
+        self.probes = 0
+        now = time.monotonic()
+        # (下次查询时间, 任务下标)，所有任务立即发起第一次查询
+        self.heap = [(now, i) for i in range(len(job_ids))]
+        heapq.heapify(self.heap)
+
+    @property
+    def pending(self) -> List[int]:
+        return [i for i in range(len(self.job_ids)) if i not in self.results]
+
+    def pop_due(self) -> List[int]:
+        now = time.monotonic()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            due.append(heapq.heappop(self.heap)[1])
+        return due
+
+    def next_wait(self) -> Optional[float]:
+        """距下一个任务到期的时间，没有待查询的任务时返回None"""
+        if not self.heap:
+            return None
+        return max(self.heap[0][0] - time.monotonic(), 0)
+
+    def handle(self, index: int, result):
+        """处理一次查询结果：已完成则记录结果，否则按退避后的间隔重新排队"""
+        self.probes += 1
+        if self.poller.is_done(result):
+            self.results[index] = result
+            return
+        interval = self.intervals[index]
+        self.intervals[index] = min(interval * self.poller.backoff, self.poller.max_interval)
+        # 批量查询时不加抖动，同一批任务保持同时到期
+        jitter = interval * self.poller.jitter * random.random() if self.poller.batch_probe is None else 0
+        heapq.heappush(self.heap, (time.monotonic() + interval + jitter, index))
+
+    def check_deadline(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            pending = [self.job_ids[i] for i in self.pending]
+            results = {self.job_ids[i]: r for i, r in self.results.items()}
+            raise PollingTimeout(pending, self.poller.timeout, results)
+
+    def remaining(self) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0)
+
+    def ordered_results(self) -> list:
+        return [self.results[i] for i in range(len(self.job_ids))]
+
+
+class Poller:
+    """
+    并发轮询多个异步任务
+    可直接作为@async_api的cycle_func，提取到的任务id（expr_index=":"时为任务id列表）会同时轮询，
+    结果按任务id顺序返回，由async_api合并到resp["async_res"]
+    """
+
+    def __init__(self,
+                 probe: Callable = None,
+                 batch_probe: Callable = None,
+                 until: Callable[[Any], bool] = None,
+                 interval: float = 1,
+                 max_interval: float = 30,
+                 backoff: float = 1.5,
+                 jitter: float = 0.1,
+                 timeout: float = 600,
+                 max_workers: int = 10,
+                 batch_size: int = 50):
+        """
+        :param probe: 单个任务查询函数，probe(job_id, *args, **kwargs)，普通函数或协程函数
+        :param batch_probe: 批量查询函数，batch_probe([job_id,...], *args, **kwargs) -> {job_id: 结果}，
+                            后端支持批量查询时优先使用，返回中缺失的任务视为未完成
+        :param until: 判断任务是否结束的函数，传入查询结果；默认查询结果不为None即结束
+        :param interval: 首次查询后的轮询间隔（秒）
+        :param max_interval: 最大轮询间隔（秒）
+        :param backoff: 退避系数，任务每次未完成时间隔乘以该系数
+        :param jitter: 间隔随机抖动比例，避免大量任务同时查询
+        :param timeout: 整体超时时间（秒），超时后抛出PollingTimeout；None表示不超时
+        :param max_workers: 同时进行的查询数
+        :param batch_size: 批量查询时单次查询的最大任务数
+        """
+        if probe is None and batch_probe is None:
+            raise ValueError("probe和batch_probe至少需要传入一个")
+        self.probe = probe
+        self.batch_probe = batch_probe
+        self.until = until
+        self.interval = interval
+        self.max_interval = max(max_interval, interval)
+        self.backoff = max(backoff, 1)
+        self.jitter = jitter
+        self.timeout = timeout
+        self.max_workers = max(max_workers, 1)
+        self.batch_size = max(batch_size, 1)
+
+    @property
+    def __name__(self):
+        return getattr(self.batch_probe or self.probe, "__name__", type(self).__name__)
+
+    def is_done(self, result) -> bool:
+        if self.until is not None:
+            return bool(self.until(result))
+        return result is not None
+
+    def __call__(self, job_ids, *args, **kwargs):
+        """同步轮询，job_ids为单个任务id时返回单个结果，为列表时按顺序返回结果列表"""
+        if not isinstance(job_ids, (list, tuple)):
+            return self.poll([job_ids], *args, **kwargs)[0]
+        return self.poll(list(job_ids), *args, **kwargs)
+
+    def poll(self, job_ids: list, *args, **kwargs) -> list:
+        """在线程池中并发轮询所有任务，直到全部结束或超时"""
+        schedule = _Schedule(self, job_ids)
+        if not job_ids:
+            return []
+        start = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(job_ids)))
+        # key: future，value: 本次查询的任务下标列表
+        running = {}
+        try:
+            while len(schedule.results) < len(job_ids):
+                for indexes in self._group(schedule.pop_due()):
+                    running[executor.submit(self._probe_sync, schedule, indexes, args, kwargs)] = indexes
+                schedule.check_deadline()
+                timeout = schedule.next_wait()
+                remaining = schedule.remaining()
+                if remaining is not None:
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                if running:
+                    done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        indexes = running.pop(future)
+                        for index, result in zip(indexes, future.result()):
+                            schedule.handle(index, result)
+                elif timeout is not None:
+                    time.sleep(timeout)
+        finally:
+            # 超时或查询异常时不等待仍在进行的查询
+            executor.shutdown(wait=not running, cancel_futures=True)
+        self._log_finish(schedule, start)
+        return schedule.ordered_results()
+
+    async def apoll(self, job_ids, *args, **kwargs):
+        """协程版轮询，在当前事件循环上并发查询；同步的查询函数放到默认线程池中执行"""
+        single = not isinstance(job_ids, (list, tuple))
+        job_ids = [job_ids] if single else list(job_ids)
+        schedule = _Schedule(self, job_ids)
+        if not job_ids:
+            return []
+        start = time.monotonic()
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def run(indexes):
+            async with semaphore:
+                return indexes, await self._probe_async(schedule, indexes, args, kwargs)
+
+        running = set()
+        try:
+            while len(schedule.results) < len(job_ids):
+                for indexes in self._group(schedule.pop_due()):
+                    running.add(asyncio.ensure_future(run(indexes)))
+                schedule.check_deadline()
+                timeout = schedule.next_wait()
+                remaining = schedule.remaining()
+                if remaining is not None:
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                if running:
+                    done, running = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        indexes, results = task.result()
+                        for index, result in zip(indexes, results):
+                            schedule.handle(index, result)
+                elif timeout is not None:
+                    await asyncio.sleep(timeout)
+        finally:
+            for task in running:
+                task.cancel()
+        self._log_finish(schedule, start)
+        results = schedule.ordered_results()
+        return results[0] if single else results
+
+    def _group(self, indexes: List[int]) -> List[List[int]]:
+        """到期任务分组：批量查询时按batch_size分批，否则每个任务单独查询"""
+        if not indexes:
+            return []
+        if self.batch_probe is None:
+            return [[i] for i in indexes]
+        return [indexes[i:i + self.batch_size] for i in range(0, len(indexes), self.batch_size)]
+
+    def _probe_sync(self, schedule: _Schedule, indexes: List[int], args, kwargs) -> list:
+        job_ids = [schedule.job_ids[i] for i in indexes]
+        if self.batch_probe is not None:
+            res = self.batch_probe(job_ids, *args, **kwargs)
+            if inspect.isawaitable(res):
+                res = asyncio.run(res)
+            res = res or {}
+            return [res.get(job_id) for job_id in job_ids]
+        res = self.probe(job_ids[0], *args, **kwargs)
+        if inspect.isawaitable(res):
+            res = asyncio.run(res)
+        return [res]
+
+    async def _probe_async(self, schedule: _Schedule, indexes: List[int], args, kwargs) -> list:
+        func = self.batch_probe if self.batch_probe is not None else self.probe
+        job_ids = [schedule.job_ids[i] for i in indexes]
+        target = job_ids if self.batch_probe is not None else job_ids[0]
+        if inspect.iscoroutinefunction(func):
+            res = await func(target, *args, **kwargs)
+        else:
+            loop = asyncio.get_running_loop()
+            res = await loop.run_in_executor(None, functools.partial(func, target, *args, **kwargs))
+        if self.batch_probe is not None:
+            res = res or {}
+            return [res.get(job_id) for job_id in job_ids]
+        return [res]
+
+    def _log_finish(self, schedule: _Schedule, start: float):
+        logger.info(f"==========轮询<{self.__name__}>结束，任务数：{len(schedule.job_ids)}，"
+                    f"查询次数：{schedule.probes}，耗时：{time.monotonic() - start:.2f}s==========")
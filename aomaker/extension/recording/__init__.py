@@ -1,6 +1,5 @@
 import argparse
 import os
-import jinja2
 
 filter_expression = """
     The following operators are understood:\n
@@ -29,14 +28,13 @@ filter_expression = """
         ~c CODE     Response code.\n
         rex         Equivalent to ~u rex\n
 """
-temp = jinja2.Template(
-    """from aomaker.extension.recording.recording import Record
+# addons.py模板，录制时才导入jinja2渲染
+ADDONS_TEMPLATE = """from aomaker.extension.recording.recording import Record
 
 
 addons = [Record('{{file_name}}', filter_str='{{filter_str}}',
 save_response={{save_response}}, save_headers={{save_headers}})]
     """
-)
 
 
 class SmartFormatter(argparse.HelpFormatter):
@@ -58,7 +56,8 @@ def get_init_params(args, path):
     init_params['filter_str'] = args.filter_str
     init_params['save_response'] = args.save_response
     init_params['save_headers'] = args.save_headers
-    content = temp.render(init_params)
+    import jinja2
+    content = jinja2.Template(ADDONS_TEMPLATE).render(init_params)
     with open(path, mode='w', encoding='utf-8') as f:
         f.write(content)
 
@@ -2,7 +2,8 @@
 import typing as t
 from aomaker.log import logger
 
-from tenacity import Retrying, stop_after_attempt, wait_fixed, WrappedFn, retry_if_exception_type, retry_if_result
+from tenacity import (Retrying, AsyncRetrying, stop_after_attempt, wait_fixed, WrappedFn, retry_if_exception_type,
+                      retry_if_result)
 
 
 def before_log():
@@ -20,20 +21,32 @@ def after_log():
     return log_it
 
 
+def _configure(retrying, counts, interval, retry_condition, exception_type):
+    retrying.reraise = True
+    retrying.before = before_log()
+    retrying.after = after_log()
+    retrying.stop = stop_after_attempt(counts)
+    retrying.wait = wait_fixed(interval)
+    if retry_condition and exception_type:
+        retrying.retry = (retry_if_exception_type(exception_type) | retry_if_result(retry_condition))
+    elif exception_type:
+        retrying.retry = retry_if_exception_type(exception_type)
+    elif retry_condition:
+        retrying.retry = retry_if_result(retry_condition)
+
+
 class AoMakerRetry(Retrying):
     def __init__(self, counts: int = 3, interval: int = 2, retry_condition=None, exception_type=None, **kwargs):
         super().__init__(**kwargs)
-        self.reraise = True
-        self.before = before_log()
-        self.after = after_log()
-        self.stop = stop_after_attempt(counts)
-        self.wait = wait_fixed(interval)
-        if retry_condition and exception_type:
-            self.retry = (retry_if_exception_type(exception_type) | retry_if_result(retry_condition))
-        elif exception_type:
-            self.retry = retry_if_exception_type(exception_type)
-        elif retry_condition:
-            self.retry = retry_if_result(retry_condition)
+        _configure(self, counts, interval, retry_condition, exception_type)
+
+
+class AoMakerAsyncRetry(AsyncRetrying):
+    """AoMakerRetry的协程版本，重试间隔使用asyncio.sleep，不阻塞事件循环"""
+
+    def __init__(self, counts: int = 3, interval: int = 2, retry_condition=None, exception_type=None, **kwargs):
+        super().__init__(**kwargs)
+        _configure(self, counts, interval, retry_condition, exception_type)
 
 
 def retry(*dargs: t.Any, **dkw: t.Any) -> t.Any:
@@ -1,12 +1,17 @@
 # --coding:utf-8--
 import os
 from abc import ABCMeta, abstractmethod
+from typing import Optional
 
 import yaml
 
 from aomaker._printer import printer
 from aomaker.path import CONF_DIR
-from aomaker.cache import cache, config
+from aomaker.log import logger
+from aomaker.cache import cache, config, schema
+from aomaker.snapshot import session_snapshot
+from aomaker.credential import credential_manager
+from aomaker.base.session_pool import session_pool
 from aomaker.exceptions import FileNotFound, ConfKeyError
 from aomaker._constants import Conf
 
@@ -46,6 +51,8 @@ class EnvVars:
 
 class BaseLogin(metaclass=ABCMeta):
     env_vars = EnvVars()
+    TOKEN_TTL = None  # token有效期，单位：s，None表示不过期（不自动刷新）
+    TOKEN_REFRESH_AHEAD = 60  # 过期前多久开始刷新，单位：s
 
     def __init__(self):
         self.host = self.env_vars.current_env_conf.get('host')
@@ -60,6 +67,10 @@ class BaseLogin(metaclass=ABCMeta):
     def make_headers(self, resp_login: dict):
         pass
 
+    def token_ttl(self, resp_login) -> Optional[float]:
+        """token有效期，单位：s，可重写为从登录响应中读取（如expires_in）"""
+        return self.TOKEN_TTL
+
 
 class SetUpSession:
     def __init__(self, login):
@@ -69,23 +80,31 @@ class SetUpSession:
         # 1.设置全局配置
         env_conf = EnvVars()
         conf_dict = env_conf.current_env_conf
-        config.set("current_env", env_conf.current_env)
-        for k, v in conf_dict.items():
-            config.set(k, v)
+        config.set_many({"current_env": env_conf.current_env, **conf_dict})
         # 2.设置全局headers
         headers = {}
+        resp = None
         if self.login_obj:
             resp = self.login_obj.login()
             headers = self.login_obj.make_headers(resp)
-        cache.set('headers', headers)
+        cache.set_shared('headers', headers)
+        # 3.发布会话快照，worker中的BaseApi直接读取
+        session_snapshot.publish(headers=headers)
+        # 4.跟踪token有效期，过期前自动刷新
+        credential_manager.start(self.login_obj, resp)
 
 
 class TearDownSession:
     @printer("clean_env")
     def clear_env(self):
+        session_pool.close()
+        for name, db in (("config", config), ("cache", cache), ("schema", schema)):
+            logger.debug(f"<AoMaker> {name}表缓存层统计：{db.tier.stats}")
+        credential_manager.stop()
+        session_snapshot.close()
         cache.clear()
-        cache.close()
-        config.close()
+        # config、cache、schema共用同一个数据库文件的连接
+        cache.close_all()
 
 
 if __name__ == '__main__':
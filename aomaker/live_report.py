@@ -0,0 +1,175 @@
+# --coding:utf-8--
+"""
+实时报告汇总
+LiveReportPlugin在每条用例结束（teardown完成）时按allure的规则判定用例结果（passed/failed/broken/skipped），
+批量写入aomaker.db的result表，多进程/多线程的各个worker写入同一张表。
+运行结束后直接由result表生成aomaker.html，不必等待allure generate生成summary.json；
+开启实时刷新（arun --live-report N）时，主进程在运行期间每N秒按已完成的用例重新生成一次aomaker.html。
+任一worker写入result表失败时会留下标记文件，运行结束时改由allure结果生成报告和记录耗时。
+"""
+import os
+import time
+import sqlite3
+import threading
+from hashlib import md5
+from multiprocessing import current_process
+from threading import current_thread
+from typing import Dict, List, Optional
+
+import pytest
+from allure_commons.utils import represent
+from allure_pytest.utils import allure_full_name, allure_description, pytest_markers
+
+from aomaker.cache import case_result
+from aomaker.log import logger
+from aomaker.path import REPORT_DIR
+from aomaker.report import render_reports, live_result_index
+from aomaker.utils.gen_allure_report import ResultIndex, duration_key, get_result_index
+
+# 缓冲的用例结果达到该数量时写入result表
+FLUSH_SIZE = 50
+# 距上次写入超过该时长（秒）时，用例结束后立即写入，保证实时刷新能看到最新结果
+FLUSH_INTERVAL = 2.0
+
+# result表写入失败的标记文件，多进程的worker写入失败时主进程也能知道result表不完整
+FLUSH_FAILED_MARK = os.path.join(REPORT_DIR, "live_report.failed")
+
+_PASSED, _FAILED, _BROKEN, _SKIPPED = "passed", "failed", "broken", "skipped"
+
+
+def _report_status(report, call) -> str:
+    """与allure-pytest一致：断言失败/pytest.fail为failed，其它异常为broken，skip/xfail为skipped"""
+    if report.skipped:
+        return _SKIPPED
+    if report.failed:
+        exception = call.excinfo.value if call.excinfo else None
+        if exception is None or isinstance(exception, (AssertionError, pytest.fail.Exception)):
+            return _FAILED
+        return _BROKEN
+    return _PASSED
+
+
+class LiveReportPlugin:
+    """pytest插件：用例结束时汇总执行结果，批量写入result表"""
+
+    def __init__(self):
+        # key: node id，value: 执行中的用例结果
+        self._running: Dict[str, dict] = {}
+        self._buffer: List[dict] = []
+        self._last_flush = time.time()
+        self.worker = f"{current_process().name}:{current_thread().name}"
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+        outcome = yield
+        report = outcome.get_result()
+        status = _report_status(report, call)
+        row = self._running.get(item.nodeid)
+        if row is None:
+            row = self._running[item.nodeid] = self._new_row(item, call.start)
+        # setup决定初始结果，call/teardown只在此前通过时覆盖（teardown只覆盖为失败）
+        if report.when == "setup" or (row["status"] == _PASSED and (
+                report.when == "call" or status in (_FAILED, _BROKEN))):
+            row["status"] = status
+            row["trace"] = report.longreprtext if status != _PASSED else None
+        if report.when == "teardown":
+            row["stop"] = int(call.stop * 1000)
+            self._buffer.append(self._running.pop(item.nodeid))
+            if len(self._buffer) >= FLUSH_SIZE or time.time() - self._last_flush >= FLUSH_INTERVAL:
+                self.flush()
+
+    def pytest_sessionfinish(self, session):
+        self.flush()
+
+    def _new_row(self, item, start: float) -> dict:
+        full_name = allure_full_name(item)
+        params = item.callspec.params if hasattr(item, "callspec") else {}
+        parameters = [(name, represent(value)) for name, value in params.items()]
+        case_key = duration_key(full_name, parameters)
+        return {
+            "case_key": case_key,
+            "full_name": full_name,
+            "name": item.name,
+            "status": _PASSED,
+            "description": allure_description(item),
+            "trace": None,
+            "start": int(start * 1000),
+            "stop": None,
+            "case_id": md5(case_key.encode("utf-8")).hexdigest(),
+            "parameters": [{"name": name, "value": value} for name, value in parameters],
+            "tags": list(pytest_markers(item)),
+            "worker": self.worker,
+        }
+
+    def flush(self):
+        self._last_flush = time.time()
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        try:
+            case_result.record_many(rows)
+        except sqlite3.Error as e:
+            # 汇总失败不影响用例执行，留下标记，结束时由allure结果生成报告
+            logger.warning(f"<AoMaker> 用例结果写入result表失败，结束时将由allure结果生成报告：{e}")
+            _mark_flush_failed()
+
+
+def _mark_flush_failed():
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    with open(FLUSH_FAILED_MARK, "a", encoding="utf-8"):
+        pass
+
+
+def reset_live_report():
+    """运行开始时清理上次运行的用例结果和写入失败标记"""
+    case_result.clear()
+    if os.path.exists(FLUSH_FAILED_MARK):
+        os.remove(FLUSH_FAILED_MARK)
+
+
+def final_result_index() -> ResultIndex:
+    """
+    运行结束时的用例结果索引：优先使用result表；
+    有worker写入result表失败，或result表为空（如插件未生效）时，回退到解析allure result.json
+    """
+    if os.path.exists(FLUSH_FAILED_MARK):
+        logger.warning("<AoMaker> result表写入失败过，由allure结果生成报告")
+        return get_result_index()
+    try:
+        index = live_result_index()
+    except sqlite3.Error as e:
+        logger.warning(f"<AoMaker> result表读取失败，由allure结果生成报告：{e}")
+        return get_result_index()
+    if not index.latest:
+        return get_result_index()
+    return index
+
+
+class LiveReporter:
+    """运行期间定时由result表重新生成aomaker.html，interval为0时不开启"""
+
+    def __init__(self, interval: float = 0):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._loop, name="aomaker-live-report", daemon=True)
+            self._thread.start()
+            logger.info(f"<AoMaker> 实时报告已开启，每{self.interval}s刷新一次reports/aomaker.html")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                index = live_result_index()
+                if index.latest:
+                    render_reports(index, index.summary())
+            except Exception as e:
+                logger.warning(f"<AoMaker> 实时报告刷新失败：{e}")
@@ -0,0 +1,270 @@
+# --coding:utf-8--
+"""
+压测模式（arun --load）
+直接复用Api Object的接口方法或场景函数作为压测场景，按目标RPS或并发数持续执行一段时间，统计每个场景的吞吐量、错误率和耗时分位数。
+场景格式：
+    module:Class.method  实例化Class（每个worker一个实例）后调用method，如apis.job:Job.list_jobs
+    module:function      直接调用函数，如testcases.scenario:create_and_delete_job
+场景方法不能有必填参数，多个场景按顺序轮流执行。
+
+调度：
+    --rps N：所有worker共用一个发车时间表，第i次请求的计划开始时间为start+i/N，worker在计划时间之前等待；
+             耗时按计划开始时间计算，worker跟不上目标RPS时排队时间也计入耗时，不会因为发压变慢而低估耗时
+    --rps 0：不限速，每个worker执行完一次立即执行下一次
+    --concurrency：worker数量，全部场景为协程函数时在一个事件循环中启动对应数量的协程，否则使用线程
+场景耗时记录在可合并的直方图中（见aomaker.metrics），场景内每个接口的耗时同时按接口、状态码统计，
+结果写入reports/load.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import inspect
+import functools
+import importlib
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from aomaker.log import logger
+from aomaker.path import REPORT_DIR, BASEDIR
+from aomaker.cache import config
+from aomaker.runner import RUN_MODE
+from aomaker.fixture import BaseLogin, SetUpSession, TearDownSession
+from aomaker.metrics import Histogram, metrics
+from aomaker.base.async_base_api import async_client_pool
+
+LOAD_REPORT = os.path.join(REPORT_DIR, "load.json")
+
+
+class Scenario:
+    """压测场景：module:Class.method或module:function"""
+
+    def __init__(self, spec: str):
+        self.name = spec
+        module_name, sep, attr_path = spec.partition(":")
+        if not sep or not attr_path:
+            raise ValueError(f"压测场景格式有误：{spec}，应为module:Class.method或module:function")
+        if BASEDIR not in sys.path:
+            sys.path.append(BASEDIR)
+        target = importlib.import_module(module_name)
+        *owners, self._attr = attr_path.split(".")
+        for attr in owners:
+            target = getattr(target, attr)
+        self._owner = target
+        self.is_async = inspect.iscoroutinefunction(getattr(target, self._attr))
+
+    def bind(self) -> Callable:
+        """返回worker使用的可调用对象，类方法场景为每个worker创建一个实例"""
+        if inspect.isclass(self._owner):
+            return getattr(self._owner(), self._attr)
+        return getattr(self._owner, self._attr)
+
+
+class ScenarioStats:
+    """单个场景的执行结果，每个worker一份，结束时合并"""
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, latency: float, error: Optional[BaseException] = None):
+        self.latency.record(latency)
+        if error is not None:
+            self.errors[type(error).__name__] += 1
+
+    def merge(self, other: "ScenarioStats"):
+        self.latency.merge(other.latency)
+        for name, count in other.errors.items():
+            self.errors[name] += count
+
+    def summary(self, elapsed: float) -> dict:
+        requests = self.latency.count
+        errors = sum(self.errors.values())
+        latency = self.latency.summary()
+        latency.pop("count")
+        return {
+            "requests": requests,
+            "errors": errors,
+            "error_rate": errors / requests if requests else 0,
+            "throughput": requests / elapsed if elapsed else 0,
+            "latency": latency,
+            "error_types": dict(self.errors),
+        }
+
+
+class _Pacer:
+    """发车时间表：rps为0时不限速，只控制结束时间"""
+
+    def __init__(self, rps: float, duration: float):
+        self.rps = rps
+        self.start = time.time()
+        self.end = self.start + duration
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def next_slot(self):
+        """
+        :return: (序号, 计划开始时间)，压测时间已到时返回None
+        """
+        with self._lock:
+            index = self._count
+            self._count += 1
+        slot = self.start + index / self.rps if self.rps else time.time()
+        if slot >= self.end:
+            return None
+        return index, slot
+
+
+def load_session(func):
+    """
+    压测会话夹具：只登录、设置全局配置和headers
+    与fixture_session不同，不清理allure结果、实时报告和接口耗时数据，压测不影响上一次功能测试的报告
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        config.set("run_mode", RUN_MODE[func.__qualname__.split('.')[0]])
+        SetUpSession(kwargs.get('login')).set_session_vars()
+        # 压测只在本进程内统计接口耗时，不读写reports/metrics
+        metrics.clear()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            TearDownSession().clear_env()
+
+    return wrapper
+
+
+class LoadRunner:
+
+    @load_session
+    def run(self, scenarios: List[str], login: BaseLogin = None, rps: float = 0, concurrency: int = 10,
+            duration: float = 60) -> dict:
+        """
+        :param scenarios: 压测场景列表，如["apis.job:Job.list_jobs"]
+        :param rps: 目标每秒请求数（所有worker合计），0为不限速
+        :param concurrency: worker数量
+        :param duration: 压测时长（秒）
+        :return: 压测结果，同reports/load.json
+        """
+        scenarios = [Scenario(spec) for spec in scenarios]
+        concurrency = max(concurrency, 1)
+        logger.info(f"<AoMaker> 压测启动，场景：{[s.name for s in scenarios]}，目标RPS：{rps or '不限'}，"
+                    f"并发数：{concurrency}，时长：{duration}s")
+        pacer = _Pacer(rps, duration)
+        if all(s.is_async for s in scenarios):
+            results = asyncio.run(self._run_async(scenarios, pacer, concurrency))
+        else:
+            results = self._run_threads(scenarios, pacer, concurrency)
+        elapsed = time.time() - pacer.start
+        report = self._report(scenarios, results, elapsed, rps, concurrency, duration)
+        self._log_report(report)
+        return report
+
+    @staticmethod
+    def _run_threads(scenarios: List[Scenario], pacer: _Pacer, concurrency: int) -> List[Dict[str, ScenarioStats]]:
+        results = [defaultdict(ScenarioStats) for _ in range(concurrency)]
+
+        def worker(stats: Dict[str, ScenarioStats]):
+            loop = asyncio.new_event_loop() if any(s.is_async for s in scenarios) else None
+            funcs = [s.bind() for s in scenarios]
+            try:
+                while True:
+                    slot = pacer.next_slot()
+                    if slot is None:
+                        break
+                    index, planned = slot
+                    delay = planned - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                    scenario, func = scenarios[index % len(scenarios)], funcs[index % len(scenarios)]
+                    error = None
+                    try:
+                        if scenario.is_async:
+                            loop.run_until_complete(func())
+                        else:
+                            func()
+                    except Exception as e:
+                        error = e
+                    stats[scenario.name].record(time.time() - planned, error)
+            finally:
+                if loop is not None:
+                    # AsyncClient与事件循环绑定，关闭事件循环前先关闭连接池
+                    loop.run_until_complete(async_client_pool.aclose())
+                    loop.close()
+
+        threads = [threading.Thread(target=worker, args=(results[i],), name=f"aomaker-load-{i}")
+                   for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    @staticmethod
+    async def _run_async(scenarios: List[Scenario], pacer: _Pacer, concurrency: int) -> List[Dict[str, ScenarioStats]]:
+        results = [defaultdict(ScenarioStats) for _ in range(concurrency)]
+
+        async def worker(stats: Dict[str, ScenarioStats]):
+            funcs = [s.bind() for s in scenarios]
+            while True:
+                slot = pacer.next_slot()
+                if slot is None:
+                    break
+                index, planned = slot
+                delay = planned - time.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                scenario, func = scenarios[index % len(scenarios)], funcs[index % len(scenarios)]
+                error = None
+                try:
+                    await func()
+                except Exception as e:
+                    error = e
+                stats[scenario.name].record(time.time() - planned, error)
+
+        try:
+            await asyncio.gather(*(worker(stats) for stats in results))
+        finally:
+            await async_client_pool.aclose()
+        return results
+
+    @staticmethod
+    def _report(scenarios: List[Scenario], results: List[Dict[str, ScenarioStats]], elapsed: float, rps: float,
+                concurrency: int, duration: float) -> dict:
+        merged = {s.name: ScenarioStats() for s in scenarios}
+        for stats in results:
+            for name, item in stats.items():
+                merged[name].merge(item)
+        total = ScenarioStats()
+        for item in merged.values():
+            total.merge(item)
+        report = {
+            "target_rps": rps,
+            "concurrency": concurrency,
+            "duration": duration,
+            "elapsed": round(elapsed, 3),
+            "total": total.summary(elapsed),
+            "scenarios": {name: item.summary(elapsed) for name, item in merged.items()},
+            # 场景内每个接口的耗时，按接口、状态码统计
+            "apis": metrics.summary(),
+        }
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        with open(LOAD_REPORT, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
+
+    @staticmethod
+    def _log_report(report: dict):
+        lines = [f"<AoMaker> 压测结束，耗时：{report['elapsed']}s，结果已写入{LOAD_REPORT}"]
+        for name, item in [*report["scenarios"].items(), ("总计", report["total"])]:
+            latency = item["latency"]
+            lines.append(f"    {name}: 请求数：{item['requests']}，吞吐量：{item['throughput']:.1f}/s，"
+                         f"错误率：{item['error_rate']:.2%}，耗时(ms) "
+                         + "，".join(f"{k}={v}" for k, v in latency.items()))
+        logger.info("\n".join(lines))
+
+
+load_run = LoadRunner().run
@@ -2,7 +2,7 @@
 import os
 import sys
 import logging
-from loguru import logger as uru_logger
+import threading
 
 from aomaker.path import LOG_DIR
 from aomaker._constants import Log
@@ -20,10 +20,14 @@ class AllureHandler(logging.Handler):
 
 
 class AoMakerLogger:
-    logger = uru_logger
+    # loguru logger，首次实例化时才导入
+    logger = None
 
     # log level: TRACE < DEBUG < INFO < SUCCESS < WARNING < ERROR < CRITICAL
     def __init__(self, level: str = Log.DEFAULT_LEVEL, log_file_path=log_path):
+        if AoMakerLogger.logger is None:
+            from loguru import logger as uru_logger
+            AoMakerLogger.logger = uru_logger
         self.stdout_handler(level="info")
         self.file_handler(level=level, log_file_path=log_file_path)
         # 多线程不开启allure日志，日志会被打乱
@@ -81,8 +85,9 @@ class AoMakerLogger:
     @classmethod
     def change_level(cls, level):
         """更改stdout_handler级别"""
-        # 清除stdout_handler配置
-        logger.remove(handler_id=handler_id)
+        # 先完成默认配置，再清除stdout_handler配置
+        get_aomaker_logger()
+        cls.logger.remove(handler_id=handler_id)
         # 重新载入配置
         cls.logger.add(sys.stdout,
                        level=level.upper(),
@@ -116,5 +121,37 @@ class AoMakerLogger:
                 return h_info._levelno
 
 
-aomaker_logger = AoMakerLogger()
-logger = aomaker_logger.logger
+_aomaker_logger = None
+_init_lock = threading.Lock()
+
+
+def get_aomaker_logger() -> AoMakerLogger:
+    """首次使用时才创建AoMakerLogger（导入loguru并添加控制台、日志文件输出）"""
+    global _aomaker_logger
+    if _aomaker_logger is None:
+        with _init_lock:
+            if _aomaker_logger is None:
+                _aomaker_logger = AoMakerLogger()
+    return _aomaker_logger
+
+
+class _LazyLogger:
+    """
+    loguru logger的代理，import aomaker.log时不再创建日志输出；
+    取属性时返回loguru logger的方法本身，日志中的模块名、函数名、行号仍为调用处
+    """
+
+    def __getattr__(self, name):
+        value = getattr(get_aomaker_logger().logger, name)
+        # loguru logger为单例，取到的方法缓存在代理上，之后不再经过__getattr__
+        setattr(self, name, value)
+        return value
+
+
+logger = _LazyLogger()
+
+
+def __getattr__(name):
+    if name == "aomaker_logger":
+        return get_aomaker_logger()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,312 @@
+# --coding:utf-8--
+"""
+接口耗时统计
+BaseApi每次请求按(AO类.方法, 状态码)记录各阶段耗时：
+    connect：DNS解析+建立连接（含TLS握手），只有新建连接的请求才有
+    ttfb：开始请求到收到响应头（time to first byte，含建立连接）
+    total：请求总耗时（含读取响应体，不含响应回调）
+    callback：响应回调（日志、jsonschema、allure附件）耗时
+耗时记录在HDR风格的直方图中：按2的幂分段、每段等分为固定个数的桶，相对误差不超过1/64，
+内存占用与请求数无关，直方图之间可以直接按桶相加合并。
+每个worker进程运行结束时将直方图写入reports/metrics/<pid>.json（多线程模式由主进程统一写入），主进程合并后写入reports/metrics.json，并展示在aomaker.html中。
+"""
+import os
+import glob
+import json
+import time
+import shutil
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from aomaker.log import logger
+from aomaker.path import REPORT_DIR
+
+METRICS_DIR = os.path.join(REPORT_DIR, "metrics")
+METRICS_JSON = os.path.join(REPORT_DIR, "metrics.json")
+PHASES = ("connect", "ttfb", "total", "callback")
+# 请求异常（未收到响应）时的状态
+ERROR_STATUS = "error"
+
+# 每段的桶数为2**SUB_BITS，后半段的每个桶对应段内1/2**(SUB_BITS-1)的取值范围
+_SUB_BITS = 7
+_SUB_COUNT = 1 << _SUB_BITS
+_HALF_COUNT = _SUB_COUNT >> 1
+
+
+class Histogram:
+    """HDR风格直方图，取值单位为微秒（整数），桶为稀疏dict"""
+
+    __slots__ = ("counts", "count", "sum", "min", "max")
+
+    def __init__(self):
+        # key: 桶序号，value: 次数
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    @staticmethod
+    def _index(value: int) -> int:
+        if value < _SUB_COUNT:
+            return value
+        shift = value.bit_length() - _SUB_BITS
+        return shift * _HALF_COUNT + (value >> shift)
+
+    @staticmethod
+    def _value(index: int) -> int:
+        """桶的中间值"""
+        if index < _SUB_COUNT:
+            return index
+        shift = index // _HALF_COUNT - 1
+        return ((index - shift * _HALF_COUNT) << shift) + (1 << shift) // 2
+
+    def record(self, seconds: float):
+        value = max(int(seconds * 1e6), 0)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "Histogram"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def percentile(self, p: float) -> Optional[float]:
+        """:return: 第p百分位的耗时（毫秒）"""
+        if not self.count:
+            return None
+        rank = max(int(self.count * p / 100 + 0.5), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                # 桶的中间值可能超出实际的最小/最大值
+                return min(max(self._value(index), self.min), self.max) / 1000
+        return self.max / 1000
+
+    def summary(self) -> dict:
+        """:return: 耗时统计（毫秒）"""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "min": self.min / 1000,
+            "mean": round(self.sum / self.count / 1000, 3),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max / 1000,
+        }
+
+    def to_dict(self) -> dict:
+        return {"counts": self.counts, "count": self.count, "sum": self.sum, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Histogram":
+        histogram = cls()
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.count = data["count"]
+        histogram.sum = data["sum"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
+
+
+class RequestTiming:
+    """一次接口调用（含重试）的各阶段耗时"""
+
+    __slots__ = ("start", "connect", "ttfb", "callback", "status", "_trace_marks")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.connect = 0.0
+        self.ttfb: Optional[float] = None
+        self.callback = 0.0
+        self.status = ERROR_STATUS
+        self._trace_marks: Dict[str, float] = {}
+
+    async def httpx_trace(self, event_name: str, info: dict):
+        """httpx的trace扩展：由连接建立、请求头发出、响应头接收事件计算connect、ttfb"""
+        now = time.perf_counter()
+        if event_name.endswith(".started"):
+            self._trace_marks[event_name[:-len(".started")]] = now
+            return
+        if not event_name.endswith(".complete"):
+            return
+        step = event_name[:-len(".complete")]
+        started = self._trace_marks.pop(step, None)
+        if started is None:
+            return
+        if step in ("connection.connect_tcp", "connection.start_tls"):
+            self.connect += now - started
+        elif step.endswith("send_request_headers"):
+            self._trace_marks["ttfb"] = started
+        elif step.endswith("receive_response_headers") and "ttfb" in self._trace_marks:
+            # 与requests的response.elapsed一致，计入建立连接的耗时
+            self.ttfb = self.connect + now - self._trace_marks.pop("ttfb")
+
+
+_current_timing: contextvars.ContextVar[Optional[RequestTiming]] = \
+    contextvars.ContextVar("aomaker_request_timing", default=None)
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return _current_timing.get()
+
+
+def note_connect(seconds: float):
+    """连接建立耗时，由session_pool中的连接类在新建连接时调用"""
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.connect += seconds
+
+
+def timed_callback(callback):
+    """包装响应回调，耗时计入当前请求的callback阶段"""
+
+    def inner(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return callback(*args, **kwargs)
+        finally:
+            timing = _current_timing.get()
+            if timing is not None:
+                timing.callback += time.perf_counter() - start
+
+    return inner
+
+
+class MetricsRegistry:
+    """进程内的接口耗时直方图，key: (接口, 状态)，value: {阶段: 直方图}"""
+
+    def __init__(self):
+        self._data: Dict[Tuple[str, str], Dict[str, Histogram]] = {}
+        self._lock = threading.Lock()
+        self._dump_lock = threading.Lock()
+
+    @contextmanager
+    def timing(self, api: str):
+        """
+        记录一次接口调用，调用方在收到响应后设置timing.status
+        :param api: 接口名，<AO类名>.<方法名>
+        """
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        try:
+            yield timing
+        finally:
+            _current_timing.reset(token)
+            total = time.perf_counter() - timing.start - timing.callback
+            self.record(api, timing.status, total=total, connect=timing.connect or None, ttfb=timing.ttfb,
+                        callback=timing.callback)
+
+    def record(self, api: str, status, **phases: Optional[float]):
+        key = (api, str(status))
+        with self._lock:
+            histograms = self._data.get(key)
+            if histograms is None:
+                histograms = self._data[key] = {phase: Histogram() for phase in PHASES}
+            for phase, seconds in phases.items():
+                if seconds is not None:
+                    histograms[phase].record(seconds)
+
+    def merge(self, other: "MetricsRegistry"):
+        items = other.items()
+        with self._lock:
+            for key, histograms in items:
+                target = self._data.setdefault(key, {phase: Histogram() for phase in PHASES})
+                for phase, histogram in histograms.items():
+                    target[phase].merge(histogram)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def summary(self) -> list:
+        """:return: [{"api":..., "status":..., "count":..., 各阶段耗时统计},...]，按接口、状态排序"""
+        rows = []
+        for (api, status), histograms in sorted(self.items()):
+            rows.append({"api": api, "status": status, "count": histograms["total"].count,
+                         **{phase: histograms[phase].summary() for phase in PHASES}})
+        return rows
+
+    def to_dict(self) -> dict:
+        return {f"{api}|{status}": {phase: h.to_dict() for phase, h in histograms.items()}
+                for (api, status), histograms in self.items()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "MetricsRegistry":
+        registry = cls()
+        for key, histograms in data.items():
+            api, _, status = key.rpartition("|")
+            registry._data[(api, status)] = {phase: Histogram.from_dict(histograms[phase]) for phase in PHASES}
+        return registry
+
+    def dump(self):
+        """写入reports/metrics/<pid>.json，同一进程多次写入时覆盖（记录是累计的）"""
+        if not self._data:
+            return
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+        # 同一进程的多个线程共用一个文件，串行写入，避免互相替换/删除对方的临时文件
+        with self._dump_lock:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f)
+            os.replace(path + ".tmp", path)
+
+    def _after_fork(self):
+        # 子进程不继承父进程已记录的数据，否则合并时重复计数
+        self._data = {}
+        self._lock = threading.Lock()
+        self._dump_lock = threading.Lock()
+
+
+metrics = MetricsRegistry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=metrics._after_fork)
+
+
+def reset_metrics():
+    """运行开始时清理上次运行的数据"""
+    metrics.clear()
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+
+def collect_metrics() -> list:
+    """
+    主进程在运行结束时调用：写入本进程的数据，合并各进程的数据写入reports/metrics.json
+    :return: 合并后的统计，同MetricsRegistry.summary
+    """
+    metrics.dump()
+    merged = MetricsRegistry()
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        try:
+            with open(path, encoding="utf-8") as f:
+                merged.merge(MetricsRegistry.from_dict(json.load(f)))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"<AoMaker> 接口耗时数据{path}读取失败：{e}")
+    summary = merged.summary()
+    if summary:
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        with open(METRICS_JSON, "w", encoding="utf-8") as f:
+            json.dump({"apis": summary, "histograms": merged.to_dict()}, f, ensure_ascii=False)
+    return summary
@@ -0,0 +1,137 @@
+# --coding:utf-8--
+"""
+常驻worker（多进程 arun --mp --persistent）
+1.预热：主进程在创建进程池前导入pytest、allure、aomaker运行时模块和项目的apis包，fork出的worker直接继承，不再各自冷启动导入；
+  分批前的用例收集也在主进程完成，测试模块同样会被worker继承
+2.复用pytest会话：每个worker只执行一次pytest.main，插件初始化、用例收集、session级夹具都只做一次，
+  之后在pytest_runtestloop中从共享队列循环领取用例批次执行，直到收到结束标记None
+批次的最后一条用例以下一批次的第一条用例作为nextitem，夹具的teardown范围与在同一会话中连续执行这些用例一致
+"""
+import os
+import sys
+import pkgutil
+import importlib
+from typing import Dict, List, Optional, Iterable
+
+import pytest
+from _pytest.nodes import Item
+
+from aomaker.async_runner import AsyncRunnerPlugin
+from aomaker.log import logger
+from aomaker.path import BASEDIR
+
+# 主进程预先导入的模块
+PRELOAD_MODULES = (
+    "_pytest.python",
+    "_pytest.fixtures",
+    "allure",
+    "allure_pytest.plugin",
+    "jsonschema",
+    "genson",
+    "aomaker.aomaker",
+    "aomaker.fixture",
+    "aomaker.base.base_api",
+    "aomaker.base.async_base_api",
+    "aomaker.base.base_testcase",
+    "aomaker.schema_capture",
+)
+# 主进程预先导入的项目包（含全部子模块）
+PRELOAD_PACKAGES = ("apis",)
+
+
+def preload(modules: Iterable[str] = PRELOAD_MODULES, packages: Iterable[str] = PRELOAD_PACKAGES) -> int:
+    """
+    预先导入模块，导入失败的模块跳过（由worker中的pytest按原有方式导入并报告错误）
+    :return: 成功导入的模块数
+    """
+    if BASEDIR not in sys.path:
+        sys.path.append(BASEDIR)
+    names = list(modules)
+    for package in packages:
+        if not os.path.isdir(os.path.join(BASEDIR, package)):
+            continue
+        names.append(package)
+        names.extend(name for _, name, _ in pkgutil.walk_packages([os.path.join(BASEDIR, package)], f"{package}."))
+    loaded = 0
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.debug(f"<AoMaker> 预热导入{name}失败：{e}")
+        else:
+            loaded += 1
+    return loaded
+
+
+class PersistentSessionPlugin:
+    """pytest插件：常驻worker在同一个pytest会话内循环领取用例批次执行"""
+
+    def __init__(self, queue, async_plugin: AsyncRunnerPlugin = None):
+        self.queue = queue
+        self.async_plugin = async_plugin
+        self.executed = 0
+        # key: node id，value: 本会话收集到的用例
+        self._items: Dict[str, Item] = {}
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtestloop(self, session):
+        if session.testsfailed and not session.config.option.continue_on_collection_errors:
+            raise session.Interrupted(
+                f"{session.testsfailed} error{'s' if session.testsfailed != 1 else ''} during collection")
+        if session.config.option.collectonly:
+            return True
+
+        self._items = {item.nodeid: item for item in session.items}
+        concurrent = self.async_plugin is not None and self.async_plugin.concurrency > 0
+        chunk = self._next_chunk()
+        while chunk is not None:
+            if concurrent:
+                # 协程用例按批次并发执行，需先确定本批次之后的用例
+                following = self._next_chunk()
+                self.async_plugin.run_items(session, chunk, following[0] if following else None)
+            else:
+                following = self._run_chunk(session, chunk)
+            self.executed += len(chunk)
+            chunk = following
+        return True
+
+    def _run_chunk(self, session, chunk: List[Item]) -> Optional[List[Item]]:
+        """
+        执行一个批次，执行最后一条用例前才领取下一批次，尽量不占用其它worker可领取的批次
+        :return: 下一批次
+        """
+        following = None
+        for i, item in enumerate(chunk):
+            if i + 1 < len(chunk):
+                nextitem = chunk[i + 1]
+            else:
+                following = self._next_chunk()
+                nextitem = following[0] if following else None
+            item.config.hook.pytest_runtest_protocol(item=item, nextitem=nextitem)
+            if session.shouldfail:
+                raise session.Failed(session.shouldfail)
+            if session.shouldstop:
+                raise session.Interrupted(session.shouldstop)
+        return following
+
+    def _next_chunk(self) -> Optional[List[Item]]:
+        """领取下一个批次，返回None表示队列已结束"""
+        while True:
+            node_ids = self.queue.get()
+            if node_ids is None:
+                return None
+            chunk = []
+            for node_id in node_ids:
+                item = self._items.get(node_id)
+                if item is None:
+                    logger.warning(f"<AoMaker> 常驻worker未收集到用例：{node_id}")
+                else:
+                    chunk.append(item)
+            if chunk:
+                return chunk
+
+
+def session_args(chunks: List[List[str]], option_args: List[str]) -> List[str]:
+    """常驻worker的pytest参数：全部批次涉及的测试文件（保持顺序）+ 选项参数，每个worker收集一次"""
+    paths = dict.fromkeys(node_id.split("::")[0] for chunk in chunks for node_id in chunk)
+    return [*paths, *option_args]
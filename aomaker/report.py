@@ -3,7 +3,8 @@ import os
 
 from jinja2 import Template
 
-from aomaker.utils.gen_allure_report import CaseSummary, CaseDetail
+from aomaker.utils.gen_allure_report import CaseSummary, CaseDetail, ResultIndex
+from aomaker.cache import case_result
 from aomaker.path import AOMAKER_HTML
 from aomaker._printer import printer
 
@@ -55,10 +56,20 @@ class HtmlMaker:
             f.write(temp_str)
 
 
-@printer("gen_rep")
-def gen_reports():
-    case_summary = CaseSummary()
-    case_detail = CaseDetail()
+def live_result_index() -> ResultIndex:
+    """由result表（LiveReportPlugin实时写入）构建用例结果索引"""
+    return ResultIndex.from_case_results(case_result.get_all())
+
+
+def render_reports(index: ResultIndex = None, allure_summary: dict = None, api_metrics: list = None):
+    """
+    渲染aomaker.html
+    :param index: 用例结果索引，不传时使用get_result_index()解析allure result.json（结果文件未变化时复用）
+    :param allure_summary: summary.json格式的统计数据，不传时读取allure generate生成的summary.json
+    :param api_metrics: 接口耗时统计（见metrics.collect_metrics），不传时不展示
+    """
+    case_summary = CaseSummary(allure_summary)
+    case_detail = CaseDetail(index)
     summary = {
         "total": case_summary.total_count,
         "passed_count": case_summary.passed_count,
@@ -72,7 +83,22 @@ def gen_reports():
         "duration": case_summary.duration,
         "start_time": case_summary.start_time,
         "end_time": case_summary.stop_time,
-        "case_list": case_detail.case_detail_info()
+        "case_list": case_detail.case_detail_info(),
+        "api_metrics": api_metrics or []
     }
     html_maker = HtmlMaker()
     html_maker.render_template_html(summary)
+
+
+@printer("gen_rep")
+def gen_reports(index: ResultIndex = None, live: bool = False, api_metrics: list = None):
+    """
+    :param index: 用例结果索引
+    :param live: 是否由result表的实时汇总结果生成，不依赖allure generate；index不传时读取result表
+    :param api_metrics: 接口耗时统计
+    """
+    if live:
+        index = index or live_result_index()
+        render_reports(index, index.summary(), api_metrics)
+    else:
+        render_reports(index, api_metrics=api_metrics)
@@ -1,8 +1,9 @@
 # --coding:utf-8--
 import os
+import time
 import shutil
 from contextlib import suppress
-from multiprocessing import Pool
+from multiprocessing import Pool, Queue
 from functools import singledispatchmethod
 from concurrent.futures import ThreadPoolExecutor, wait, ALL_COMPLETED
 from typing import Optional
@@ -14,11 +15,17 @@ from _pytest.runner import _update_current_test_var
 from aomaker._printer import printer
 from aomaker.cache import config
 from aomaker.fixture import SetUpSession, TearDownSession, BaseLogin
-from aomaker.log import logger, aomaker_logger
+from aomaker.log import logger, get_aomaker_logger
 from aomaker._constants import Allure
 from aomaker.exceptions import LoginError
 from aomaker.path import REPORT_DIR, PYTEST_INI_DIR
 from aomaker.report import gen_reports
+from aomaker.metrics import metrics, reset_metrics, collect_metrics
+from aomaker.async_runner import AsyncRunnerPlugin
+from aomaker.live_report import LiveReportPlugin, LiveReporter, reset_live_report, final_result_index
+from aomaker.persistent import PersistentSessionPlugin, preload, session_args
+from aomaker.scheduler import (collect_task_groups, collected_tasks, make_chunks, plan_lpt,
+                               record_durations, DEFAULT_CHUNK_SIZE)
 
 from aomaker.hook_manager import cli_hook, session_hook
 
@@ -26,7 +33,8 @@ allure_json_dir = os.path.join(REPORT_DIR, "json")
 RUN_MODE = {
     "Runner": "main",
     "ProcessesRunner": "mp",
-    "ThreadsRunner": "mt"
+    "ThreadsRunner": "mt",
+    "LoadRunner": "mt"
 }
 
 
@@ -51,6 +59,8 @@ def _init(func, login):
     config.set("run_mode", RUN_MODE[method_of_class_name])
     SetUpSession(login).set_session_vars()
     shutil.rmtree(allure_json_dir, ignore_errors=True)
+    reset_live_report()
+    reset_metrics()
     if cli_hook.custom_kwargs:
         cli_hook.run()
     session_hook().execute_pre_hooks()
@@ -64,10 +74,13 @@ class Runner:
                             "--log-format=%(asctime)s %(message)s",
                             "--log-date-format=%Y-%m-%d %H:%M:%S"
                             ]
-        aomaker_logger.allure_handler("debug", is_processes=is_processes)
+        get_aomaker_logger().allure_handler("debug", is_processes=is_processes)
 
     @fixture_session
-    def run(self, args: list, login: BaseLogin = None, is_gen_allure=True, **kwargs):
+    def run(self, args: list, login: BaseLogin = None, is_gen_allure=True, live_interval=0, **kwargs):
+        """
+        :param live_interval: 实时报告刷新间隔（秒），运行期间按该间隔由已完成的用例重新生成aomaker.html，0为不刷新
+        """
         # 配置allure报告中显示日志
         # AoMakerLogger().allure_handler('debug')
         args.extend(self.pytest_args)
@@ -76,11 +89,22 @@ class Runner:
         logger.info(f"<AoMaker> pytest的执行参数：{args}")
         if pytest_opts:
             logger.info(f"<AoMaker> pytest.ini配置参数：{pytest_opts}")
-        pytest.main(args)
+        with LiveReporter(live_interval):
+            pytest.main(args, plugins=[AsyncRunnerPlugin(), LiveReportPlugin()])
+        self._finish(is_gen_allure)
+
+    def _finish(self, is_gen_allure=True):
+        """
+        运行结束：由result表的汇总结果记录用例耗时、生成aomaker.html，最后再执行allure generate，
+        aomaker.html不再等待allure报告生成；result表不完整时改用allure结果
+        """
+        index = final_result_index()
+        record_durations(index)
+        api_metrics = collect_metrics()
         if is_gen_allure:
+            gen_reports(index, live=True, api_metrics=api_metrics)
             self.allure_env_prop()
             self.gen_allure()
-            gen_reports()
 
     @staticmethod
     def make_testsuite_path(path: str) -> list:
@@ -155,6 +179,39 @@ class Runner:
     def clean_allure_json(allure_json_path: str):
         shutil.rmtree(allure_json_path, ignore_errors=True)
 
+    @staticmethod
+    def _execute_lpt_tasks(executor, worker_count, task_args, extra_args):
+        """
+        按历史耗时LPT分配用例，每个worker执行一次pytest
+        :param executor: 进程池/线程池类，Pool或ThreadPoolExecutor
+        """
+        option_args = []
+        partitions = plan_lpt(task_args, extra_args, worker_count, option_args)
+        if not partitions:
+            logger.warning("<AoMaker> 未收集到需要执行的用例")
+            return
+        predicted = max(load for load, _ in partitions)
+        start = time.time()
+        with executor(len(partitions)) as pool:
+            logger.info(f"<AoMaker> LPT调度启动，worker数：{len(partitions)}")
+            list(pool.map(_task_of(executor), [[*node_ids, *option_args] for _, node_ids in partitions]))
+        actual = time.time() - start
+        logger.info(f"<AoMaker> LPT调度执行结束，预估耗时：{predicted:.2f}s，实际耗时：{actual:.2f}s")
+
+    @staticmethod
+    def _execute_collected_tasks(executor, worker_count, task_args, extra_args):
+        """
+        主进程只收集一次用例，每个分组的node id交给一个worker执行，worker只导入分到的用例所在模块
+        :param executor: 进程池/线程池类，Pool或ThreadPoolExecutor
+        """
+        tasks = collected_tasks(task_args, extra_args)
+        if not tasks:
+            logger.warning("<AoMaker> 未收集到需要执行的用例")
+            return
+        with executor(min(worker_count, len(tasks))) as pool:
+            logger.info(f"<AoMaker> 单次收集分发启动，worker数：{min(worker_count, len(tasks))}，任务数：{len(tasks)}")
+            list(pool.map(_task_of(executor), tasks))
+
 
 def _get_pytest_ini() -> list:
     from aomaker.utils.utils import HandleIni
@@ -192,16 +249,38 @@ class ProcessesRunner(Runner):
     def _execute_tasks(self, process_count, task_args, extra_args):
         with Pool(process_count) as pool:
             logger.info(f"<AoMaker> 多进程任务启动，进程数：{process_count}")
-            pool.map(main_task, make_args_group(task_args, extra_args))
+            pool.map(process_task, make_args_group(task_args, extra_args))
 
-    def _generate_reports(self):
-        self.allure_env_prop()
-        self.gen_allure()
-        gen_reports()
+    def _execute_dynamic_tasks(self, process_count, task_args, extra_args, chunk_size, persistent=False):
+        """
+        动态调度：worker常驻，从共享队列中按批次领取用例执行
+        :param persistent: 是否预热主进程并让每个worker复用同一个pytest会话，否则每个批次执行一次pytest.main
+        """
+        option_args = []
+        groups = collect_task_groups(task_args, extra_args, option_args=option_args)
+        chunks = make_chunks(groups, chunk_size)
+        if not chunks:
+            logger.warning("<AoMaker> 未收集到需要执行的用例")
+            return
+        process_count = min(process_count or self.max_process_count, len(chunks))
+        queue = Queue()
+        for chunk in chunks:
+            queue.put(chunk)
+        for _ in range(process_count):
+            queue.put(None)
+        worker, worker_args = worker_loop, option_args
+        if persistent:
+            logger.info(f"<AoMaker> 常驻worker模式，主进程已预热导入模块数：{preload()}")
+            worker, worker_args = persistent_worker, session_args(chunks, option_args)
+        with Pool(process_count, initializer=_init_worker_queue, initargs=(queue,)) as pool:
+            logger.info(f"<AoMaker> 多进程动态调度启动，进程数：{process_count}，"
+                        f"用例数：{sum(len(c) for c in chunks)}，批次数：{len(chunks)}")
+            pool.map(worker, [worker_args] * process_count, chunksize=1)
 
     @fixture_session
     def run(self, task_args, login: BaseLogin = None, extra_args=None, is_gen_allure=True, process_count=None,
-            **kwargs):
+            dynamic=False, chunk_size=DEFAULT_CHUNK_SIZE, lpt=False, live_interval=0, persistent=False,
+            collect_once=False, **kwargs):
         """
         多进程启动pytest任务
         :param task_args:
@@ -211,22 +290,37 @@ class ProcessesRunner(Runner):
         :param extra_args: pytest其它参数列表
         :param is_gen_allure: 是否自动收集allure报告，默认收集
         :param process_count: 进程数
+        :param dynamic: 是否动态调度，先收集用例再按批次分发给常驻worker，分配模式仅作为分组约束
+        :param chunk_size: 动态调度时每个批次的用例数
+        :param lpt: 是否按历史耗时LPT分配用例，分配模式只决定待执行的用例集合
+        :param live_interval: 实时报告刷新间隔（秒），0为不刷新
+        :param persistent: 常驻worker模式，按动态调度分批，主进程预热导入后fork出worker，每个worker只启动一次pytest会话
+        :param collect_once: 主进程只收集一次用例，按分组把node id分发给worker，worker不再各自收集整个用例目录
         :return:
         """
         extra_args = self._prepare_extra_args(extra_args)
         task_args = self._prepare_task_args(task_args)
-        if process_count is None:
-            process_count = self._calculate_process_count(task_args)
-        else:
-            process_count = min(process_count, len(task_args), self.max_process_count)
-        self._execute_tasks(process_count, task_args, extra_args)
-        if is_gen_allure:
-            self._generate_reports()
+        with LiveReporter(live_interval):
+            if dynamic or persistent:
+                self._execute_dynamic_tasks(process_count, task_args, extra_args, chunk_size, persistent)
+            elif lpt:
+                self._execute_lpt_tasks(Pool, process_count or self.max_process_count, task_args, extra_args)
+            elif collect_once:
+                process_count = min(process_count or self.max_process_count, self.max_process_count)
+                self._execute_collected_tasks(Pool, process_count, task_args, extra_args)
+            else:
+                if process_count is None:
+                    process_count = self._calculate_process_count(task_args)
+                else:
+                    process_count = min(process_count, len(task_args), self.max_process_count)
+                self._execute_tasks(process_count, task_args, extra_args)
+        self._finish(is_gen_allure)
 
 
 class ThreadsRunner(Runner):
     @fixture_session
-    def run(self, task_args: list or str, login: BaseLogin = None, extra_args=None, is_gen_allure=True, **kwargs):
+    def run(self, task_args: list or str, login: BaseLogin = None, extra_args=None, is_gen_allure=True, lpt=False,
+            live_interval=0, collect_once=False, **kwargs):
         """
         多线程启动pytest任务
         :param task_args:
@@ -235,6 +329,9 @@ class ThreadsRunner(Runner):
         :param login: Login登录对象
         :param extra_args: pytest其它参数列表
         :param is_gen_allure: 是否自动收集allure报告，默认收集
+        :param lpt: 是否按历史耗时LPT分配用例，线程数不变，分配模式只决定待执行的用例集合
+        :param live_interval: 实时报告刷新间隔（秒），0为不刷新
+        :param collect_once: 只收集一次用例，按分组把node id分发给各线程
         :return:
         """
         if extra_args is None:
@@ -242,15 +339,18 @@ class ThreadsRunner(Runner):
         extra_args.extend(self.pytest_args)
         task_args = self.make_task_args(task_args)
         thread_count = len(task_args)
-        tp = ThreadPoolExecutor(max_workers=thread_count)
-        logger.info(f"<AoMaker> 多线程任务启动，线程数：{thread_count}")
-        _ = [tp.submit(main_task, arg) for arg in make_args_group(task_args, extra_args)]
-        wait(_, return_when=ALL_COMPLETED)
-        tp.shutdown()
-        if is_gen_allure:
-            self.allure_env_prop()
-            self.gen_allure()
-            gen_reports()
+        with LiveReporter(live_interval):
+            if lpt:
+                self._execute_lpt_tasks(ThreadPoolExecutor, thread_count, task_args, extra_args)
+            elif collect_once:
+                self._execute_collected_tasks(ThreadPoolExecutor, thread_count, task_args, extra_args)
+            else:
+                tp = ThreadPoolExecutor(max_workers=thread_count)
+                logger.info(f"<AoMaker> 多线程任务启动，线程数：{thread_count}")
+                _ = [tp.submit(main_task, arg) for arg in make_args_group(task_args, extra_args)]
+                wait(_, return_when=ALL_COMPLETED)
+                tp.shutdown()
+        self._finish(is_gen_allure)
 
 
 class CustomTeardownPlugin:
@@ -269,7 +369,51 @@ def main_task(args: list):
     if pytest_opts:
         logger.info(f"<AoMaker> pytest.ini配置参数：{pytest_opts}")
     plugin = CustomTeardownPlugin()
-    pytest.main(args, plugins=[plugin])
+    pytest.main(args, plugins=[plugin, AsyncRunnerPlugin(), LiveReportPlugin()])
+
+
+def process_task(args: list):
+    """多进程worker中启动pytest，结束后写入本进程的接口耗时数据；多线程模式由主进程在运行结束时统一写入"""
+    main_task(args)
+    metrics.dump()
+
+
+def _task_of(executor):
+    """:param executor: 进程池/线程池类，Pool或ThreadPoolExecutor"""
+    return main_task if executor is ThreadPoolExecutor else process_task
+
+
+_task_queue = None
+
+
+def _init_worker_queue(queue):
+    global _task_queue
+    _task_queue = queue
+
+
+def worker_loop(option_args: list) -> int:
+    """常驻worker：循环领取用例批次执行，直到收到结束标记None"""
+    executed = 0
+    while True:
+        chunk = _task_queue.get()
+        if chunk is None:
+            break
+        main_task([*chunk, *option_args])
+        executed += len(chunk)
+    metrics.dump()
+    logger.info(f"<AoMaker> worker执行结束，共执行用例数：{executed}")
+    return executed
+
+
+def persistent_worker(args: list) -> int:
+    """常驻worker：只执行一次pytest.main，在同一个会话内循环领取用例批次执行，直到收到结束标记None"""
+    logger.info(f"<AoMaker> 常驻worker启动，pytest的执行参数：{args}")
+    async_plugin = AsyncRunnerPlugin()
+    session_plugin = PersistentSessionPlugin(_task_queue, async_plugin)
+    pytest.main(args, plugins=[CustomTeardownPlugin(), async_plugin, LiveReportPlugin(), session_plugin])
+    metrics.dump()
+    logger.info(f"<AoMaker> worker执行结束，共执行用例数：{session_plugin.executed}")
+    return session_plugin.executed
 
 
 def make_args_group(args: list, extra_args: list):
@@ -228,6 +228,9 @@ class Login(BaseLogin):
     create_table(db, DB.CONFIG_TABLE)
     create_table(db, DB.CACHE_TABLE)
     create_table(db, DB.SCHEMA_TABLE)
+    from aomaker.database.migrations import migrate
+    migrate(db.connection)
+    db.close()
     logger.info("---------------------脚手架创建完成---------------------")
 
     return 0
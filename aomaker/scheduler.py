@@ -0,0 +1,265 @@
+# --coding:utf-8--
+"""
+用例调度
+动态调度：先收集所有待执行用例的node id，按分配模式（mark/file/suite）分组后切成小批次，
+         常驻worker从共享队列中领取批次执行，先完成的worker继续领取，直到队列为空
+LPT调度：根据历史耗时，按耗时从长到短依次把用例分配给当前负载最小的worker，使各worker总耗时尽量均衡
+用例收集只在主进程执行一次，再按mark表达式/路径把用例划分到各分组，worker只接收node id，
+只导入分到的用例所在的模块
+"""
+import os
+import heapq
+import statistics
+from typing import List, Dict, Tuple, Callable, Optional
+
+import pytest
+from _pytest.mark import MarkMatcher
+from _pytest.mark.expression import Expression
+from allure_commons.utils import represent
+from allure_pytest.utils import allure_full_name
+
+from aomaker.async_runner import AsyncRunnerPlugin
+from aomaker.cache import duration
+from aomaker.log import logger
+from aomaker.utils.gen_allure_report import duration_key, get_case_durations
+
+DEFAULT_CHUNK_SIZE = 10
+# 没有任何历史耗时记录时，单条用例的预估耗时（秒）
+DEFAULT_DURATION = 1.0
+
+
+class NodeCollector:
+    """pytest插件：只收集用例，记录最终选中（经过-m/-k等筛选后）的node id"""
+
+    def __init__(self, matchers: Optional[List[Tuple[str, Callable]]] = None):
+        """
+        :param matchers: [(分组, 判断用例是否属于该分组的函数),...]，传入时按分组划分用例
+        """
+        self.matchers = matchers or []
+        self.node_ids: List[str] = []
+        # key: node id，value: 耗时记录key
+        self.duration_keys: Dict[str, str] = {}
+        # key: 分组，value: node id列表
+        self.groups: Dict[str, List[str]] = {}
+        # pytest解析出的位置参数（测试路径），按出现顺序
+        self.path_args: List[str] = []
+
+    def pytest_configure(self, config):
+        self.path_args = list(config.option.file_or_dir or [])
+
+    def pytest_collection_finish(self, session):
+        self.node_ids = [item.nodeid for item in session.items]
+        self.duration_keys = {item.nodeid: item_duration_key(item) for item in session.items}
+        self.groups = {group: [] for group, _ in self.matchers}
+        for item in session.items:
+            for group, match in self.matchers:
+                if match(item):
+                    self.groups[group].append(item.nodeid)
+                    break
+
+
+def _mark_matcher(item):
+    # pytest 8起MarkMatcher.from_item改为from_markers
+    if hasattr(MarkMatcher, "from_markers"):
+        return MarkMatcher.from_markers(item.iter_markers())
+    return MarkMatcher.from_item(item)
+
+
+def _is_mark_arg(task_arg: str) -> bool:
+    return task_arg.startswith("-m")
+
+
+def group_matcher(task_arg: str) -> Callable:
+    """
+    分组的匹配函数
+    :param task_arg: mark参数（如'-m demo'，按pytest -m的表达式规则匹配）或测试套件/文件路径
+    :return: 匹配函数，mark表达式无法解析时返回None
+    """
+    if _is_mark_arg(task_arg):
+        try:
+            expression = Expression.compile(task_arg[2:].strip())
+        except SyntaxError:
+            return None
+        return lambda item: expression.evaluate(_mark_matcher(item))
+    path = os.path.abspath(task_arg)
+    return lambda item: str(item.path) == path or str(item.path).startswith(path + os.sep)
+
+
+def item_duration_key(item) -> str:
+    """用例耗时记录的key，与allure result.json中的fullName、parameters保持一致"""
+    params = item.callspec.params if hasattr(item, "callspec") else {}
+    return duration_key(allure_full_name(item), [(name, represent(value)) for name, value in params.items()])
+
+
+def collect_node_ids(args: List[str], duration_keys: Dict[str, str] = None) -> List[str]:
+    """
+    收集用例node id
+    :param args: pytest参数
+    :param duration_keys: 传入dict时，同时收集每条用例的耗时记录key
+    :return: node id列表
+    """
+    collector = _collect(args)
+    if duration_keys is not None:
+        duration_keys.update(collector.duration_keys)
+    return collector.node_ids
+
+
+def _collect(args: List[str], matchers: List[Tuple[str, Callable]] = None) -> NodeCollector:
+    collector = NodeCollector(matchers)
+    # 注册AsyncRunnerPlugin，使pytest能识别其命令行参数
+    exit_code = pytest.main(["--collect-only", "-qq", *args], plugins=[collector, AsyncRunnerPlugin()])
+    if exit_code == pytest.ExitCode.USAGE_ERROR:
+        # 参数错误（如-m表达式无法解析）时pytest_collection_finish仍会执行，此时的用例未经筛选，不能分发执行
+        logger.error(f"<AoMaker> 用例收集参数有误，不执行该分组：{args}")
+        path_args = collector.path_args
+        collector = NodeCollector(matchers)
+        collector.groups = {group: [] for group, _ in collector.matchers}
+        collector.path_args = path_args
+    return collector
+
+
+def collect_task_groups(task_args: List[str], extra_args: List[str], duration_keys: Dict[str, str] = None,
+                        option_args: List[str] = None) -> Dict[str, List[str]]:
+    """
+    按分配模式收集各分组的用例：只执行一次pytest收集，再按mark表达式/路径把用例划分到各分组
+    :param task_args: make_task_args的结果，mark参数（如'-m demo'）或测试套件/文件路径
+    :param extra_args: pytest其它参数
+    :param duration_keys: 传入dict时，同时收集每条用例的耗时记录key
+    :param option_args: 传入list时，同时填入extra_args中去掉测试路径后的选项参数（见strip_path_args）
+    :return: {分组: [node id,...]}，同一用例命中多个分组时只保留在第一个分组中
+    """
+    matchers = [(task_arg, group_matcher(task_arg)) for task_arg in task_args]
+    if all(match is not None for _, match in matchers):
+        paths = [task_arg for task_arg in task_args if not _is_mark_arg(task_arg)]
+        collector = _collect([*paths, *extra_args], matchers)
+        if duration_keys is not None:
+            duration_keys.update(collector.duration_keys)
+        groups = collector.groups
+        # 分组路径在最前面，之后的位置参数来自extra_args
+        path_args = collector.path_args[len(paths):]
+    else:
+        # mark表达式无法解析时，逐个分组交给pytest -m收集，由pytest报告表达式错误
+        groups = {}
+        seen = set()
+        path_args = []
+        for task_arg in task_args:
+            collector = _collect([task_arg, *extra_args])
+            if duration_keys is not None:
+                duration_keys.update(collector.duration_keys)
+            node_ids = [node_id for node_id in collector.node_ids if node_id not in seen]
+            seen.update(node_ids)
+            groups[task_arg] = node_ids
+            path_args = collector.path_args
+    if option_args is not None:
+        option_args.extend(strip_path_args(extra_args, path_args))
+    for task_arg, node_ids in groups.items():
+        logger.info(f"<AoMaker> 分组<{task_arg}>收集到用例数：{len(node_ids)}")
+    return groups
+
+
+def collected_tasks(task_args: List[str], extra_args: List[str]) -> List[List[str]]:
+    """
+    一次收集后，每个分组的用例node id + 选项参数作为一个worker任务，空分组不生成任务
+    :return: [[node id,...,选项参数,...],...]
+    """
+    option_args = []
+    groups = collect_task_groups(task_args, extra_args, option_args=option_args)
+    return [[*node_ids, *option_args] for node_ids in groups.values() if node_ids]
+
+
+def make_chunks(groups: Dict[str, List[str]], chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[List[str]]:
+    """
+    将各分组用例切分为批次，批次不跨分组，用例多的分组排在前面优先开始
+    :return: [[node id,...],...]
+    """
+    chunk_size = max(chunk_size, 1)
+    chunks = []
+    for node_ids in sorted(groups.values(), key=len, reverse=True):
+        for i in range(0, len(node_ids), chunk_size):
+            chunks.append(node_ids[i:i + chunk_size])
+    return chunks
+
+
+def strip_path_args(args: List[str], path_args: List[str]) -> List[str]:
+    """
+    去掉参数中的测试路径，按node id执行时只保留选项参数，避免每个批次重复执行整个目录
+    :param args: pytest参数
+    :param path_args: pytest解析出的位置参数（NodeCollector.path_args），选项的取值（如--rootdir tests）不在其中
+    :return: 选项参数
+    """
+    remaining = list(path_args)
+    option_args = []
+    # 位置参数通常在最后，从后往前匹配，与选项取值同名时优先去掉靠后的一个
+    for arg in reversed(args):
+        if arg in remaining:
+            remaining.remove(arg)
+        else:
+            option_args.append(arg)
+    return option_args[::-1]
+
+
+def estimate_durations(node_ids: List[str], duration_keys: Dict[str, str]) -> Dict[str, float]:
+    """
+    根据历史耗时预估每条用例的耗时，没有历史记录的用例按已知用例耗时的中位数估算
+    :return: {node id: 预估耗时(秒)}
+    """
+    history = duration.get_many({duration_keys[node_id] for node_id in node_ids})
+    default = statistics.median(history.values()) if history else DEFAULT_DURATION
+    unknown = 0
+    estimates = {}
+    for node_id in node_ids:
+        seconds = history.get(duration_keys[node_id])
+        if seconds is None:
+            unknown += 1
+            seconds = default
+        estimates[node_id] = seconds
+    logger.info(f"<AoMaker> 用例数：{len(node_ids)}，有历史耗时记录：{len(node_ids) - unknown}，"
+                f"无记录的用例按{default:.2f}s估算")
+    return estimates
+
+
+def lpt_partition(estimates: Dict[str, float], worker_count: int) -> List[Tuple[float, List[str]]]:
+    """
+    LPT（最长处理时间优先）装箱：用例按预估耗时从长到短，依次分配给当前总耗时最小的worker
+    :param estimates: {node id: 预估耗时(秒)}，按收集顺序排列
+    :param worker_count: worker数
+    :return: [(预估总耗时, [node id,...]),...]，每个worker内的用例保持收集顺序，便于复用class/module级夹具
+    """
+    order = {node_id: i for i, node_id in enumerate(estimates)}
+    bins = [(0.0, i, []) for i in range(max(worker_count, 1))]
+    for node_id in sorted(estimates, key=lambda n: estimates[n], reverse=True):
+        load, i, node_ids = heapq.heappop(bins)
+        node_ids.append(node_id)
+        heapq.heappush(bins, (load + estimates[node_id], i, node_ids))
+    partitions = [(load, sorted(node_ids, key=order.get)) for load, _, node_ids in sorted(bins, key=lambda b: b[1])]
+    return [p for p in partitions if p[1]]
+
+
+def plan_lpt(task_args: List[str], extra_args: List[str], worker_count: int,
+             option_args: List[str] = None) -> List[Tuple[float, List[str]]]:
+    """
+    收集用例并按历史耗时做LPT分配，分配模式只决定待执行的用例集合
+    :param option_args: 同collect_task_groups
+    :return: [(预估总耗时, [node id,...]),...]
+    """
+    duration_keys = {}
+    groups = collect_task_groups(task_args, extra_args, duration_keys, option_args)
+    node_ids = [node_id for group in groups.values() for node_id in group]
+    if not node_ids:
+        return []
+    estimates = estimate_durations(node_ids, duration_keys)
+    partitions = lpt_partition(estimates, min(worker_count, len(node_ids)))
+    for i, (load, ids) in enumerate(partitions):
+        logger.info(f"<AoMaker> worker-{i} 分配用例数：{len(ids)}，预估耗时：{load:.2f}s")
+    return partitions
+
+
+def record_durations(index=None):
+    """
+    将本次运行的用例耗时写入历史耗时记录
+    :param index: 用例结果索引（ResultIndex），不传时解析allure result.json
+    """
+    durations = get_case_durations(index)
+    if durations:
+        duration.record_many(durations)
+        logger.info(f"<AoMaker> 已记录用例耗时数：{len(durations)}")
@@ -0,0 +1,111 @@
+# --coding:utf-8--
+"""
+响应jsonschema采集
+每个接口的响应先计算结构指纹（只看字段名和值类型，不看具体值），指纹已出现过的响应直接跳过；
+新结构的响应通过SchemaBuilder.add_schema与已有schema增量合并后写回schema表，而不是被当作重复数据丢弃，
+读取-合并-写回在同一个事务中完成，多线程/多进程同时采集时不会丢失结构。
+采样率按接口配置（BaseApi.SCHEMA_SAMPLE_RATE/SCHEMA_SAMPLE_RATES），每个接口的首个响应总会采集。
+"""
+import random
+import threading
+from typing import Dict, Set
+
+from genson import SchemaBuilder
+
+from aomaker.cache import schema
+from aomaker.log import logger
+
+_SCALAR_TYPES = {bool: "boolean", int: "integer", float: "number", str: "string", type(None): "null"}
+# 计算指纹时，列表超过该长度只等间隔抽取这么多个元素（含首尾），大列表响应的指纹计算耗时与长度无关
+LIST_SAMPLE_SIZE = 64
+
+
+def _sample(items: list) -> list:
+    length = len(items)
+    if length <= LIST_SAMPLE_SIZE:
+        return items
+    step = (length - 1) / (LIST_SAMPLE_SIZE - 1)
+    return [items[round(i * step)] for i in range(LIST_SAMPLE_SIZE)]
+
+
+def _shape(data):
+    """数据结构：dict为(字段名, 结构)集合，list为元素结构集合，标量为json类型名"""
+    if isinstance(data, dict):
+        return frozenset((key, _shape(value)) for key, value in data.items())
+    if isinstance(data, (list, tuple)):
+        return "array", frozenset(_shape(item) for item in _sample(data))
+    return _SCALAR_TYPES.get(type(data), type(data).__name__)
+
+
+def shape_hash(data) -> int:
+    """
+    结构指纹，结构相同的数据生成的jsonschema相同
+    大列表只抽样部分元素，未被抽到的元素结构变化不会产生新指纹；一旦指纹变化，合并时使用完整响应
+    """
+    return hash(_shape(data))
+
+
+class SchemaCapture:
+    """按接口记录已采集的结构指纹，新结构的响应合并到schema表"""
+
+    def __init__(self):
+        # key: 接口名，value: 已采集的结构指纹
+        self._seen: Dict[str, Set[int]] = {}
+        self._lock = threading.Lock()
+        self.skipped = 0
+        self.merged = 0
+
+    def capture(self, api_name: str, data, sample_rate: float = 1.0) -> bool:
+        """
+        采集一次响应
+        :param api_name: 接口名（schema表中的key）
+        :param data: 响应数据
+        :param sample_rate: 采样率，0~1，接口首个响应不受采样率影响
+        :return: schema表是否更新
+        """
+        with self._lock:
+            seen = self._seen.get(api_name)
+            if seen is not None and sample_rate < 1 and random.random() >= sample_rate:
+                self.skipped += 1
+                return False
+        fingerprint = shape_hash(data)
+        with self._lock:
+            seen = self._seen.setdefault(api_name, set())
+            if fingerprint in seen:
+                self.skipped += 1
+                return False
+            seen.add(fingerprint)
+            try:
+                return self._merge(api_name, data)
+            except Exception:
+                # 合并未写入schema表，下次出现该结构时重新合并
+                seen.discard(fingerprint)
+                raise
+
+    def _merge(self, api_name: str, data) -> bool:
+        """
+        读取-合并-写回在同一个BEGIN IMMEDIATE事务中完成，
+        其它线程/进程同时合并同一接口的不同结构时串行执行，不会互相覆盖
+        """
+        with schema.batch():
+            # 事务内重新读取，不使用进程内缓存层中可能过期的schema
+            schema.tier.discard(api_name)
+            stored = schema.get(api_name)
+            builder = SchemaBuilder()
+            if stored:
+                builder.add_schema(stored)
+            builder.add_object(data)
+            merged = builder.to_schema()
+            if merged == stored:
+                return False
+            schema.update(api_name, merged)
+        self.merged += 1
+        logger.debug(f"接口{api_name}的响应出现新结构，jsonschema已合并更新")
+        return True
+
+    def reset(self):
+        with self._lock:
+            self._seen.clear()
+
+
+schema_capture = SchemaCapture()
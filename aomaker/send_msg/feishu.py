@@ -2,7 +2,7 @@
 import requests
 import os
 
-from aomaker.utils.gen_allure_report import CaseSummary, get_allure_results
+from aomaker.utils.gen_allure_report import CaseSummary, ResultIndex, get_allure_results
 from aomaker.utils.utils import load_yaml
 from aomaker.cache import Config
 from aomaker.path import CONF_DIR
@@ -16,11 +16,13 @@ class FeiShu:
     飞书消息通知
     """
 
-    def __init__(self, tester="fj", title="自动化测试通知", report_address=""):
+    def __init__(self, tester="fj", title="自动化测试通知", report_address="", result_index: ResultIndex = None):
         self.feishu_conf = load_yaml(utils_yaml_path)['feishu']
         self.curl = self.feishu_conf['webhook']
         self.headers = {"Content-Type": "application/json"}
         self.test_results = CaseSummary()
+        # allure result.json索引，不传时按标记统计时再解析（结果文件未变化时复用）
+        self.result_index = result_index
         self.total = str(self.test_results.total_count)
         self.passed = str(self.test_results.passed_count)
         self.failed = str(self.test_results.failed_count)
@@ -85,7 +87,7 @@ class FeiShu:
             raise ValueError(f"飞书「消息卡片类型」消息发送失败")
 
     def send_detail_msg(self, sep=" "):
-        reports = get_allure_results(sep=sep)
+        reports = get_allure_results(sep=sep, index=self.result_index)
         if reports:
             markdown_li = []
             for product, result in reports.items():
@@ -0,0 +1,241 @@
+# --coding:utf-8--
+"""
+会话状态快照
+SetUpSession.set_session_vars在主进程中将全局配置（config表）、全局headers和token状态序列化为一个json快照，
+发布到共享内存（multiprocessing.shared_memory），共享内存名通过环境变量传给之后创建的worker进程（fork/spawn均适用）。
+BaseApi实例化时直接读取快照，不再每次新建数据库连接读取全部配置；快照按版本号缓存，版本未变化时只读取8字节的版本号。
+
+共享内存布局：版本号(8字节) + 数据长度(8字节) + json数据
+    写入期间版本号为奇数，读取方发现版本号为奇数或读取前后版本号不一致时重新读取（seqlock），
+    超过READ_TIMEOUT仍读不到完整数据（如写入方在写入中途退出）时放弃快照，改为从数据库读取
+    刷新后的数据超出容量时，创建更大的共享内存，并在原共享内存中写入新共享内存的名称，读取方随之切换；
+    worker进程中创建的共享内存由主进程在会话结束时沿迁移链一并释放
+
+刷新：
+    1.config表、共享命名空间的headers/token状态写入后自动刷新快照（见cache.add_session_listener）
+    2.也可以显式调用session_snapshot.refresh()，如headers在数据库之外被更新时
+    刷新在数据库写锁（BEGIN IMMEDIATE）内进行，多个进程同时刷新时依次写入
+"""
+import os
+import json
+import time
+import struct
+import threading
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from aomaker.cache import config, cache, add_session_listener, CREDENTIAL_KEY
+from aomaker.log import logger
+
+# 共享内存名称的环境变量
+ENV_NAME = "AOMAKER_SESSION_SNAPSHOT"
+# 共享内存最小容量，linux下共享内存按页懒分配，预留容量基本不占用内存
+MIN_CAPACITY = 1 << 20
+# 读取快照时等待写入完成的最长时间（秒）
+READ_TIMEOUT = 1.0
+
+_HEADER = struct.Struct("QQ")
+_MOVED = "__moved__"
+
+
+class Snapshot:
+    """一个版本的会话状态，config、headers、credential均为只读映射"""
+
+    def __init__(self, version: int, data: dict):
+        self.version = version
+        self.config: Mapping = MappingProxyType(data.get("config") or {})
+        self.headers: Mapping = MappingProxyType(data.get("headers") or {})
+        # token状态，见aomaker.credential
+        self.credential: Mapping = MappingProxyType(data.get("credential") or {})
+
+
+class SessionSnapshot:
+
+    def __init__(self):
+        self._shm = None
+        # 本进程创建的共享内存（负责释放）
+        self._owned = []
+        self._current: Optional[Snapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def published(self) -> bool:
+        return self._shm is not None or bool(os.environ.get(ENV_NAME))
+
+    def publish(self, config_data: dict = None, headers: dict = None) -> Snapshot:
+        """
+        发布快照，之后创建的worker进程都可读取
+        :param config_data: 全局配置，默认读取config表
+        :param headers: 全局headers，默认读取共享命名空间的headers
+        """
+        data = self._build(config_data, headers)
+        with self._lock:
+            if self._shm is None:
+                self._shm = self._create(len(data))
+                os.environ[ENV_NAME] = self._shm.name
+            self._write(data)
+        logger.debug(f"<AoMaker> 会话快照已发布：{self._shm.name}，大小：{len(data)}字节")
+        return self.get()
+
+    def refresh(self, config_data: dict = None, headers: dict = None) -> Optional[Snapshot]:
+        """重新读取config表、headers并写入快照，未发布快照时忽略"""
+        if not self.published:
+            return None
+        # 持有数据库写锁期间读取并写入，多个进程同时刷新时不会交错
+        with config.batch():
+            data = self._build(config_data, headers)
+            with self._lock:
+                if not self._attach():
+                    return None
+                self._write(data)
+        return self.get()
+
+    def get(self) -> Optional[Snapshot]:
+        """
+        读取当前快照，版本号未变化时直接返回已解析的快照
+        :return: 未发布快照、或快照一直处于写入中时返回None，调用方改为从数据库读取
+        """
+        with self._lock:
+            if not self._attach():
+                return None
+            deadline = time.monotonic() + READ_TIMEOUT
+            while True:
+                version, length = _HEADER.unpack_from(self._shm.buf, 0)
+                if not version & 1:
+                    if self._current is not None and self._current.version == version:
+                        return self._current
+                    payload = bytes(self._shm.buf[_HEADER.size:_HEADER.size + length])
+                    if _HEADER.unpack_from(self._shm.buf, 0)[0] == version:
+                        data = json.loads(payload)
+                        if _MOVED in data:
+                            # 数据超出原共享内存容量，已迁移到新的共享内存
+                            self._switch(data[_MOVED])
+                            deadline = time.monotonic() + READ_TIMEOUT
+                            continue
+                        self._current = Snapshot(version, data)
+                        return self._current
+                if time.monotonic() >= deadline:
+                    logger.warning(f"<AoMaker> 会话快照{self._shm.name}一直处于写入中，改为从数据库读取")
+                    self._detach()
+                    return None
+                time.sleep(0)
+
+    def close(self):
+        """释放本进程创建的共享内存，以及worker进程扩容时创建的共享内存（由发布快照的主进程在会话结束时调用）"""
+        with self._lock:
+            blocks = list(self._owned)
+            if blocks:
+                blocks.extend(self._moved_chain(blocks[0]))
+            for shm in blocks:
+                shm.close()
+                try:
+                    shm.unlink()
+                except FileNotFoundError:
+                    pass
+            if self._owned:
+                os.environ.pop(ENV_NAME, None)
+            self._owned.clear()
+            self._shm = None
+            self._current = None
+
+    def _moved_chain(self, shm) -> list:
+        """沿迁移记录找到其它进程创建的共享内存"""
+        from multiprocessing import shared_memory
+        owned = {block.name: block for block in self._owned}
+        seen = {shm.name}
+        chain = []
+        while True:
+            length = _HEADER.unpack_from(shm.buf, 0)[1]
+            try:
+                name = json.loads(bytes(shm.buf[_HEADER.size:_HEADER.size + length]))[_MOVED]
+            except (ValueError, KeyError, TypeError):
+                return chain
+            if name in seen:
+                return chain
+            seen.add(name)
+            shm = owned.get(name)
+            if shm is None:
+                try:
+                    shm = shared_memory.SharedMemory(name=name)
+                except FileNotFoundError:
+                    return chain
+                chain.append(shm)
+
+    @staticmethod
+    def _build(config_data: Optional[dict], headers: Optional[dict]) -> bytes:
+        if config_data is None:
+            config_data = config.get_all()
+        if headers is None:
+            headers = cache.get_shared("headers") or {}
+        credential = cache.get_shared(CREDENTIAL_KEY)
+        return json.dumps({"config": config_data, "headers": headers, "credential": credential}).encode("utf-8")
+
+    def _create(self, size: int):
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(create=True, size=max(MIN_CAPACITY, size * 4 + _HEADER.size))
+        _HEADER.pack_into(shm.buf, 0, 0, 0)
+        self._owned.append(shm)
+        return shm
+
+    def _attach(self) -> bool:
+        if self._shm is not None:
+            return True
+        name = os.environ.get(ENV_NAME)
+        if not name:
+            return False
+        try:
+            self._switch(name)
+        except FileNotFoundError:
+            logger.warning(f"<AoMaker> 会话快照{name}不存在，改为从数据库读取")
+            os.environ.pop(ENV_NAME, None)
+            return False
+        return True
+
+    def _detach(self):
+        """放弃快照，本进程之后改为从数据库读取"""
+        self._shm = None
+        self._current = None
+        os.environ.pop(ENV_NAME, None)
+
+    def _switch(self, name: str):
+        from multiprocessing import shared_memory
+        self._shm = shared_memory.SharedMemory(name=name)
+        self._current = None
+
+    def _write(self, data: bytes):
+        if _HEADER.size + len(data) > self._shm.size:
+            # 超出容量：迁移到新的共享内存，原共享内存只保留新共享内存的名称
+            old = self._shm
+            self._shm = self._create(len(data))
+            self._write_to(self._shm, data)
+            self._write_to(old, json.dumps({_MOVED: self._shm.name}).encode("utf-8"))
+            os.environ[ENV_NAME] = self._shm.name
+        else:
+            self._write_to(self._shm, data)
+
+    @staticmethod
+    def _write_to(shm, data: bytes):
+        version = _HEADER.unpack_from(shm.buf, 0)[0]
+        # 版本号为奇数表示写入中；上一个写入方中途退出时版本号停在奇数，先补为偶数
+        version += version & 1
+        struct.pack_into("Q", shm.buf, 0, version + 1)
+        shm.buf[_HEADER.size:_HEADER.size + len(data)] = data
+        _HEADER.pack_into(shm.buf, 0, version + 2, len(data))
+
+
+session_snapshot = SessionSnapshot()
+
+if hasattr(os, "register_at_fork"):
+    # fork时其它线程（如token后台刷新线程）可能正持有锁，子进程中重新创建
+    os.register_at_fork(after_in_child=lambda: setattr(session_snapshot, "_lock", threading.Lock()))
+
+
+def _on_session_change():
+    if session_snapshot.published:
+        try:
+            session_snapshot.refresh()
+        except Exception as e:
+            logger.warning(f"<AoMaker> 会话快照刷新失败：{e}")
+
+
+add_session_listener(_on_session_change)
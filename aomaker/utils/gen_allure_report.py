@@ -3,7 +3,9 @@ import configparser
 import json
 import os
 import time
-from typing import List, Dict
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Iterable, Optional, Tuple
 
 from aomaker.path import REPORT_DIR, PYTEST_INI_DIR
 from aomaker.utils.utils import HandleIni
@@ -12,6 +14,145 @@ ALLURE_HTML_PATH = os.path.join(REPORT_DIR, "html")
 ALLURE_JSON_PATH = os.path.join(REPORT_DIR, "json")
 WIDGETS_PATH = os.path.join(ALLURE_HTML_PATH, "widgets")
 SUMMARY_JSON_PATH = os.path.join(WIDGETS_PATH, "summary.json")
+# result.json数量达到该值时多进程解析
+PARALLEL_PARSE_MIN_FILES = 2000
+# 单个进程一次解析的文件数
+PARSE_CHUNK_SIZE = 200
+
+
+def _parse_result_file(path: str) -> Optional[dict]:
+    """解析单个result.json，只保留报告需要的字段，减少多进程间传输的数据量"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            load_dict = json.load(f)
+    except (OSError, ValueError):
+        return None
+    status_details = load_dict.get("statusDetails")
+    return {
+        "name": load_dict.get("name"),
+        "fullName": load_dict.get("fullName"),
+        "historyId": load_dict.get("historyId"),
+        "uuid": load_dict.get("uuid"),
+        "status": load_dict.get("status"),
+        "trace": status_details.get("trace") if isinstance(status_details, dict) else None,
+        "description": load_dict.get("description"),
+        "start": load_dict.get("start"),
+        "stop": load_dict.get("stop"),
+        "testCaseId": load_dict.get("testCaseId"),
+        "parameters": load_dict.get("parameters") or [],
+        "tags": [label.get("value") for label in _handle_labels(load_dict.get("labels") or [])],
+        "has_labels": "labels" in load_dict,
+    }
+
+
+class ResultIndex:
+    """
+    allure result.json索引：一次遍历解析所有结果文件（文件多时多进程解析），
+    重试产生的多条结果按(fullName, parameters)去重，保留最后一次执行（没有fullName时按historyId，再按uuid区分）；
+    报告生成、消息通知、耗时记录共用同一份索引
+    """
+
+    def __init__(self, records: List[dict], signature=None):
+        self.signature = signature
+        # key: (fullName, parameters)，value: 最后一次执行的结果
+        self.latest: Dict[tuple, dict] = {}
+        for record in records:
+            if record is None:
+                continue
+            key = self.record_key(record)
+            exists = self.latest.get(key)
+            if exists is None or (record["start"] or 0) > (exists["start"] or 0):
+                self.latest[key] = record
+
+    @staticmethod
+    def record_key(record: dict) -> tuple:
+        name = record["fullName"]
+        if name is None:
+            # 没有fullName的结果不能合并为一条，historyId同一用例的重试相同，uuid每条结果唯一
+            if record.get("historyId"):
+                name = ("historyId", record["historyId"])
+            elif record.get("uuid"):
+                name = ("uuid", record["uuid"])
+            else:
+                name = ("record", id(record))
+        return name, tuple(sorted((p.get("name"), p.get("value")) for p in record["parameters"]))
+
+    @property
+    def results(self) -> List[dict]:
+        return list(self.latest.values())
+
+    def summary(self) -> dict:
+        """按allure summary.json的格式统计用例结果，用于不经过allure generate直接生成报告"""
+        statistic = {"failed": 0, "broken": 0, "skipped": 0, "passed": 0, "unknown": 0, "total": 0}
+        starts, stops = [], []
+        for record in self.latest.values():
+            status = record["status"] if record["status"] in statistic else "unknown"
+            statistic[status] += 1
+            statistic["total"] += 1
+            if record["start"] is not None:
+                starts.append(record["start"])
+            if record["stop"] is not None:
+                stops.append(record["stop"])
+        start, stop = (min(starts) if starts else None), (max(stops) if stops else None)
+        duration = stop - start if start is not None and stop is not None else None
+        return {"statistic": statistic, "time": {"start": start, "stop": stop, "duration": duration}}
+
+    @classmethod
+    def from_case_results(cls, rows: List[dict]) -> "ResultIndex":
+        """由result表（LiveReportPlugin实时写入）的数据构建索引，字段与result.json解析结果一致"""
+        records = [{
+            "name": row["name"],
+            "fullName": row["full_name"],
+            "status": row["status"],
+            "trace": row["trace"],
+            "description": row["description"],
+            "start": row["start"],
+            "stop": row["stop"],
+            "testCaseId": row["case_id"],
+            "parameters": row["parameters"],
+            "tags": row["tags"],
+            "has_labels": True,
+        } for row in rows]
+        return cls(records)
+
+    @classmethod
+    def load(cls, json_path: str = ALLURE_JSON_PATH, max_workers: int = None) -> "ResultIndex":
+        paths, signature = _scan_result_files(json_path)
+        if len(paths) < PARALLEL_PARSE_MIN_FILES or (os.cpu_count() or 1) < 2:
+            records = [_parse_result_file(path) for path in paths]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                records = list(executor.map(_parse_result_file, paths, chunksize=PARSE_CHUNK_SIZE))
+        return cls(records, signature)
+
+
+def _scan_result_files(json_path: str) -> Tuple[List[str], tuple]:
+    """
+    :return: result.json路径列表, 目录签名（文件数、最大修改时间），签名不变时可复用已有索引
+    """
+    paths = []
+    latest_mtime = 0
+    for root, directory, files in os.walk(json_path):
+        for filename in files:
+            if filename.endswith("result.json"):
+                path = os.path.join(root, filename)
+                paths.append(path)
+                latest_mtime = max(latest_mtime, os.stat(path).st_mtime_ns)
+    return paths, (json_path, len(paths), latest_mtime)
+
+
+_index: Optional[ResultIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_result_index(json_path: str = ALLURE_JSON_PATH) -> ResultIndex:
+    """获取result.json索引，结果文件未变化时复用上次解析的结果"""
+    global _index
+    with _index_lock:
+        _, signature = _scan_result_files(json_path)
+        if _index is None or _index.signature != signature:
+            _index = ResultIndex.load(json_path)
+        return _index
 
 
 def gen_allure_summary() -> dict:
@@ -21,63 +162,54 @@ def gen_allure_summary() -> dict:
     return allure_summary
 
 
-def get_allure_results(sep: str) -> dict:
-    """解析allure json"""
-    # 1.find all result.json file
+def get_allure_results(sep: str, index: ResultIndex = None) -> dict:
+    """解析allure json，按标记统计各产品的用例结果"""
+    index = index or get_result_index()
     results = {}
-    result_jsons = parse_allure_res_json()
-    n = 0
-    all_results_json = []
-    status_list = []
     marks_group = _get_marks_group_from_pytest_ini()
-    for result_json in result_jsons:
-        with open(result_json, encoding="utf-8") as load_f:
-            load_dict = json.load(load_f)
-            keys = load_dict.keys()
-            # 判断是否有labels
-            if "labels" in keys and "status" in keys:
-                result = {
-                    "name": load_dict["name"],
-                    "full_name": load_dict["fullName"],
-                    "labels": load_dict["labels"],
-                    "case_id": load_dict['testCaseId'],
-                    "parameters": load_dict.get("parameters")
-                }
-                status = load_dict["status"]
-                start_time = load_dict["start"]
-                status_dict = {"name": load_dict["name"], "status": status, "full_name": load_dict["fullName"],
-                               "start_time": start_time}
-                if result in all_results_json:
-                    # 处理重试机制
-                    index = all_results_json.index(result)
-                    elem = status_list[index]
-                    # 处理重试机制时，状态变更的情况，用最后一次状态
-                    if start_time > elem["start_time"]:
-                        elem["status"] = status
-                else:
-                    all_results_json.append(result)
-                    status_list.append(status_dict)
-    for load_dict, status_dict in zip(all_results_json, status_list):
-        status = status_dict["status"]
-        tags = [label.get("value") for label in _handle_labels(load_dict['labels'])]
-        product_name = _handle_tags(tags, marks_group, sep=sep)
+    for record in index.results:
+        if not record["has_labels"] or record["status"] is None:
+            continue
+        product_name = _handle_tags(record["tags"], marks_group, sep=sep)
         if product_name is not None:
             if results.get(product_name) is None:
                 results[product_name] = {"passed": 0, "failed": 0, "skipped": 0, "broken": 0}
-            results[product_name][status] += 1
+            results[product_name][record["status"]] += 1
     results = _count_passed_rate(results)
     return results
 
 
 def parse_allure_res_json():
-    res = []
-    for root, directory, files in os.walk(ALLURE_JSON_PATH):
-        for filename in files:
-            name, suf = os.path.splitext(filename)
-            if suf == ".json":
-                res.append(os.path.join(root, filename))
-    result_jsons = [data for data in res if "result.json" in data]
-    return result_jsons
+    return _scan_result_files(ALLURE_JSON_PATH)[0]
+
+
+def duration_key(full_name: str, parameters: Iterable[Tuple[str, str]] = ()) -> str:
+    """
+    用例耗时记录的key：allure fullName + 参数化参数，同一用例的不同参数分别记录
+    :param full_name: allure fullName，如：testcases.test_api.test_demo.TestDemo#test_demo
+    :param parameters: [(参数名,参数值repr),...]
+    """
+    parameters = sorted(parameters)
+    if not parameters:
+        return full_name
+    return full_name + "[" + ",".join(f"{name}={value}" for name, value in parameters) + "]"
+
+
+def get_case_durations(index: ResultIndex = None) -> Dict[str, float]:
+    """
+    从allure result.json中解析本次运行每条用例的耗时
+    重试的用例以最后一次执行为准
+    :return: {用例key:耗时(秒),...}
+    """
+    index = index or get_result_index()
+    durations = {}
+    for record in index.results:
+        start, stop = record["start"], record["stop"]
+        if record["fullName"] is None or start is None or stop is None:
+            continue
+        parameters = [(p["name"], p["value"]) for p in record["parameters"]]
+        durations[duration_key(record["fullName"], parameters)] = round((stop - start) / 1000, 3)
+    return durations
 
 
 def _get_marks_group_from_pytest_ini() -> str:
@@ -120,8 +252,11 @@ def _count_passed_rate(results: dict) -> dict:
 
 
 class CaseSummary:
-    def __init__(self):
-        self.allure_summary = gen_allure_summary()
+    def __init__(self, allure_summary: dict = None):
+        """
+        :param allure_summary: summary.json格式的统计数据，不传时读取allure generate生成的summary.json
+        """
+        self.allure_summary = allure_summary or gen_allure_summary()
         self.results = self.allure_summary["statistic"]
 
     @property
@@ -216,36 +351,32 @@ class CaseSummary:
 
 
 class CaseDetail:
-    def __init__(self):
-        self.result_jsons = parse_allure_res_json()
+    def __init__(self, index: ResultIndex = None):
+        self.index = index or get_result_index()
 
     def case_detail_info(self) -> List[Dict]:
         """解析所有allure-result.json"""
         results = []
-        for result_json in self.result_jsons:
+        for record in self.index.results:
             case_info = {}
-            with open(result_json, encoding="utf-8") as load_f:
-                load_dict = json.load(load_f)
-                keys = load_dict.keys()
-                if "status" in keys:
-                    # 用例执行结果
-                    case_info["result"] = load_dict['status']
-                if "statusDetails" in keys:
-                    case_info["logs"] = load_dict["statusDetails"]["trace"]
-                if "description" in keys:
-                    # 用例标题描述
-                    case_info["doc"] = load_dict['description']
-                if "start" and "stop" in keys:
-                    duration = load_dict['stop'] - load_dict['start']
-                    case_info["duration"] = round(duration / 1000, 2)
-                    case_info["f_duration"] = "%.2fs" % case_info["duration"]
-                    case_info["time"] = timestamp_to_standard(load_dict['start'])
-                if "fullName" in keys:
-                    full_name = load_dict["fullName"]
-                    case_info["test_class"], case_info["test_method"] = full_name.split("#")
-                if "testCaseId" in keys:
-                    case_info["case_id"] = load_dict["testCaseId"]
-                results.append(case_info)
+            if record["status"] is not None:
+                # 用例执行结果
+                case_info["result"] = record["status"]
+            if record["trace"] is not None:
+                case_info["logs"] = record["trace"]
+            if record["description"] is not None:
+                # 用例标题描述
+                case_info["doc"] = record["description"]
+            if record["start"] is not None and record["stop"] is not None:
+                duration = record["stop"] - record["start"]
+                case_info["duration"] = round(duration / 1000, 2)
+                case_info["f_duration"] = "%.2fs" % case_info["duration"]
+                case_info["time"] = timestamp_to_standard(record["start"])
+            if record["fullName"] is not None:
+                case_info["test_class"], case_info["test_method"] = record["fullName"].split("#")
+            if record["testCaseId"] is not None:
+                case_info["case_id"] = record["testCaseId"]
+            results.append(case_info)
         return results
 
 
@@ -0,0 +1,126 @@
+# --coding:utf-8--
+"""
+import耗时基准
+每个入口模块在独立的python进程中导入（多次取中位数），统计导入耗时和耗时最多的依赖，
+并检查导入后是否加载了不应在启动时加载的重型依赖、是否已建立数据库连接，防止延迟导入被改回。
+
+用法：
+    python -m aomaker.utils.import_bench
+    python -m aomaker.utils.import_bench --repeat 5 --top 10 --budget aomaker.cli=150
+存在违规（加载了禁止的模块、建立了数据库连接、超出耗时预算）时退出码为1
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+import aomaker
+
+# key: 入口模块，value: 导入该模块后不应被加载的模块（含其子模块）
+ENTRY_MODULES: Dict[str, Tuple[str, ...]] = {
+    "aomaker": ("emoji", "loguru", "click"),
+    "aomaker.log": ("loguru",),
+    "aomaker.cache": ("loguru",),
+    "aomaker.cli": ("mitmproxy", "pydantic", "jinja2", "jsonschema", "genson", "allure", "allure_commons",
+                    "pytest", "requests", "loguru", "emoji", "ruamel", "aomaker.runner", "aomaker.cache"),
+}
+
+_MARKER = "-- aomaker import bench --"
+_PROBE = """
+import sys, json, time
+sys.stderr.write({marker!r} + "\\n")
+sys.stderr.flush()
+start = time.perf_counter()
+__import__({module!r})
+elapsed = (time.perf_counter() - start) * 1000
+sqlite = sys.modules.get("aomaker.database.sqlite")
+connections = sum(len(m._connections) for m in sqlite._managers.values()) if sqlite else 0
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules), "connections": connections}}))
+"""
+
+
+def _parse_importtime(stderr: str, top: int) -> List[Tuple[int, str]]:
+    """解析-X importtime的输出，返回累计耗时（微秒）最多的依赖"""
+    entries = []
+    # 只统计入口模块导入期间的记录，解释器启动时（site等）的导入不计入
+    stderr = stderr.split(_MARKER, 1)[-1]
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            entries.append((int(cumulative), name.rstrip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def measure(module: str, repeat: int = 3) -> dict:
+    """
+    在独立进程中导入模块
+    :return: {"elapsed": 耗时中位数(ms), "modules": 导入后已加载的模块, "connections": 数据库连接数, "top": 耗时最多的依赖}
+    """
+    env = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(aomaker.__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_root, env.get("PYTHONPATH")]))
+    results, stderr = [], ""
+    for _ in range(max(repeat, 1)):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module, marker=_MARKER)],
+                              capture_output=True, text=True, env=env)
+        if proc.returncode != 0:
+            raise RuntimeError(f"导入{module}失败：\n{proc.stderr}")
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+        stderr = proc.stderr
+    return {
+        "elapsed": statistics.median(r["elapsed"] for r in results),
+        "modules": results[-1]["modules"],
+        "connections": results[-1]["connections"],
+        "top": _parse_importtime(stderr, 10),
+    }
+
+
+def check(module: str, result: dict, forbidden: Tuple[str, ...], budget: Optional[float] = None) -> List[str]:
+    """:return: 违规信息列表"""
+    errors = []
+    loaded = set(result["modules"])
+    for name in forbidden:
+        if name in loaded or any(m.startswith(name + ".") for m in loaded):
+            errors.append(f"{module}：导入时加载了{name}")
+    if result["connections"]:
+        errors.append(f"{module}：导入时建立了{result['connections']}个数据库连接")
+    if budget is not None and result["elapsed"] > budget:
+        errors.append(f"{module}：导入耗时{result['elapsed']:.1f}ms，超出预算{budget:.1f}ms")
+    return errors
+
+
+def _parse_budgets(items: List[str]) -> Dict[str, float]:
+    budgets = {}
+    for item in items or []:
+        module, _, ms = item.partition("=")
+        budgets[module] = float(ms)
+    return budgets
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m aomaker.utils.import_bench", description="aomaker import耗时基准")
+    parser.add_argument("modules", nargs="*", help="入口模块，默认检查ENTRY_MODULES中的全部模块")
+    parser.add_argument("--repeat", type=int, default=3, help="每个模块的导入次数，取中位数")
+    parser.add_argument("--top", type=int, default=5, help="展示耗时最多的依赖数")
+    parser.add_argument("--budget", action="append", metavar="MODULE=MS", help="模块导入耗时预算（毫秒）")
+    args = parser.parse_args(argv)
+    budgets = _parse_budgets(args.budget)
+    errors = []
+    for module in args.modules or ENTRY_MODULES:
+        result = measure(module, args.repeat)
+        print(f"{module}: {result['elapsed']:.1f}ms，已加载模块数：{len(result['modules'])}")
+        for cumulative, name in result["top"][:args.top]:
+            print(f"    {cumulative / 1000:8.1f}ms  {name.strip()}")
+        errors.extend(check(module, result, ENTRY_MODULES.get(module, ()), budgets.get(module)))
+    for error in errors:
+        print(f"[FAIL] {error}")
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -32,6 +32,9 @@ setuptools.setup(
         'tenacity==8.2.3',
         'ruamel.yaml==0.17.21'
     ],
+    extras_require={
+        'async': ['httpx>=0.24'],
+    },
     packages=setuptools.find_packages(),
     include_package_data=True,
     package_data={
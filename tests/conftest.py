@@ -0,0 +1,98 @@
+# --coding:utf-8--
+"""
+测试公共夹具
+aomaker的路径（数据库、日志、报告目录）在导入时由当前工作目录决定，
+因此在导入aomaker之前切换到临时项目目录，并按脚手架的表结构建好数据库、写入环境配置
+"""
+import os
+import sys
+import json
+import atexit
+import shutil
+import sqlite3
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+PROJECT_DIR = tempfile.mkdtemp(prefix="aomaker-tests-")
+atexit.register(shutil.rmtree, PROJECT_DIR, ignore_errors=True)
+os.chdir(PROJECT_DIR)
+os.makedirs("database")
+_connection = sqlite3.connect(os.path.join("database", "aomaker.db"))
+_connection.executescript("""
+    create table config(key text,value text);
+    create unique index config_key_uindex on config (key);
+    create table cache(var_name text,response text,worker text,api_info text);
+    create table schema(api_name text,schema text);
+    create unique index schema_api_name_uindex on schema (api_name);
+""")
+_connection.close()
+# aomaker.fixture在导入时读取conf/config.yaml
+os.makedirs("conf")
+with open(os.path.join("conf", "config.yaml"), "w", encoding="utf-8") as _f:
+    _f.write("env: test\ntest:\n  host: http://127.0.0.1\n")
+
+from aomaker.cache import cache, config, schema  # noqa: E402
+from aomaker.log import get_aomaker_logger  # noqa: E402
+
+# loguru的控制台输出绑定首次使用时的sys.stdout，在此创建，避免绑定到pytester内层会话中随后被关闭的捕获流
+get_aomaker_logger()
+
+pytest_plugins = ["pytester"]
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    """每条用例以单进程模式、空的config/cache/schema表开始"""
+    config.clear()
+    cache.clear()
+    schema.clear()
+    config.set("run_mode", "main")
+    yield
+    cache.clear()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        data = json.dumps({
+            "path": self.path,
+            "method": self.command,
+            "headers": dict(self.headers),
+            "body": body.decode("utf-8"),
+            # 同一连接上的请求由同一个handler实例处理
+            "connection": id(self),
+        }).encode("utf-8")
+        status = int(self.headers.get("X-Status") or 200)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if self.headers.get("X-Set-Cookie"):
+            self.send_header("Set-Cookie", self.headers["X-Set-Cookie"])
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="session")
+def http_server():
+    """本地HTTP/1.1服务（支持keep-alive），响应中回显请求信息和处理该请求的连接"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
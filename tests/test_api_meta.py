@@ -0,0 +1,98 @@
+# --coding:utf-8--
+import asyncio
+
+from aomaker.cache import config
+from aomaker.base.base_api import BaseApi
+from aomaker.base.api_meta import current_api_meta, bind_api_meta, api_meta_scope
+from aomaker.metrics import metrics
+
+
+class JobApi(BaseApi):
+
+    def list_jobs(self):
+        """查询任务列表
+        返回所有任务
+        """
+        return current_api_meta()
+
+    def send_list_jobs(self):
+        """发送查询任务列表请求"""
+        return self.send_http({"api_path": "/jobs", "method": "get"})
+
+    async def alist_jobs(self):
+        """异步查询任务列表"""
+        await asyncio.sleep(0)
+        return current_api_meta()
+
+    def _private(self):
+        return current_api_meta()
+
+
+class SubJobApi(JobApi):
+
+    def list_jobs(self):
+        """子类查询任务列表"""
+        return super().list_jobs()
+
+
+def test_meta_recorded_during_call():
+    meta = JobApi().list_jobs()
+    assert meta.class_name == "JobApi"
+    assert meta.method == "list_jobs"
+    assert meta.doc == "查询任务列表"
+    assert meta.module == __name__
+    assert meta.api_name == "JobApi.list_jobs"
+    assert meta.caller_name == "JobApi.list_jobs 查询任务列表"
+    assert current_api_meta() is None
+
+
+def test_meta_resolved_once_per_class_and_method():
+    assert JobApi().list_jobs() is JobApi().list_jobs()
+
+
+def test_coroutine_method_meta():
+    meta = asyncio.run(JobApi().alist_jobs())
+    assert meta.api_name == "JobApi.alist_jobs"
+    assert meta.doc == "异步查询任务列表"
+
+
+def test_private_methods_not_wrapped():
+    assert JobApi()._private() is None
+
+
+def test_outermost_method_of_subclass_wins():
+    meta = SubJobApi().list_jobs()
+    # 外层方法先记录，内层super()调用恢复后仍按实际调用的类解析
+    assert meta.class_name == "SubJobApi"
+    assert meta.doc == "子类查询任务列表"
+
+
+def test_bind_is_idempotent():
+    func = JobApi.__dict__["list_jobs"]
+    assert bind_api_meta(func) is func
+
+
+def test_direct_send_http_uses_class_name():
+    api = JobApi()
+    with api_meta_scope(api):
+        assert current_api_meta().api_name == "JobApi.send_http"
+    assert current_api_meta() is None
+
+
+def test_api_meta_scope_keeps_outer_meta():
+    def inner(self):
+        with api_meta_scope(self):
+            return current_api_meta()
+
+    JobApi.probe = bind_api_meta(inner)
+    try:
+        assert JobApi().probe().api_name == "JobApi.inner"
+    finally:
+        del JobApi.probe
+
+
+def test_request_metrics_use_api_name(http_server):
+    config.set("host", http_server)
+    metrics.clear()
+    JobApi().send_list_jobs()
+    assert ("JobApi.send_list_jobs", "200") in dict(metrics.items())
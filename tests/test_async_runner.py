@@ -0,0 +1,192 @@
+# --coding:utf-8--
+import json
+
+import pytest
+
+from aomaker import async_runner
+from aomaker.async_runner import AsyncRunnerPlugin
+
+# 夹具和用例把事件追加到events.log，按行检查执行顺序
+RECORDER = """
+def record(event):
+    with open("events.log", "a") as f:
+        f.write(event + "\\n")
+"""
+
+CONFTEST = """
+import pytest
+from recorder import record
+
+
+@pytest.fixture(scope="module")
+def module_fx():
+    record("setup module")
+    yield
+    record("teardown module")
+
+
+@pytest.fixture(scope="class")
+def class_fx():
+    record("setup class")
+    yield
+    record("teardown class")
+
+
+@pytest.fixture
+def fx(request):
+    record(f"setup {request.node.name}")
+    yield request.node.name
+    record(f"teardown {request.node.name}")
+"""
+
+BATCH_MODULE = """
+import asyncio
+import pytest
+from recorder import record
+
+
+@pytest.mark.usefixtures("module_fx", "class_fx")
+class TestBatch:
+    async def test_a(self, fx):
+        record("start test_a")
+        await asyncio.sleep(0.1)
+        record("end test_a")
+        # function级夹具每条用例一个实例
+        assert fx == "test_a"
+
+    async def test_b(self, fx):
+        record("start test_b")
+        await asyncio.sleep(0.1)
+        record("end test_b")
+        assert False, "boom"
+
+    async def test_c(self, fx):
+        record("start test_c")
+        await asyncio.sleep(0.1)
+        record("end test_c")
+        assert fx == "test_c"
+
+    def test_sync(self, fx):
+        record("run test_sync")
+
+    async def test_d(self, fx):
+        record("run test_d")
+"""
+
+
+class _SplitRunner:
+    """把用例分成两次run_items执行，模拟常驻worker按批次领取用例"""
+
+    def __init__(self, async_plugin: AsyncRunnerPlugin, split: int):
+        self.async_plugin = async_plugin
+        self.split = split
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtestloop(self, session):
+        items = session.items
+        self.async_plugin.run_items(session, items[:self.split], items[self.split])
+        self.async_plugin.run_items(session, items[self.split:])
+        return True
+
+
+@pytest.fixture
+def project(pytester):
+    pytester.syspathinsert()
+    pytester.makepyfile(recorder=RECORDER)
+    pytester.makeconftest(CONFTEST)
+    pytester.makepyfile(test_async_cases=BATCH_MODULE)
+    return pytester
+
+
+def _events(pytester):
+    return pytester.path.joinpath("events.log").read_text().splitlines()
+
+
+def test_batch_setup_and_teardown_order(project):
+    result = project.runpytest("--async-concurrency=3", "-p", "no:cacheprovider", plugins=[AsyncRunnerPlugin()])
+    result.assert_outcomes(passed=4, failed=1)
+    assert _events(project) == [
+        "setup module", "setup class",
+        # 批次内依次setup，函数体并发执行，之后依次teardown
+        "setup test_a", "setup test_b", "setup test_c",
+        "start test_a", "start test_b", "start test_c",
+        "end test_a", "end test_b", "end test_c",
+        "teardown test_a", "teardown test_b", "teardown test_c",
+        # 同步用例打断批次，按原有方式执行
+        "setup test_sync", "run test_sync", "teardown test_sync",
+        "setup test_d", "run test_d", "teardown test_d",
+        "teardown class", "teardown module",
+    ]
+
+
+def test_setup_failure_mid_batch(project):
+    project.makepyfile(test_async_cases="""
+        import pytest
+        from recorder import record
+
+
+        @pytest.fixture
+        def broken():
+            raise RuntimeError("setup failed")
+
+
+        @pytest.mark.usefixtures("class_fx")
+        class TestBatch:
+            async def test_a(self, fx):
+                record("run test_a")
+
+            async def test_b(self, fx, broken):
+                record("run test_b")
+
+            async def test_c(self, fx):
+                record("run test_c")
+    """)
+    result = project.runpytest("--async-concurrency=3", "-p", "no:cacheprovider", plugins=[AsyncRunnerPlugin()])
+    result.assert_outcomes(passed=2, errors=1)
+    assert _events(project) == [
+        "setup class",
+        "setup test_a", "setup test_b", "setup test_c",
+        "run test_a", "run test_c",
+        "teardown test_a", "teardown test_b", "teardown test_c",
+        "teardown class",
+    ]
+
+
+def test_nextitem_across_batches_keeps_shared_fixtures(project):
+    async_plugin = AsyncRunnerPlugin()
+    result = project.runpytest("--async-concurrency=3", "-p", "no:cacheprovider",
+                               plugins=[async_plugin, _SplitRunner(async_plugin, 2)])
+    result.assert_outcomes(passed=4, failed=1)
+    events = _events(project)
+    assert events.count("setup module") == events.count("setup class") == 1
+    assert events[-2:] == ["teardown class", "teardown module"]
+    # 第一次run_items只包含test_a、test_b，test_c在第二次执行
+    assert events.index("teardown test_b") < events.index("setup test_c")
+
+
+def test_function_fixtures_get_own_allure_container(project):
+    result = project.runpytest("--async-concurrency=3", "-p", "no:cacheprovider", "--alluredir=allure",
+                               plugins=[AsyncRunnerPlugin()])
+    result.assert_outcomes(passed=4, failed=1)
+    containers = [json.loads(path.read_text()) for path in project.path.joinpath("allure").glob("*-container.json")]
+    fx_containers = [c for c in containers if any(b["name"] == "fx" for b in c.get("befores", []))]
+    assert len(fx_containers) == 5
+    # 每条用例的fx各有一个容器，teardown记录在各自的容器中
+    assert all(len(c["children"]) == 1 and c["afters"] for c in fx_containers)
+    assert len({c["children"][0] for c in fx_containers}) == 5
+
+
+def test_concurrency_disabled_by_default(project):
+    project.makepyfile(test_async_cases="""
+        def test_sync():
+            pass
+    """)
+    result = project.runpytest("-p", "no:cacheprovider", plugins=[AsyncRunnerPlugin()])
+    result.assert_outcomes(passed=1)
+
+
+def test_unsupported_pytest_version_is_rejected(project, monkeypatch):
+    monkeypatch.setattr(async_runner, "SUPPORTED_PYTEST", ((7, 0), (7, 1)))
+    result = project.runpytest("--async-concurrency=3", "-p", "no:cacheprovider", plugins=[AsyncRunnerPlugin()])
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(["*--async-concurrency*"])
@@ -0,0 +1,64 @@
+# --coding:utf-8--
+import sqlite3
+
+import pytest
+
+from aomaker.cache import cache, config, schema
+from aomaker.database.sqlite import DB_PATH
+
+
+def _committed_config():
+    """其它连接看到的config表（已提交的数据）"""
+    connection = sqlite3.connect(DB_PATH)
+    try:
+        return dict(connection.execute("select key,value from config").fetchall())
+    finally:
+        connection.close()
+
+
+def test_config_set_many_and_get_many():
+    config.set_many({"a": 1, "b": {"x": [1, 2]}})
+    config.set_many({"a": 2})
+    assert config.get_many(["a", "b", "missing"]) == {"a": 2, "b": {"x": [1, 2]}, "missing": None}
+
+
+def test_get_many_merges_misses_into_one_query():
+    config.set_many({"a": 1, "b": 2, "c": 3})
+    config.tier.clear()
+    round_trips = config.tier.round_trips
+    assert config.get_many(["a", "b", "c"]) == {"a": 1, "b": 2, "c": 3}
+    assert config.tier.round_trips == round_trips + 1
+
+
+def test_batch_commits_once_at_outermost_exit():
+    with config.batch():
+        config.set("a", 1)
+        with config.batch():
+            config.set("b", 2)
+        assert "b" not in _committed_config()
+    assert {"a", "b"} <= set(_committed_config())
+
+
+def test_batch_rolls_back_everything_on_error():
+    config.set("a", 1)
+    with pytest.raises(RuntimeError):
+        with config.batch():
+            config.set("a", 2)
+            with schema.batch():
+                schema.set("api", {"type": "object"})
+            raise RuntimeError
+    assert config.get("a") == 1
+    assert schema.get("api") is None
+    assert _committed_config()["a"] == "1"
+
+
+def test_cache_set_many_keeps_existing_values():
+    assert cache.set_many({"a": 1, "b": None}) == 2
+    assert cache.set_many({"a": 10, "b": 20}) == 1
+    assert cache.get_many(["a", "b"]) == {"a": 1, "b": 20}
+
+
+def test_schema_set_many_keeps_existing_schema():
+    schema.set_many({"api": {"type": "object"}})
+    schema.set_many({"api": {"type": "array"}, "other": {"type": "string"}})
+    assert schema.get_many(["api", "other"]) == {"api": {"type": "object"}, "other": {"type": "string"}}
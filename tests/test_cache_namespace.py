@@ -0,0 +1,142 @@
+# --coding:utf-8--
+import sqlite3
+import threading
+
+import pytest
+
+from aomaker.cache import cache, config, get_namespace, SHARED_NAMESPACE
+from aomaker.database.sqlite import DB_PATH
+
+
+def _in_thread(func, name):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", func()), name=name)
+    thread.start()
+    thread.join()
+    return result["value"]
+
+
+def _table_rows():
+    connection = sqlite3.connect(DB_PATH)
+    try:
+        return connection.execute("select var_name,worker from cache").fetchall()
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def threads_mode():
+    config.set("run_mode", "mt")
+
+
+def test_set_and_get_stay_in_memory():
+    cache.set("job", {"id": 1}, api_info={"name": "create_job"})
+    assert cache.get("job") == {"id": 1}
+    assert cache.get("job", select_field="api_info") == {"name": "create_job"}
+    assert _table_rows() == []
+
+
+def test_returned_value_is_a_copy():
+    cache.set("job", {"id": 1})
+    cache.get("job")["id"] = 2
+    assert cache.get("job") == {"id": 1}
+
+
+def test_existing_key_is_ignored_unless_null():
+    cache.set("job", 1)
+    cache.set("job", 2)
+    assert cache.get("job") == 1
+    cache.set("empty", None)
+    cache.set("empty", 3)
+    assert cache.get("empty") == 3
+
+
+def test_update_keeps_api_info():
+    cache.set("job", 1, api_info={"name": "a"})
+    cache.update("job", 2)
+    assert cache.get("job") == 2
+    assert cache.get("job", select_field="api_info") == {"name": "a"}
+
+
+def test_workers_do_not_see_each_other(threads_mode):
+    _in_thread(lambda: cache.set("job", "a"), "worker-a")
+    assert _in_thread(lambda: cache.get("job"), "worker-a") == "a"
+    assert _in_thread(lambda: cache.get("job"), "worker-b") is None
+
+
+def test_headers_are_shared(threads_mode):
+    _in_thread(lambda: cache.set("headers", {"token": "t"}), "worker-a")
+    assert _in_thread(lambda: cache.get("headers"), "worker-b") == {"token": "t"}
+    assert _table_rows() == [("headers", SHARED_NAMESPACE)]
+
+
+def test_promote_makes_worker_data_shared(threads_mode):
+    def promote():
+        cache.set("job", {"id": 1})
+        return cache.promote("job", "missing")
+
+    assert _in_thread(promote, "worker-a") == 1
+    assert _in_thread(lambda: cache.get_shared("job"), "worker-b") == {"id": 1}
+    assert _in_thread(lambda: cache.get("job"), "worker-b") is None
+
+
+def test_set_shared_overwrites():
+    cache.set_shared("token", "a")
+    cache.set_shared("token", "b")
+    assert cache.get_shared("token") == "b"
+
+
+def test_del_by_var_name_and_worker(threads_mode):
+    _in_thread(lambda: cache.set_many({"a": 1, "b": 2}), "worker-a")
+    _in_thread(lambda: cache.set("a", 1), "worker-b")
+    cache.del_({"var_name": "a", "worker": "worker-a"})
+    assert get_namespace("worker-a").keys() == ["b"]
+    assert get_namespace("worker-b").keys() == ["a"]
+    cache.del_({"worker": "worker-b"})
+    assert len(get_namespace("worker-b")) == 0
+
+
+def test_del_by_other_columns_only_removes_matching_rows(threads_mode):
+    _in_thread(lambda: cache.set("a", 1, api_info={"name": "x"}), "worker-a")
+    _in_thread(lambda: cache.set("b", 2, api_info={"name": "y"}), "worker-a")
+    _in_thread(lambda: cache.set("c", 1, api_info={"name": "x"}), "worker-b")
+    cache.set_shared("d", 3, api_info={"name": "x"})
+    cache.del_({"api_info": '{"name": "x"}'})
+    assert get_namespace("worker-a").keys() == ["b"]
+    assert len(get_namespace("worker-b")) == 0
+    assert cache.get_shared("d") is None
+    cache.del_({"response": 2, "worker": "worker-a"})
+    assert len(get_namespace("worker-a")) == 0
+
+
+def test_del_by_null_matches_nothing(threads_mode):
+    _in_thread(lambda: cache.set("a", None), "worker-a")
+    cache.del_({"api_info": None})
+    assert get_namespace("worker-a").keys() == ["a"]
+
+
+@pytest.mark.parametrize("field", ["size", "created_at"])
+def test_del_by_unsupported_column_raises(field):
+    cache.set("job", 1)
+    cache.set_shared("token", "t")
+    with pytest.raises(ValueError, match="缓存不支持按字段删除"):
+        cache.del_({field: 1})
+    assert cache.get("job") == 1
+    assert cache.get_shared("token") == "t"
+
+
+def test_clear_empties_namespaces_and_table():
+    cache.set("job", 1)
+    cache.set_shared("token", "t")
+    cache.clear()
+    assert cache.get("job") is None
+    assert cache.get_shared("token") is None
+
+
+@pytest.mark.parametrize("field", ["worker", "var_name", "size", "response;drop table cache"])
+def test_unsupported_select_field_raises_clear_error(field):
+    cache.set("job", 1)
+    with pytest.raises(ValueError, match="缓存不支持读取字段"):
+        cache.get("job", select_field=field)
+    with pytest.raises(ValueError, match="缓存不支持读取字段"):
+        cache.get_shared("headers", select_field=field)
@@ -0,0 +1,107 @@
+# --coding:utf-8--
+import pytest
+
+from aomaker import _compare
+from aomaker._compare import compare
+from aomaker._aomaker import compare_two_dict
+from aomaker.exceptions import CompareException
+
+
+def test_equal_dicts_have_no_diff():
+    assert compare({"a": 1, "b": {"c": [1, 2]}}, {"a": 1, "b": {"c": [1, 2]}, "extra": 0}) == []
+
+
+def test_missing_key():
+    assert compare({"a": 1}, {}) == [
+        {"path": "$.a", "reason": "缺少key:【a】", "excepted": "a", "real_result": "not found key"}]
+
+
+def test_wrong_value_and_type():
+    diffs = compare({"a": 1, "b": {"c": 1}}, {"a": 2, "b": [1]})
+    assert [d["reason"] for d in diffs] == ["【a】值有误", "【b】值类型有误"]
+
+
+def test_every_mismatch_is_reported():
+    diffs = compare({"a": 1, "b": 2, "c": 3}, {"a": 0, "b": 0, "c": 3})
+    assert [d["path"] for d in diffs] == ["$.a", "$.b"]
+
+
+def test_skip_key_at_every_level():
+    expected = {"id": 1, "items": [{"id": 1, "name": "a"}]}
+    actual = {"id": 2, "items": [{"id": 9, "name": "a"}]}
+    assert compare(expected, actual, skip_key=["id"]) == []
+
+
+@pytest.mark.parametrize("expected, actual", [
+    ([3, 1, 2], [1, 2, 3]),
+    ([1, 1, 2], [2, 1, 1]),
+    ([{"a": 1, "b": 2}, {"a": 3}], [{"a": 3}, {"b": 2, "a": 1}]),
+    ([[1, 2], [3]], [[3], [2, 1]]),
+    ([{"tags": ["x", "y"]}, {"tags": []}], [{"tags": []}, {"tags": ["y", "x"]}]),
+    ([1, "1", None], [None, "1", 1]),
+])
+def test_lists_compare_ignoring_order(expected, actual):
+    assert compare({"k": expected}, {"k": actual}) == []
+
+
+def test_multiset_counts_duplicates():
+    diffs = compare({"k": [1, 1, 2]}, {"k": [1, 2, 2]})
+    assert diffs == [{"path": "$.k[1]", "reason": "【k】值有误", "excepted": "1", "real_result": "2"}]
+
+
+def test_list_length_mismatch_lists_missing_elements():
+    diffs = compare({"k": [1, 2, 3]}, {"k": [3, 1]})
+    assert diffs[0] == {"path": "$.k", "reason": "【k】值数组长度有误", "excepted": "3", "real_result": "2"}
+    assert diffs[1] == {"path": "$.k[1]", "reason": "【k】缺少元素", "excepted": "2", "real_result": "not found"}
+
+
+def test_extra_elements_reported():
+    diffs = compare({"k": [1]}, {"k": [1, 5]})
+    assert diffs[-1] == {"path": "$.k[1]", "reason": "【k】多余元素", "excepted": "", "real_result": "5"}
+
+
+def test_unmatched_dict_paired_with_closest_element():
+    expected = {"jobs": [{"id": 1, "status": "ok", "cost": 1}, {"id": 2, "status": "ok", "cost": 2}]}
+    actual = {"jobs": [{"id": 2, "status": "ok", "cost": 2}, {"id": 1, "status": "failed", "cost": 1}]}
+    assert compare(expected, actual) == [
+        {"path": "$.jobs[0].status", "reason": "【status】值有误", "excepted": "ok", "real_result": "failed"}]
+
+
+def test_list_elements_with_mixed_shapes():
+    expected = {"k": [{"a": 1}, {"b": [1, 2]}, 3, [4]]}
+    actual = {"k": [[4], 3, {"b": [2, 1]}, {"a": 1, "x": 0}]}
+    assert compare(expected, actual) == []
+
+
+def test_actual_element_with_unhashable_value_does_not_match():
+    diffs = compare({"k": [{"a": 1}]}, {"k": [{"a": {"nested": 1}}]})
+    assert diffs == [{"path": "$.k[0].a", "reason": "【a】值有误", "excepted": "1", "real_result": "{'nested': 1}"}]
+
+
+def test_greedy_pairing_beyond_pairwise_limit(monkeypatch):
+    monkeypatch.setattr(_compare, "PAIRWISE_MATCH_LIMIT", 0)
+    diffs = compare({"k": [1, 2]}, {"k": [3, 4]})
+    assert [(d["excepted"], d["real_result"]) for d in diffs] == [("1", "3"), ("2", "4")]
+
+
+def test_large_lists_compare_in_linear_passes():
+    expected = {"k": [{"id": i, "tags": [i, i + 1]} for i in range(5000)]}
+    actual = {"k": [{"id": i, "tags": [i + 1, i]} for i in reversed(range(5000))]}
+    assert compare(expected, actual) == []
+
+
+def test_top_level_non_dict():
+    assert compare([1, 2], [2, 1]) == [{"path": "$", "reason": "值不匹配", "excepted": "[1, 2]",
+                                        "real_result": "[2, 1]"}]
+
+
+def test_compare_two_dict_returns_first_and_all_mismatches():
+    res = compare_two_dict({"a": 1, "b": 2}, {"a": 0, "b": 0})
+    assert res["reason"] == "【a】值有误"
+    assert len(res["mismatches"]) == 2
+    assert compare_two_dict({"a": [1, 2]}, {"a": [2, 1]}) is None
+
+
+def test_compare_two_dict_type_mismatch():
+    with pytest.raises(CompareException):
+        compare_two_dict({"a": 1}, [1])
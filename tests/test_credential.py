@@ -0,0 +1,169 @@
+# --coding:utf-8--
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+
+import pytest
+
+from aomaker.cache import cache, config, CREDENTIAL_KEY
+from aomaker.credential import credential_manager
+from aomaker.snapshot import session_snapshot
+from aomaker.base.async_base_api import AsyncBaseApi, async_client_pool
+
+LOGIN_COST = 0.3
+
+
+class FakeLogin:
+    TOKEN_REFRESH_AHEAD = 60
+
+    def __init__(self, log_path=None):
+        self.log_path = log_path
+        self.calls = 0
+
+    def login(self):
+        self.calls += 1
+        if self.log_path:
+            with open(self.log_path, "a") as f:
+                f.write(f"{os.getpid()}\n")
+        time.sleep(LOGIN_COST)
+        return {"token": f"token-{self.calls}"}
+
+    def make_headers(self, resp_login):
+        return {"token": resp_login["token"]}
+
+    def token_ttl(self, resp_login):
+        return 3600
+
+
+def _expired_state(generation=1) -> dict:
+    now = time.time()
+    return {"generation": generation, "refreshed_at": now - 20, "expires_at": now - 1, "refresh_at": now - 10,
+            "refreshing_until": None}
+
+
+@pytest.fixture
+def expired():
+    """token已过期，未启动后台刷新线程，token状态从数据库读取"""
+    session_snapshot.close()
+    cache.set_shared("headers", {"token": "old"})
+    cache.set_shared(CREDENTIAL_KEY, _expired_state())
+    yield
+    credential_manager.stop()
+    credential_manager.refresh_count = 0
+
+
+def test_concurrent_refresh_logs_in_once(expired):
+    login = FakeLogin()
+    credential_manager.login_obj = login
+    threads = [threading.Thread(target=credential_manager.ensure_fresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert login.calls == 1
+    assert credential_manager.generation == 2
+    assert credential_manager.headers() == {"token": "token-1"}
+    assert credential_manager.state["refreshing_until"] is None
+
+
+def test_refresh_skipped_when_generation_changed(expired):
+    login = FakeLogin()
+    credential_manager.login_obj = login
+    assert credential_manager.refresh(expected_generation=0) is False
+    assert login.calls == 0
+
+
+def _refresh_in_child(start_at):
+    time.sleep(max(start_at - time.time(), 0))
+    credential_manager.refresh(credential_manager.generation, wait=True)
+    os._exit(0 if credential_manager.generation == 2 else 1)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要fork")
+def test_lease_single_login_across_forked_workers(expired, tmp_path):
+    log_path = str(tmp_path / "logins.log")
+    credential_manager.login_obj = FakeLogin(log_path)
+    context = multiprocessing.get_context("fork")
+    start_at = time.time() + 0.5
+    processes = [context.Process(target=_refresh_in_child, args=(start_at,)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    # 只有获得租约的进程登录，其它进程等待新版本发布
+    assert [process.exitcode for process in processes] == [0] * 4
+    with open(log_path) as f:
+        assert len(f.read().splitlines()) == 1
+    assert credential_manager.generation == 2
+
+
+def _run_with_ticker(coro_func):
+    """执行协程的同时统计事件循环上另一个协程的调度次数"""
+
+    async def main():
+        ticks = 0
+        done = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not done.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        try:
+            result = await coro_func()
+        finally:
+            done.set()
+            await task
+        return result, ticks
+
+    return asyncio.run(main())
+
+
+def test_async_refresh_does_not_block_loop(expired):
+    login = FakeLogin()
+    credential_manager.login_obj = login
+
+    async def refresh_all():
+        await asyncio.gather(*(credential_manager.aensure_fresh() for _ in range(5)))
+
+    _, ticks = _run_with_ticker(refresh_all)
+    assert login.calls == 1
+    assert credential_manager.generation == 2
+    # 登录耗时0.3s，期间事件循环仍在调度其它协程
+    assert ticks >= 10
+
+
+def test_async_wait_for_other_process_does_not_block_loop(expired):
+    # 本进程没有登录对象，等待其它进程发布新版本
+    credential_manager.login_obj = None
+    publisher = threading.Timer(LOGIN_COST, cache.set_shared, args=(CREDENTIAL_KEY, _expired_state(2)))
+    publisher.start()
+    _, ticks = _run_with_ticker(credential_manager.aensure_fresh)
+    publisher.join()
+    assert credential_manager.generation == 2
+    assert ticks >= 10
+
+
+class TokenApi(AsyncBaseApi):
+
+    async def echo(self):
+        return await self.send_http({"api_path": "/echo", "method": "get"})
+
+
+def test_async_base_api_uses_refreshed_headers(expired, http_server):
+    config.set("host", http_server)
+    credential_manager.login_obj = FakeLogin()
+
+    async def send():
+        try:
+            return await TokenApi().echo()
+        finally:
+            await async_client_pool.aclose()
+
+    resp, ticks = _run_with_ticker(send)
+    assert resp["headers"]["token"] == "token-1"
+    assert ticks >= 10
@@ -0,0 +1,49 @@
+# --coding:utf-8--
+import pytest
+
+from aomaker.utils import import_bench
+from aomaker.utils.import_bench import ENTRY_MODULES, measure, check
+
+
+@pytest.mark.parametrize("module", list(ENTRY_MODULES))
+def test_entry_module_imports_stay_lazy(module):
+    result = measure(module, repeat=1)
+    assert check(module, result, ENTRY_MODULES[module]) == []
+
+
+def test_cli_does_not_import_requests_or_cache():
+    loaded = set(measure("aomaker.cli", repeat=1)["modules"])
+    assert "requests" not in loaded
+    assert "aomaker.cache" not in loaded
+    assert "aomaker.runner" not in loaded
+
+
+def test_check_reports_forbidden_submodule_connections_and_budget():
+    result = {"elapsed": 20.0, "modules": ["aomaker", "requests.adapters"], "connections": 1}
+    assert check("aomaker", result, ("requests",), budget=10) == [
+        "aomaker：导入时加载了requests",
+        "aomaker：导入时建立了1个数据库连接",
+        "aomaker：导入耗时20.0ms，超出预算10.0ms",
+    ]
+
+
+def test_check_does_not_match_module_name_prefix():
+    result = {"elapsed": 1.0, "modules": ["requests_toolbelt"], "connections": 0}
+    assert check("aomaker", result, ("requests",)) == []
+
+
+def test_parse_importtime_only_counts_entry_import():
+    stderr = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       100 |        900 | site",
+        import_bench._MARKER,
+        "import time:        50 |        300 | aomaker.log",
+        "import time:        20 |        700 | aomaker.cache",
+    ])
+    assert import_bench._parse_importtime(stderr, 5) == [(700, " aomaker.cache"), (300, " aomaker.log")]
+
+
+def test_main_exit_code(capsys):
+    assert import_bench.main(["aomaker", "--repeat", "1"]) == 0
+    assert import_bench.main(["aomaker", "--repeat", "1", "--budget", "aomaker=0"]) == 1
+    assert "[FAIL] aomaker：导入耗时" in capsys.readouterr().out
@@ -0,0 +1,105 @@
+# --coding:utf-8--
+import pytest
+from jsonpath import jsonpath as reference
+
+from aomaker import _jsonpath
+from aomaker._jsonpath import jsonpath, extract_many, compile_path
+
+DATA = {
+    "ret_code": 0,
+    "total": 3,
+    "job_set": [
+        {"job_id": "j-1", "status": "successful", "cost": 10, "tags": ["a", "b"]},
+        {"job_id": "j-2", "status": "failed", "cost": 25, "tags": []},
+        {"job_id": "j-3", "status": "working", "cost": 5, "owner": {"name": "x"}},
+    ],
+    "meta": {"owner": {"name": "root"}, "count": 3},
+}
+
+EXPRESSIONS = [
+    "$.ret_code",
+    "$.job_set[0].job_id",
+    "$.job_set[*].job_id",
+    "$.job_set[-1:].status",
+    "$.job_set[0:2].cost",
+    "$.job_set[::2].job_id",
+    "$.job_set[0,2].job_id",
+    "$..name",
+    "$..job_id",
+    "$.job_set[?(@.cost > 8)].job_id",
+    "$.job_set[?(@.status == 'failed')].cost",
+    "$.job_set[?(@.owner)].job_id",
+    "$.job_set[(@.length-1)].job_id",
+    "$.meta.*",
+    "$.meta.!",
+    "$.job_set[*].tags[*]",
+    "$.missing",
+    "$.job_set[10].job_id",
+]
+
+
+@pytest.mark.parametrize("expr", EXPRESSIONS)
+def test_same_result_as_jsonpath_package(expr):
+    assert jsonpath(DATA, expr) == reference(DATA, expr)
+
+
+def test_no_match_returns_false():
+    assert jsonpath(DATA, "$.missing") is False
+    assert jsonpath({}, "$.a") is False
+    assert jsonpath(DATA, "") is False
+
+
+def _clear_caches():
+    for func in (compile_path, _jsonpath._build_trie, _jsonpath._step, _jsonpath._compile_eval):
+        func.cache_clear()
+
+
+def test_expression_compiled_once():
+    _clear_caches()
+    for _ in range(3):
+        jsonpath(DATA, "$.job_set[*].job_id")
+    assert compile_path.cache_info().misses == 1
+    assert _jsonpath._build_trie.cache_info().hits == 2
+
+
+def test_filter_code_compiled_once():
+    _clear_caches()
+    for _ in range(3):
+        jsonpath(DATA, "$.job_set[?(@.cost > 8)].job_id")
+    assert _jsonpath._compile_eval.cache_info().misses == 1
+
+
+def test_extract_many_matches_single_extraction():
+    results = extract_many(DATA, EXPRESSIONS)
+    assert results == {expr: reference(DATA, expr) for expr in EXPRESSIONS}
+
+
+def test_extract_many_shares_common_prefix():
+    root = _jsonpath._build_trie(("$.job_set[*].job_id", "$.job_set[*].status"))
+    assert list(root.children) == ["job_set"]
+    assert list(root.children["job_set"].children) == ["*"]
+
+
+def test_extract_many_dedupes_expressions():
+    assert extract_many(DATA, ["$.total", "$.total"]) == {"$.total": [3]}
+
+
+def test_extract_many_empty_data():
+    assert extract_many({}, ["$.a", "$.b"]) == {"$.a": False, "$.b": False}
+
+
+def test_falls_back_to_jsonpath_package_on_error(monkeypatch):
+    calls = []
+
+    def fallback(obj, expr):
+        calls.append(expr)
+        return ["fallback"]
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(_jsonpath, "_jsonpath", fallback)
+    monkeypatch.setattr(_jsonpath._Extractor, "visit", broken)
+    assert jsonpath(DATA, "$.total") == ["fallback"]
+    assert extract_many(DATA, ["$.total"]) == {"$.total": ["fallback"]}
+    assert calls == ["$.total", "$.total"]
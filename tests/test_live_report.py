@@ -0,0 +1,114 @@
+# --coding:utf-8--
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from aomaker import live_report
+from aomaker.cache import case_result
+from aomaker.live_report import LiveReportPlugin, reset_live_report, final_result_index, FLUSH_FAILED_MARK
+from aomaker.utils.gen_allure_report import ALLURE_JSON_PATH
+
+CASES = """
+import pytest
+
+def test_passed():
+    pass
+
+def test_failed():
+    assert 1 == 2
+
+def test_broken():
+    raise ValueError("boom")
+
+@pytest.mark.skip
+def test_skipped():
+    pass
+
+@pytest.fixture
+def bad_teardown():
+    yield
+    raise RuntimeError("teardown")
+
+def test_teardown_error(bad_teardown):
+    pass
+"""
+
+
+@pytest.fixture(autouse=True)
+def clean_results():
+    reset_live_report()
+    shutil.rmtree(ALLURE_JSON_PATH, ignore_errors=True)
+    yield
+    reset_live_report()
+    shutil.rmtree(ALLURE_JSON_PATH, ignore_errors=True)
+
+
+@pytest.fixture
+def run_cases(pytester):
+    pytester.makepyfile(test_cases=CASES)
+
+    def run():
+        return pytester.runpytest_inprocess(f"--alluredir={ALLURE_JSON_PATH}", "-p", "no:cacheprovider",
+                                            plugins=[LiveReportPlugin()])
+
+    return run
+
+
+def _statuses(index) -> dict:
+    return {record["name"]: record["status"] for record in index.results}
+
+
+EXPECTED = {"test_passed": "passed", "test_failed": "failed", "test_broken": "broken",
+            "test_skipped": "skipped", "test_teardown_error": "broken"}
+
+
+def test_results_written_to_result_table(run_cases):
+    run_cases()
+    assert case_result.count() == 5
+    index = final_result_index()
+    assert _statuses(index) == EXPECTED
+    assert not os.path.exists(FLUSH_FAILED_MARK)
+
+
+def test_failed_flush_falls_back_to_allure_results(run_cases, monkeypatch):
+    def broken(rows):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(case_result, "record_many", broken)
+    run_cases()
+    assert os.path.exists(FLUSH_FAILED_MARK)
+    # allure的判定规则与LiveReportPlugin一致
+    assert _statuses(final_result_index()) == EXPECTED
+
+
+def test_partial_flush_failure_still_falls_back(run_cases, monkeypatch):
+    record_many = case_result.record_many
+    calls = []
+
+    def fail_once(rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return record_many(rows)
+
+    monkeypatch.setattr(live_report, "FLUSH_SIZE", 2)
+    monkeypatch.setattr(case_result, "record_many", fail_once)
+    run_cases()
+    assert 0 < case_result.count() < 5
+    assert len(final_result_index().results) == 5
+
+
+def test_empty_result_table_falls_back_to_allure_results(run_cases):
+    run_cases()
+    case_result.clear()
+    assert _statuses(final_result_index()) == EXPECTED
+
+
+def test_reset_clears_failure_mark(run_cases, monkeypatch):
+    monkeypatch.setattr(case_result, "record_many", lambda rows: (_ for _ in ()).throw(sqlite3.Error("x")))
+    run_cases()
+    reset_live_report()
+    assert not os.path.exists(FLUSH_FAILED_MARK)
+    assert case_result.count() == 0
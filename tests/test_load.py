@@ -0,0 +1,103 @@
+# --coding:utf-8--
+import os
+import json
+import shutil
+
+import pytest
+
+from aomaker.path import CONF_DIR
+from aomaker.metrics import METRICS_DIR, metrics
+from aomaker.base import async_base_api
+from aomaker.utils.gen_allure_report import ALLURE_JSON_PATH
+from aomaker.load import LoadRunner, LOAD_REPORT
+
+SCENARIOS = """
+from aomaker.base.base_api import BaseApi
+from aomaker.base.async_base_api import AsyncBaseApi
+
+
+class LoadJob(BaseApi):
+
+    def list_jobs(self):
+        return self.send_http({"api_path": "/jobs", "method": "get"})
+
+
+class AsyncLoadJob(AsyncBaseApi):
+
+    async def list_jobs(self):
+        return await self.send_http({"api_path": "/jobs", "method": "get"})
+"""
+
+
+@pytest.fixture
+def project(http_server, tmp_path, monkeypatch):
+    """压测项目：config.yaml指向本地服务，并保留一次功能测试留下的allure结果和接口耗时数据"""
+    conf_path = os.path.join(CONF_DIR, "config.yaml")
+    with open(conf_path, encoding="utf-8") as f:
+        conf = f.read()
+    with open(conf_path, "w", encoding="utf-8") as f:
+        f.write(f"env: test\ntest:\n  host: {http_server}\n")
+    (tmp_path / "load_scenarios.py").write_text(SCENARIOS)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    os.makedirs(ALLURE_JSON_PATH, exist_ok=True)
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    previous = {os.path.join(ALLURE_JSON_PATH, "previous-result.json"): "{}",
+                os.path.join(METRICS_DIR, "1.json"): json.dumps({"Stale.api|200": {}})}
+    for path, content in previous.items():
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+    yield previous
+    with open(conf_path, "w", encoding="utf-8") as f:
+        f.write(conf)
+    shutil.rmtree(ALLURE_JSON_PATH, ignore_errors=True)
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    metrics.clear()
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    """记录压测期间创建的AsyncClient"""
+    created = []
+    get_client = async_base_api.async_client_pool.get_client
+
+    def recording(*args, **kwargs):
+        client = get_client(*args, **kwargs)
+        if client not in created:
+            created.append(client)
+        return client
+
+    monkeypatch.setattr(async_base_api.async_client_pool, "get_client", recording)
+    return created
+
+
+def _run(scenario, concurrency=2):
+    return LoadRunner().run([scenario], rps=40, concurrency=concurrency, duration=0.3)
+
+
+def test_load_run_keeps_previous_reports(project):
+    report = _run("load_scenarios:LoadJob.list_jobs")
+    assert report["total"]["requests"] > 0
+    assert report["total"]["errors"] == 0
+    for path in project:
+        assert os.path.exists(path)
+    # 接口耗时只统计本次压测的请求
+    assert [row["api"] for row in report["apis"]] == ["LoadJob.list_jobs"]
+    with open(LOAD_REPORT, encoding="utf-8") as f:
+        assert json.load(f)["total"]["requests"] == report["total"]["requests"]
+
+
+def test_async_scenarios_close_clients(project, clients):
+    report = _run("load_scenarios:AsyncLoadJob.list_jobs")
+    assert report["total"]["errors"] == 0
+    assert len(clients) == 1
+    assert clients[0].is_closed
+
+
+def test_threaded_async_scenarios_close_clients(project, clients):
+    runner = LoadRunner()
+    report = runner.run(["load_scenarios:AsyncLoadJob.list_jobs", "load_scenarios:LoadJob.list_jobs"], rps=40,
+                        concurrency=2, duration=0.3)
+    assert report["total"]["errors"] == 0
+    # 每个线程一个事件循环、一个AsyncClient，线程结束前关闭
+    assert len(clients) == 2
+    assert all(client.is_closed for client in clients)
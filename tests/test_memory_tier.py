@@ -0,0 +1,120 @@
+# --coding:utf-8--
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from aomaker.cache import config, schema
+from aomaker.database.sqlite import DB_PATH
+
+
+def _external_write(key, value):
+    """模拟其它进程提交的修改"""
+    connection = sqlite3.connect(DB_PATH)
+    connection.execute("update config set value=? where key=?", (json.dumps(value), key))
+    connection.commit()
+    connection.close()
+
+
+def _in_thread(func):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", func()))
+    thread.start()
+    thread.join()
+    return result["value"]
+
+
+def test_read_hits_tier_after_first_query():
+    config.set("host", "http://a")
+    round_trips = config.tier.round_trips
+    for _ in range(3):
+        assert config.get("host") == "http://a"
+    assert config.tier.round_trips == round_trips
+
+
+def test_external_commit_invalidates_tier():
+    config.set("host", "http://a")
+    assert config.get("host") == "http://a"
+    _external_write("host", "http://b")
+    assert config.get("host") == "http://b"
+
+
+def test_new_thread_does_not_serve_rows_changed_after_another_thread_filled_tier():
+    config.set("host", "http://a")
+    assert _in_thread(lambda: config.get("host")) == "http://a"
+    _external_write("host", "http://b")
+    assert _in_thread(lambda: config.get("host")) == "http://b"
+
+
+def test_returned_containers_do_not_share_state():
+    config.set("env", {"a": 1})
+    config.get("env")["a"] = 2
+    assert config.get("env") == {"a": 1}
+
+
+def test_rollback_clears_tier():
+    config.set("host", "http://a")
+    try:
+        with config.batch():
+            config.set("host", "http://b")
+            assert config.get("host") == "http://b"
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert config.get("host") == "http://a"
+
+
+def test_get_all_is_served_from_tier_once_loaded():
+    config.set_many({"a": 1, "b": 2})
+    config.tier.clear()
+    assert config.get_all() == {"run_mode": "main", "a": 1, "b": 2}
+    round_trips = config.tier.round_trips
+    assert config.get_all() == {"run_mode": "main", "a": 1, "b": 2}
+    assert config.tier.round_trips == round_trips
+
+
+def test_stats_count_version_checks_separately():
+    checks = schema.tier.version_checks
+    round_trips = schema.tier.round_trips
+    schema.get("missing")
+    schema.get("missing")
+    stats = schema.tier.stats
+    assert stats["version_checks"] == checks + 2
+    assert stats["round_trips"] == round_trips + 1
+
+
+def test_stale_fill_does_not_overwrite_concurrent_write(monkeypatch):
+    config.set("host", "http://a")
+    writer = ThreadPoolExecutor(max_workers=1)
+    writer.submit(config.get, "host").result()
+    config.tier.clear()
+    query_sql = type(config).query_sql
+
+    def query_then_write(self, *args, **kwargs):
+        res = query_sql(self, *args, **kwargs)
+        # 查询返回旧行之后、回填之前，另一个线程写入新值
+        monkeypatch.setattr(type(config), "query_sql", query_sql)
+        writer.submit(config.set, "host", "http://b").result()
+        return res
+
+    monkeypatch.setattr(type(config), "query_sql", query_then_write)
+    try:
+        assert config.get("host") == "http://a"
+        # 写入方线程的连接看不到data_version变化，缓存中必须是它写入的新值
+        assert writer.submit(config.get, "host").result() == "http://b"
+    finally:
+        writer.shutdown()
+    assert config.get("host") == "http://b"
+
+
+def test_batch_writes_reach_tier_on_commit():
+    config.set("host", "http://a")
+    with config.batch():
+        config.set("host", "http://b")
+        # 未提交的写入对其它线程不可见，也不能进入共享的缓存层
+        assert _in_thread(lambda: config.get("host")) == "http://a"
+        assert config.get("host") == "http://b"
+    round_trips = config.tier.round_trips
+    assert config.get("host") == "http://b"
+    assert config.tier.round_trips == round_trips
+    assert _in_thread(lambda: config.get("host")) == "http://b"
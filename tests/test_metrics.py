@@ -0,0 +1,110 @@
+# --coding:utf-8--
+import os
+import json
+import random
+import threading
+
+import pytest
+
+from aomaker import runner
+from aomaker.metrics import Histogram, MetricsRegistry, METRICS_DIR, METRICS_JSON, metrics, reset_metrics, \
+    collect_metrics
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+def test_small_values_are_exact():
+    histogram = Histogram()
+    for us in range(128):
+        histogram.record(us / 1e6)
+    assert len(histogram.counts) == 128
+    assert all(Histogram._value(Histogram._index(us)) == us for us in range(128))
+
+
+@pytest.mark.parametrize("value", [128, 129, 1000, 4095, 65537, 10 ** 6, 123456789])
+def test_bucket_relative_error(value):
+    index = Histogram._index(value)
+    assert abs(Histogram._value(index) - value) / value <= 1 / 64
+    # 桶序号随取值单调递增
+    assert Histogram._index(value - 1) <= index <= Histogram._index(value + 1)
+
+
+def test_percentile_and_summary():
+    histogram = Histogram()
+    for ms in range(1, 101):
+        histogram.record(ms / 1000)
+    summary = histogram.summary()
+    assert summary["count"] == 100
+    assert summary["min"] == 1.0
+    assert summary["max"] == 100.0
+    assert summary["mean"] == 50.5
+    for p in (50, 90, 99):
+        assert summary[f"p{p}"] == pytest.approx(p, rel=1 / 64)
+    assert Histogram().summary() == {"count": 0}
+    assert Histogram().percentile(50) is None
+
+
+def test_merge_equals_recording_all():
+    values = [random.uniform(0, 2) for _ in range(500)]
+    left, right, whole = Histogram(), Histogram(), Histogram()
+    for i, value in enumerate(values):
+        (left if i % 2 else right).record(value)
+        whole.record(value)
+    left.merge(right)
+    assert left.to_dict() == whole.to_dict()
+    left.merge(Histogram())
+    assert left.to_dict() == whole.to_dict()
+
+
+def test_dict_round_trip_through_json():
+    histogram = Histogram()
+    for value in (0.001, 0.5, 3):
+        histogram.record(value)
+    restored = Histogram.from_dict(json.loads(json.dumps(histogram.to_dict())))
+    assert restored.to_dict() == histogram.to_dict()
+    assert restored.summary() == histogram.summary()
+
+
+def test_concurrent_dumps_then_collect_merges_processes():
+    errors = []
+
+    def record_and_dump(i):
+        try:
+            for _ in range(20):
+                metrics.record("JobApi.list_jobs", 200, total=0.01 * (i + 1))
+                metrics.dump()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=record_and_dump, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert sorted(os.listdir(METRICS_DIR)) == [f"{os.getpid()}.json"]
+    # 另一个worker进程写入的数据
+    other = MetricsRegistry()
+    other.record("JobApi.list_jobs", 200, total=0.5)
+    other.record("JobApi.get_job", 500, total=0.2)
+    with open(os.path.join(METRICS_DIR, "1.json"), "w", encoding="utf-8") as f:
+        json.dump(other.to_dict(), f)
+    summary = {(row["api"], row["status"]): row["count"] for row in collect_metrics()}
+    assert summary == {("JobApi.get_job", "500"): 1, ("JobApi.list_jobs", "200"): 161}
+    assert os.path.exists(METRICS_JSON)
+
+
+def test_thread_tasks_do_not_dump(monkeypatch):
+    dumps = []
+    monkeypatch.setattr(runner, "_get_pytest_ini", lambda: [])
+    monkeypatch.setattr(runner.pytest, "main", lambda *args, **kwargs: 0)
+    monkeypatch.setattr(metrics, "dump", lambda: dumps.append(1))
+    runner._task_of(runner.ThreadPoolExecutor)(["-q"])
+    assert dumps == []
+    runner._task_of(runner.Pool)(["-q"])
+    assert dumps == [1]
@@ -0,0 +1,77 @@
+# --coding:utf-8--
+import sqlite3
+
+import pytest
+
+from aomaker.database.migrations import migrate, get_version, LATEST_VERSION, _columns, _table_exists
+
+
+@pytest.fixture
+def connection(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / "old.db"))
+    yield connection
+    connection.close()
+
+
+def _create_base_tables(connection):
+    connection.executescript("""
+        create table config(key text,value text);
+        create table cache(var_name text,response text,worker text,api_info text);
+        create table schema(api_name text,schema text);
+    """)
+
+
+def test_skips_database_without_base_tables(connection):
+    migrate(connection)
+    assert get_version(connection) == 0
+
+
+def test_migrates_old_database_to_latest(connection):
+    _create_base_tables(connection)
+    connection.executemany("insert into cache values (?,?,?,?)", [
+        ("a", '"first"', "w1", None),
+        ("a", '"second"', "w1", None),
+        ("a", '"other worker"', "w2", None),
+    ])
+    connection.commit()
+    migrate(connection)
+    assert get_version(connection) == LATEST_VERSION
+    assert {"created_at", "size"} <= set(_columns(connection, "cache"))
+    # 重复数据保留最早写入的一行
+    rows = connection.execute("select worker,response,size from cache order by worker").fetchall()
+    assert rows == [("w1", '"first"', len('"first"')), ("w2", '"other worker"', len('"other worker"'))]
+    with pytest.raises(sqlite3.IntegrityError):
+        connection.execute("insert into cache (var_name,response,worker) values ('a','1','w1')")
+    assert _table_exists(connection, "duration")
+    assert _table_exists(connection, "result")
+
+
+def test_migrate_is_idempotent(connection):
+    _create_base_tables(connection)
+    migrate(connection)
+    migrate(connection)
+    assert get_version(connection) == LATEST_VERSION
+
+
+def test_migrate_resumes_from_recorded_version(connection):
+    _create_base_tables(connection)
+    connection.execute("alter table cache add column created_at real")
+    connection.execute("alter table cache add column size integer")
+    connection.execute("PRAGMA user_version=1")
+    connection.commit()
+    migrate(connection)
+    assert get_version(connection) == LATEST_VERSION
+    assert _table_exists(connection, "duration")
+    # v1未重复执行，没有建立唯一索引
+    indexes = [row[1] for row in connection.execute("PRAGMA index_list(cache)")]
+    assert indexes == []
+
+
+def test_upsert_on_migrated_cache_table(connection):
+    _create_base_tables(connection)
+    migrate(connection)
+    sql = """insert into cache (var_name,response,worker) values (?,?,?)
+             on conflict(var_name,worker) do update set response=excluded.response"""
+    connection.execute(sql, ("a", "1", "w"))
+    connection.execute(sql, ("a", "2", "w"))
+    assert connection.execute("select response from cache").fetchall() == [("2",)]
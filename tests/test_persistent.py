@@ -0,0 +1,145 @@
+# --coding:utf-8--
+import sys
+import queue
+
+import pytest
+
+from aomaker import persistent
+from aomaker.async_runner import AsyncRunnerPlugin
+from aomaker.persistent import PersistentSessionPlugin, preload, session_args
+
+RECORDER = """
+def record(event):
+    with open("events.log", "a") as f:
+        f.write(event + "\\n")
+"""
+
+MODULE_A = """
+import pytest
+from recorder import record
+
+
+@pytest.fixture(scope="module")
+def module_fx():
+    record("setup module a")
+    yield
+    record("teardown module a")
+
+
+def test_1(module_fx, session_fx):
+    record("run a::test_1")
+
+
+def test_2(module_fx, session_fx):
+    record("run a::test_2")
+
+
+def test_3(module_fx, session_fx):
+    record("run a::test_3")
+"""
+
+MODULE_B = """
+from recorder import record
+
+
+def test_4(session_fx):
+    record("run b::test_4")
+
+
+async def test_5():
+    record("run b::test_5")
+"""
+
+CONFTEST = """
+import pytest
+from recorder import record
+
+
+@pytest.fixture(scope="session")
+def session_fx():
+    record("setup session")
+    yield
+"""
+
+
+@pytest.fixture
+def project(pytester):
+    pytester.syspathinsert()
+    pytester.makepyfile(recorder=RECORDER, conftest=CONFTEST, test_persist_a=MODULE_A, test_persist_b=MODULE_B)
+    return pytester
+
+
+def _run(project, chunks, concurrency=0):
+    tasks = queue.Queue()
+    for chunk in chunks:
+        tasks.put(chunk)
+    tasks.put(None)
+    async_plugin = AsyncRunnerPlugin()
+    plugin = PersistentSessionPlugin(tasks, async_plugin)
+    args = session_args(chunks, ["-p", "no:cacheprovider", "--async-concurrency", str(concurrency)])
+    result = project.runpytest_inprocess(*args, plugins=[async_plugin, plugin])
+    events = (project.path / "events.log").read_text().splitlines()
+    return plugin, result, events
+
+
+CHUNKS = [
+    ["test_persist_a.py::test_1", "test_persist_a.py::test_2"],
+    ["test_persist_a.py::test_3", "test_persist_b.py::test_4"],
+]
+ASYNC_CHUNKS = [*CHUNKS, ["test_persist_b.py::test_5"]]
+
+
+def test_session_args_keeps_file_order():
+    assert session_args(CHUNKS, ["-m", "smoke"]) == ["test_persist_a.py", "test_persist_b.py", "-m", "smoke"]
+
+
+def test_chunks_run_in_one_session(project):
+    plugin, result, events = _run(project, CHUNKS)
+    result.assert_outcomes(passed=4)
+    assert plugin.executed == 4
+    # session/module级夹具跨批次只setup一次，模块a的最后一条用例执行后才teardown
+    assert events == ["setup session", "setup module a", "run a::test_1", "run a::test_2", "run a::test_3",
+                      "teardown module a", "run b::test_4"]
+
+
+def test_unknown_node_ids_are_skipped(project):
+    plugin, result, events = _run(project, [["test_persist_a.py::missing"], ["test_persist_b.py::test_4"]])
+    result.assert_outcomes(passed=1)
+    assert plugin.executed == 1
+    assert events == ["setup session", "run b::test_4"]
+
+
+def test_async_batches_in_persistent_session(project):
+    plugin, result, events = _run(project, ASYNC_CHUNKS, concurrency=4)
+    result.assert_outcomes(passed=5)
+    assert plugin.executed == 5
+    assert events.count("setup module a") == 1
+    assert events[-1] == "run b::test_5"
+
+
+def test_collect_only_does_not_take_chunks(project):
+    tasks = queue.Queue()
+    tasks.put(CHUNKS[0])
+    plugin = PersistentSessionPlugin(tasks)
+    project.runpytest_inprocess("--collect-only", "-p", "no:cacheprovider", plugins=[plugin])
+    assert plugin.executed == 0
+    assert tasks.qsize() == 1
+
+
+def test_preload_imports_modules_and_project_packages(tmp_path, monkeypatch):
+    package = tmp_path / "preload_apis"
+    (package / "sub").mkdir(parents=True)
+    (package / "__init__.py").write_text("")
+    (package / "sub" / "__init__.py").write_text("")
+    (package / "sub" / "job.py").write_text("VALUE = 1\n")
+    (package / "broken.py").write_text("raise ImportError('boom')\n")
+    monkeypatch.setattr(persistent, "BASEDIR", str(tmp_path))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    try:
+        loaded = preload(modules=["json", "no_such_module_xyz"], packages=["preload_apis", "missing_package"])
+        assert loaded == 4
+        assert "preload_apis.sub.job" in sys.modules
+        assert "preload_apis.broken" not in sys.modules
+    finally:
+        for name in [name for name in sys.modules if name.startswith("preload_apis")]:
+            del sys.modules[name]
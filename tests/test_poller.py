@@ -0,0 +1,190 @@
+# --coding:utf-8--
+import time
+import asyncio
+import threading
+
+import pytest
+
+from aomaker.aomaker import async_api
+from aomaker.exceptions import PollingTimeout
+from aomaker.extension.polling import Poller
+
+
+class Jobs:
+    """模拟异步任务：每个任务查询到第finish_after次时完成"""
+
+    def __init__(self, finish_after=1, delay=0.0):
+        self.finish_after = finish_after
+        self.delay = delay
+        self.calls = {}
+        self.batches = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def _hit(self, job_id):
+        with self.lock:
+            self.calls[job_id] = self.calls.get(job_id, 0) + 1
+            return self.calls[job_id]
+
+    def probe(self, job_id):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            count = self._hit(job_id)
+        finally:
+            with self.lock:
+                self.active -= 1
+        return f"done-{job_id}" if count >= self.finish_after else None
+
+    def batch_probe(self, job_ids):
+        self.batches.append(list(job_ids))
+        res = {}
+        for job_id in job_ids:
+            if self._hit(job_id) >= self.finish_after:
+                res[job_id] = f"done-{job_id}"
+        return res
+
+
+def test_single_id_returns_single_result():
+    jobs = Jobs()
+    assert Poller(jobs.probe)("a") == "done-a"
+
+
+def test_results_keep_job_order():
+    jobs = Jobs(finish_after=2)
+    poller = Poller(jobs.probe, interval=0.01, jitter=0)
+    assert poller(["c", "a", "b"]) == ["done-c", "done-a", "done-b"]
+    assert jobs.calls == {"a": 2, "b": 2, "c": 2}
+
+
+def test_empty_list_returns_empty_results():
+    jobs = Jobs()
+    assert Poller(jobs.probe)([]) == []
+    assert jobs.calls == {}
+
+
+def test_probes_run_concurrently():
+    jobs = Jobs(delay=0.2)
+    poller = Poller(jobs.probe, max_workers=5)
+    start = time.monotonic()
+    assert len(poller(list(range(5)))) == 5
+    # 串行查询至少需要1s
+    assert time.monotonic() - start < 0.8
+    assert jobs.max_active > 1
+
+
+def test_max_workers_limits_concurrency():
+    jobs = Jobs(delay=0.05)
+    Poller(jobs.probe, max_workers=2)(list(range(6)))
+    assert jobs.max_active <= 2
+
+
+def test_interval_backs_off_until_max_interval():
+    times = []
+
+    def probe(job_id):
+        times.append(time.monotonic())
+        return "done" if len(times) >= 4 else None
+
+    Poller(probe, interval=0.05, max_interval=0.1, backoff=2, jitter=0)("a")
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    # 间隔依次为0.05、0.1、0.1（不超过max_interval）
+    assert gaps[0] == pytest.approx(0.05, abs=0.03)
+    assert gaps[1] == pytest.approx(0.1, abs=0.03)
+    assert gaps[2] == pytest.approx(0.1, abs=0.03)
+
+
+def test_until_decides_when_job_is_done():
+    statuses = iter(["pending", "running", "successful"])
+
+    def probe(job_id):
+        return {"status": next(statuses)}
+
+    poller = Poller(probe, until=lambda res: res["status"] == "successful", interval=0.01)
+    assert poller("a") == {"status": "successful"}
+
+
+def test_batch_probe_splits_by_batch_size():
+    jobs = Jobs(finish_after=2)
+    poller = Poller(batch_probe=jobs.batch_probe, batch_size=2, interval=0.01)
+    assert poller(["a", "b", "c"]) == ["done-a", "done-b", "done-c"]
+    assert all(len(batch) <= 2 for batch in jobs.batches)
+    # 每个任务查询两次，每轮分成两批
+    assert len(jobs.batches) == 4
+
+
+def test_timeout_raises_with_partial_results():
+    def probe(job_id):
+        return "done" if job_id == "fast" else None
+
+    poller = Poller(probe, interval=0.01, timeout=0.2)
+    with pytest.raises(PollingTimeout) as exc_info:
+        poller(["fast", "slow"])
+    assert exc_info.value.pending == ["slow"]
+    assert exc_info.value.results == {"fast": "done"}
+    assert "slow" in str(exc_info.value)
+
+
+def test_probe_exception_propagates():
+    def probe(job_id):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        Poller(probe)("a")
+
+
+def test_requires_probe():
+    with pytest.raises(ValueError):
+        Poller()
+
+
+def test_apoll_with_coroutine_probe():
+    calls = {}
+
+    async def probe(job_id):
+        calls[job_id] = calls.get(job_id, 0) + 1
+        await asyncio.sleep(0.01)
+        return job_id * 2 if calls[job_id] >= 2 else None
+
+    poller = Poller(probe, interval=0.01)
+    assert asyncio.run(poller.apoll([1, 2, 3])) == [2, 4, 6]
+    assert asyncio.run(poller.apoll(5)) == 10
+
+
+def test_apoll_runs_sync_probe_in_executor():
+    jobs = Jobs(delay=0.2)
+    poller = Poller(jobs.probe, max_workers=4)
+    start = time.monotonic()
+    assert asyncio.run(poller.apoll(list(range(4)))) == [f"done-{i}" for i in range(4)]
+    assert time.monotonic() - start < 0.6
+
+
+def test_apoll_timeout():
+    async def probe(job_id):
+        return None
+
+    with pytest.raises(PollingTimeout):
+        asyncio.run(Poller(probe, interval=0.01, timeout=0.1).apoll(["a"]))
+
+
+def test_async_api_merges_poller_results():
+    jobs = Jobs()
+
+    @async_api(Poller(jobs.probe), "$.job_ids[*]", expr_index=":")
+    def run_jobs():
+        return {"ret_code": 0, "job_ids": ["a", "b"]}
+
+    assert run_jobs()["async_res"] == ["done-a", "done-b"]
+
+
+def test_async_api_awaits_poller_in_coroutine():
+    jobs = Jobs()
+
+    @async_api(Poller(jobs.probe), "$.job_id")
+    async def run_job():
+        return {"ret_code": 0, "job_id": "a"}
+
+    assert asyncio.run(run_job())["async_res"] == ["done-a"]
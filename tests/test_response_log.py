@@ -0,0 +1,127 @@
+# --coding:utf-8--
+import json
+
+import pytest
+
+from aomaker.log import logger
+from aomaker.cache import config
+from aomaker.base import base_api
+from aomaker.base.base_api import BaseApi
+
+
+class EchoApi(BaseApi):
+
+    def create(self, data):
+        """创建资源"""
+        return self.send_http({"api_path": "/create", "method": "post", "json": data})
+
+
+class _Response:
+    def __init__(self, content: bytes):
+        self.content = content
+        self.encoding = "utf-8"
+
+
+@pytest.fixture
+def messages():
+    """收集INFO及以上级别的日志内容"""
+    records = []
+    handler_id = logger.add(records.append, level="INFO", format="{message}")
+    yield records
+    logger.remove(handler_id)
+
+
+@pytest.fixture
+def render_count(monkeypatch):
+    """统计响应日志模板的渲染次数"""
+    counter = {"count": 0}
+    template = base_api._TEMPLATE
+
+    class _CountingTemplate:
+        def render(self, *args, **kwargs):
+            counter["count"] += 1
+            return template.render(*args, **kwargs)
+
+    monkeypatch.setattr(base_api, "_TEMPLATE", _CountingTemplate())
+    return counter
+
+
+def test_log_body_keeps_small_body():
+    body = {"a": 1}
+    assert base_api._log_body(_Response(b'{"a": 1}'), body, 8) is body
+
+
+def test_log_body_truncates_large_body():
+    content = b"x" * (base_api.LOG_BODY_MAX_LENGTH + 100)
+    text = base_api._log_body(_Response(content), "ignored", len(content))
+    assert text.startswith("x" * base_api.LOG_BODY_MAX_LENGTH)
+    assert text.endswith(f"(已截断，共{len(content)}字节)")
+
+
+def test_response_log_rendered_once_per_response(http_server, messages, render_count):
+    config.set("host", http_server)
+    EchoApi().create({"name": "a"})
+    assert render_count["count"] == 1
+    assert any("EchoApi.create 创建资源" in message for message in messages)
+
+
+def test_response_log_not_rendered_without_sink(http_server, monkeypatch, render_count):
+    config.set("host", http_server)
+    handle_print_info = base_api._handle_print_info
+
+    def below_every_sink(*args, **kwargs):
+        print_info, allure_info, _ = handle_print_info(*args, **kwargs)
+        # TRACE低于所有sink的级别
+        return print_info, allure_info, logger.opt(lazy=True).trace
+
+    monkeypatch.setattr(base_api, "_handle_print_info", below_every_sink)
+    EchoApi().create({"name": "a"})
+    assert render_count["count"] == 0
+
+
+def test_large_response_body_truncated_in_log(http_server, messages):
+    config.set("host", http_server)
+    EchoApi().create({"name": "x" * base_api.LOG_BODY_MAX_LENGTH})
+    assert any("已截断" in message for message in messages)
+
+
+def test_no_allure_attachment_without_alluredir(http_server, monkeypatch):
+    config.set("host", http_server)
+    attached = []
+    monkeypatch.setattr(base_api.allure, "attach", lambda *args, **kwargs: attached.append(args))
+    assert base_api._allure_enabled() is False
+    EchoApi().create({"name": "a"})
+    assert attached == []
+
+
+@pytest.fixture
+def attachments(monkeypatch):
+    records = []
+    monkeypatch.setattr(base_api.allure, "attach",
+                        lambda body, name=None, attachment_type=None: records.append((name, body)))
+    return records
+
+
+def test_small_body_attached_pretty(attachments):
+    base_api._attach_to_allure({"url": "/a"}, _Response(b""), {"k": 1}, 10, "Api.a")
+    name, body = attachments[0]
+    assert name == "Api.a"
+    assert "\n" in body
+    assert json.loads(body) == {"url": "/a", "response_body": {"k": 1}}
+
+
+def test_medium_body_attached_compact(attachments):
+    size = base_api.ALLURE_PRETTY_MAX_LENGTH + 1
+    base_api._attach_to_allure({"url": "/a"}, _Response(b""), {"k": 1}, size, "Api.a")
+    _, body = attachments[0]
+    assert "\n" not in body
+    assert json.loads(body)["response_body"] == {"k": 1}
+
+
+def test_huge_body_attached_as_raw_content(attachments):
+    size = base_api.ALLURE_RAW_BODY_MIN_LENGTH + 1
+    response = _Response(b'{"k": 1}')
+    base_api._attach_to_allure({"url": "/a"}, response, {"k": 1}, size, "Api.a")
+    assert [name for name, _ in attachments] == ["Api.a", "Api.a Response Body"]
+    assert "response_body" not in json.loads(attachments[0][1])
+    assert attachments[1][1] is response.content
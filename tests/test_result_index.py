@@ -0,0 +1,90 @@
+# --coding:utf-8--
+import json
+
+import pytest
+
+from aomaker.utils import gen_allure_report
+from aomaker.utils.gen_allure_report import ResultIndex, CaseDetail, get_case_durations, get_result_index
+
+
+def _result(name="test_a", full_name="tests.test_mod.TestA#test_a", status="passed", start=1000, stop=2000,
+            parameters=None, **extra) -> dict:
+    return {"name": name, "fullName": full_name, "status": status, "start": start, "stop": stop,
+            "parameters": parameters or [], "statusDetails": {"trace": None},
+            "labels": [{"name": "tag", "value": "smoke"}], **extra}
+
+
+@pytest.fixture
+def json_dir(tmp_path):
+    def write(*results):
+        for i, result in enumerate(results):
+            (tmp_path / f"{i}-{id(result)}-result.json").write_text(json.dumps(result), encoding="utf-8")
+        return str(tmp_path)
+
+    return write
+
+
+def test_retries_keep_last_execution(json_dir):
+    index = ResultIndex.load(json_dir(_result(status="failed", start=1000),
+                                      _result(status="passed", start=3000, stop=4000)))
+    assert [record["status"] for record in index.results] == ["passed"]
+
+
+def test_parameters_are_separate_results(json_dir):
+    index = ResultIndex.load(json_dir(_result(parameters=[{"name": "x", "value": "1"}]),
+                                      _result(parameters=[{"name": "x", "value": "2"}])))
+    assert len(index.results) == 2
+
+
+def test_results_without_full_name_are_not_merged(json_dir):
+    index = ResultIndex.load(json_dir(_result(full_name=None, uuid="u-1", status="failed"),
+                                      _result(full_name=None, uuid="u-2"),
+                                      _result(full_name=None)))
+    assert index.summary()["statistic"]["total"] == 3
+    assert index.summary()["statistic"]["failed"] == 1
+    assert len(CaseDetail(index).case_detail_info()) == 3
+
+
+def test_history_id_dedupes_retries_without_full_name(json_dir):
+    index = ResultIndex.load(json_dir(_result(full_name=None, historyId="h", uuid="u-1", status="failed"),
+                                      _result(full_name=None, historyId="h", uuid="u-2", start=5000, stop=6000),
+                                      _result(full_name=None, historyId="other", uuid="u-3")))
+    assert sorted(record["uuid"] for record in index.results) == ["u-2", "u-3"]
+
+
+def test_summary_statistic_and_time(json_dir):
+    index = ResultIndex.load(json_dir(_result(name="a", full_name="m#a", status="passed", start=1000, stop=2000),
+                                      _result(name="b", full_name="m#b", status="broken", start=1500, stop=4000),
+                                      _result(name="c", full_name="m#c", status="weird", start=None, stop=None)))
+    summary = index.summary()
+    assert summary["statistic"] == {"failed": 0, "broken": 1, "skipped": 0, "passed": 1, "unknown": 1, "total": 3}
+    assert summary["time"] == {"start": 1000, "stop": 4000, "duration": 3000}
+
+
+def test_unreadable_file_is_skipped(json_dir, tmp_path):
+    path = json_dir(_result())
+    (tmp_path / "broken-result.json").write_text("{", encoding="utf-8")
+    assert len(ResultIndex.load(path).results) == 1
+
+
+def test_case_durations_skip_results_without_full_name(json_dir):
+    index = ResultIndex.load(json_dir(_result(full_name="m#a", parameters=[{"name": "x", "value": "1"}]),
+                                      _result(full_name=None, uuid="u-1")))
+    assert get_case_durations(index) == {"m#a[x=1]": 1.0}
+
+
+def test_from_case_results_matches_allure_records():
+    rows = [{"name": "test_a", "full_name": "m#a", "status": "failed", "trace": "boom", "description": None,
+             "start": 1000, "stop": 1500, "case_id": "c", "parameters": [], "tags": ["smoke"]}]
+    index = ResultIndex.from_case_results(rows)
+    assert index.summary()["statistic"]["failed"] == 1
+    assert CaseDetail(index).case_detail_info()[0]["logs"] == "boom"
+
+
+def test_index_reused_until_files_change(json_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(gen_allure_report, "_index", None)
+    path = json_dir(_result())
+    first = get_result_index(path)
+    assert get_result_index(path) is first
+    (tmp_path / "new-result.json").write_text(json.dumps(_result(full_name="m#b")), encoding="utf-8")
+    assert len(get_result_index(path).results) == 2
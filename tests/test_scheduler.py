@@ -0,0 +1,183 @@
+# --coding:utf-8--
+import pytest
+
+from aomaker.cache import duration
+from aomaker.scheduler import (collect_task_groups, collected_tasks, collect_node_ids, estimate_durations, group_matcher,
+                               lpt_partition, make_chunks, plan_lpt, strip_path_args)
+
+TEST_MODULE = """
+import pytest
+
+@pytest.mark.demo
+def test_a():
+    pass
+
+@pytest.mark.smoke
+def test_b():
+    pass
+
+def test_c():
+    pass
+"""
+
+
+@pytest.fixture
+def project(pytester):
+    pytester.makepyfile(test_mod=TEST_MODULE)
+    pytester.makefile(".ini", pytest="[pytest]\nmarkers =\n    demo\n    smoke\n")
+    pytester.mkdir("tmp")
+    return pytester
+
+
+def test_strip_path_args_keeps_option_values():
+    args = ["--rootdir", "tests", "-c", "pytest.ini", "--html", "report.html", "-s", "tests"]
+    assert strip_path_args(args, ["tests"]) == ["--rootdir", "tests", "-c", "pytest.ini", "--html", "report.html",
+                                                "-s"]
+
+
+def test_strip_path_args_removes_node_ids():
+    assert strip_path_args(["tests/test_a.py::test_x", "-q"], ["tests/test_a.py::test_x"]) == ["-q"]
+
+
+def test_collect_task_groups_by_mark(project):
+    option_args = []
+    groups = collect_task_groups(["-m demo", "-m smoke or demo"], ["-p", "no:cacheprovider", "test_mod.py"],
+                                 option_args=option_args)
+    assert groups == {"-m demo": ["test_mod.py::test_a"], "-m smoke or demo": ["test_mod.py::test_b"]}
+    assert option_args == ["-p", "no:cacheprovider"]
+
+
+def test_collect_task_groups_keeps_option_values_that_are_paths(project):
+    option_args = []
+    extra_args = ["-c", "pytest.ini", "--rootdir", ".", "--basetemp", "tmp", "test_mod.py"]
+    groups = collect_task_groups(["-m demo"], extra_args, option_args=option_args)
+    assert groups == {"-m demo": ["test_mod.py::test_a"]}
+    assert option_args == ["-c", "pytest.ini", "--rootdir", ".", "--basetemp", "tmp"]
+
+
+def test_collect_task_groups_by_path(project):
+    project.mkpydir("suite")
+    project.path.joinpath("suite", "test_s.py").write_text("def test_s():\n    pass\n")
+    option_args = []
+    groups = collect_task_groups(["suite"], ["-q"], option_args=option_args)
+    assert groups == {"suite": ["suite/test_s.py::test_s"]}
+    assert option_args == ["-q"]
+
+
+def test_collected_tasks_skip_empty_groups(project):
+    tasks = collected_tasks(["-m demo", "-m missing"], ["-q", "test_mod.py"])
+    assert tasks == [["test_mod.py::test_a", "-q"]]
+
+
+def test_make_chunks_does_not_cross_groups():
+    groups = {"small": ["s1"], "big": ["b1", "b2", "b3"]}
+    assert make_chunks(groups, chunk_size=2) == [["b1", "b2"], ["b3"], ["s1"]]
+    assert make_chunks(groups, chunk_size=0) == [["b1"], ["b2"], ["b3"], ["s1"]]
+
+
+def test_lpt_partition_balances_load_and_keeps_collection_order():
+    estimates = {"a": 1.0, "b": 5.0, "c": 3.0, "d": 3.0, "e": 2.0}
+    partitions = lpt_partition(estimates, 2)
+    assert sorted(load for load, _ in partitions) == [7.0, 7.0]
+    for _, node_ids in partitions:
+        assert node_ids == sorted(node_ids)
+    assert sorted(n for _, ids in partitions for n in ids) == list("abcde")
+
+
+def test_lpt_partition_drops_empty_workers():
+    assert lpt_partition({"a": 1.0}, 3) == [(1.0, ["a"])]
+
+
+def test_duration_record_many_uses_moving_average():
+    duration.clear()
+    duration.record_many({"case": 2.0})
+    duration.record_many({"case": 4.0})
+    assert duration.get_many(["case", "missing"]) == {"case": 3.0}
+
+
+def test_estimate_durations_uses_median_for_unknown_cases():
+    duration.clear()
+    duration.record_many({"k1": 1.0, "k2": 3.0, "k3": 8.0})
+    keys = {"n1": "k1", "n2": "k2", "n3": "k3", "n4": "k4"}
+    assert estimate_durations(list(keys), keys) == {"n1": 1.0, "n2": 3.0, "n3": 8.0, "n4": 3.0}
+
+
+def test_plan_lpt_uses_recorded_durations(project):
+    duration.clear()
+    duration_keys = {}
+    collect_node_ids(["test_mod.py"], duration_keys)
+    duration.record_many({duration_keys["test_mod.py::test_a"]: 10.0,
+                          duration_keys["test_mod.py::test_b"]: 1.0,
+                          duration_keys["test_mod.py::test_c"]: 1.0})
+    option_args = []
+    partitions = plan_lpt(["test_mod.py"], ["-q"], 2, option_args)
+    assert partitions == [(10.0, ["test_mod.py::test_a"]), (2.0, ["test_mod.py::test_b", "test_mod.py::test_c"])]
+    assert option_args == ["-q"]
+
+
+MARKED_MODULE = """
+import pytest
+
+@pytest.mark.demo
+@pytest.mark.slow
+def test_demo_slow():
+    pass
+
+@pytest.mark.demo
+def test_demo():
+    pass
+
+@pytest.mark.smoke
+class TestSmoke:
+    def test_in_class(self):
+        pass
+
+@pytest.mark.parametrize("x", [1, pytest.param(2, marks=pytest.mark.slow)])
+def test_param(x):
+    pass
+"""
+
+
+@pytest.fixture
+def marked_items(pytester):
+    pytester.makepyfile(test_marked=MARKED_MODULE)
+    items, _ = pytester.inline_genitems("-p", "no:cacheprovider")
+    return items
+
+
+@pytest.mark.parametrize("task_arg, expected", [
+    ("-m demo", ["test_demo_slow", "test_demo"]),
+    ("-mdemo", ["test_demo_slow", "test_demo"]),
+    ("-m demo and not slow", ["test_demo"]),
+    ("-m (demo or smoke) and not slow", ["test_demo", "test_in_class"]),
+    ("-m slow", ["test_demo_slow", "test_param[2]"]),
+    ("-m not demo and not smoke", ["test_param[1]", "test_param[2]"]),
+    ("-m missing", []),
+])
+def test_group_matcher_mark_expressions(marked_items, task_arg, expected):
+    match = group_matcher(task_arg)
+    assert [item.name for item in marked_items if match(item)] == expected
+
+
+def test_group_matcher_invalid_expression_returns_none():
+    assert group_matcher("-m demo and") is None
+    assert group_matcher("-m (demo") is None
+
+
+def test_group_matcher_path_does_not_match_sibling_prefix(pytester):
+    pytester.mkpydir("suite")
+    pytester.mkpydir("suite2")
+    pytester.path.joinpath("suite", "test_a.py").write_text("def test_a():\n    pass\n")
+    pytester.path.joinpath("suite2", "test_b.py").write_text("def test_b():\n    pass\n")
+    items, _ = pytester.inline_genitems("-p", "no:cacheprovider")
+    match = group_matcher("suite")
+    assert [item.name for item in items if match(item)] == ["test_a"]
+
+
+def test_invalid_expression_falls_back_to_per_group_collection(project):
+    option_args = []
+    groups = collect_task_groups(["-m demo", "-m smoke and"], ["-p", "no:cacheprovider", "test_mod.py"],
+                                 option_args=option_args)
+    # 表达式无法解析的分组不分发任何用例（pytest未筛选的全部用例）
+    assert groups == {"-m demo": ["test_mod.py::test_a"], "-m smoke and": []}
+    assert option_args == ["-p", "no:cacheprovider"]
@@ -0,0 +1,146 @@
+# --coding:utf-8--
+import os
+import time
+import sqlite3
+import threading
+import multiprocessing
+
+import pytest
+from genson import SchemaBuilder
+
+from aomaker import schema_capture
+from aomaker.cache import schema
+from aomaker.schema_capture import SchemaCapture, shape_hash, LIST_SAMPLE_SIZE
+
+
+@pytest.fixture
+def capture():
+    return SchemaCapture()
+
+
+def test_shape_ignores_values():
+    assert shape_hash({"a": 1, "b": ["x"]}) == shape_hash({"b": ["y", "z"], "a": 2})
+
+
+def test_shape_tells_types_and_keys_apart():
+    assert shape_hash({"a": 1}) != shape_hash({"a": "1"})
+    assert shape_hash({"a": 1}) != shape_hash({"b": 1})
+    assert shape_hash({"a": 1}) != shape_hash({"a": 1.5})
+    assert shape_hash({"a": [1]}) != shape_hash({"a": [{"b": 1}]})
+
+
+def test_large_list_shape_is_sampled():
+    items = [{"a": 1}] * (LIST_SAMPLE_SIZE * 10)
+    assert shape_hash(items) == shape_hash([{"a": 1}])
+    # 首尾元素总会被抽到
+    assert shape_hash(items + [{"b": 1}]) != shape_hash(items)
+
+
+def test_first_response_is_stored(capture):
+    assert capture.capture("list_jobs", {"total": 1}) is True
+    assert schema.get("list_jobs")["properties"] == {"total": {"type": "integer"}}
+
+
+def test_same_shape_is_skipped(capture):
+    capture.capture("list_jobs", {"total": 1})
+    assert capture.capture("list_jobs", {"total": 2}) is False
+    assert capture.skipped == 1
+    assert capture.merged == 1
+
+
+def test_new_shape_is_merged_into_stored_schema(capture):
+    capture.capture("list_jobs", {"total": 1})
+    assert capture.capture("list_jobs", {"total": 1, "items": ["a"]}) is True
+    stored = schema.get("list_jobs")
+    assert set(stored["properties"]) == {"total", "items"}
+    # 只在部分响应中出现的字段不是必填
+    assert stored["required"] == ["total"]
+
+
+def test_merge_with_existing_schema_from_previous_run(capture):
+    schema.set("list_jobs", {"$schema": "http://json-schema.org/schema#", "type": "object",
+                             "properties": {"old": {"type": "string"}}, "required": ["old"]})
+    capture.capture("list_jobs", {"new": 1})
+    assert set(schema.get("list_jobs")["properties"]) == {"old", "new"}
+
+
+def test_new_shape_with_same_schema_is_not_written(capture, monkeypatch):
+    capture.capture("list_jobs", {"items": [1]})
+    writes = []
+    monkeypatch.setattr(schema, "update", lambda *args: writes.append(args))
+    # 指纹不同（空列表），但合并后的schema不变
+    assert capture.capture("list_jobs", {"items": []}) is False
+    assert writes == []
+
+
+def test_sample_rate_zero_only_captures_first_response(capture):
+    assert capture.capture("list_jobs", {"a": 1}, sample_rate=0) is True
+    assert capture.capture("list_jobs", {"b": 1}, sample_rate=0) is False
+    assert "b" not in schema.get("list_jobs")["properties"]
+
+
+def test_apis_are_tracked_separately(capture):
+    capture.capture("list_jobs", {"a": 1})
+    assert capture.capture("list_users", {"a": 1}) is True
+
+
+def test_reset_forgets_fingerprints(capture):
+    capture.capture("list_jobs", {"a": 1})
+    capture.reset()
+    schema.clear()
+    assert capture.capture("list_jobs", {"a": 1}) is True
+
+
+@pytest.fixture
+def slow_merge(monkeypatch):
+    """拉长读取schema到写回之间的耗时，使并发的合并必然重叠"""
+
+    class SlowBuilder(SchemaBuilder):
+        def to_schema(self):
+            time.sleep(0.05)
+            return super().to_schema()
+
+    monkeypatch.setattr(schema_capture, "SchemaBuilder", SlowBuilder)
+
+
+def test_concurrent_captures_of_different_shapes_are_all_merged(capture, slow_merge):
+    capture.capture("list_jobs", {"base": 1})
+    threads = [threading.Thread(target=capture.capture, args=("list_jobs", {"base": 1, f"f{i}": 1}))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert set(schema.get("list_jobs")["properties"]) == {"base", *(f"f{i}" for i in range(8))}
+
+
+def _capture_in_child(field):
+    # 子进程有独立的指纹记录，只能依靠数据库事务串行合并
+    SchemaCapture().capture("list_jobs", {"base": 1, field: 1})
+    os._exit(0)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要fork")
+def test_captures_from_forked_workers_are_all_merged(capture, slow_merge):
+    capture.capture("list_jobs", {"base": 1})
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=_capture_in_child, args=(f"p{i}",)) for i in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert [process.exitcode for process in processes] == [0] * 4
+    schema.tier.clear()
+    assert set(schema.get("list_jobs")["properties"]) == {"base", "p0", "p1", "p2", "p3"}
+
+
+def test_failed_merge_forgets_fingerprint(capture, monkeypatch):
+    def broken(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(schema, "update", broken)
+    with pytest.raises(sqlite3.OperationalError):
+        capture.capture("list_jobs", {"a": 1})
+    monkeypatch.undo()
+    assert capture.capture("list_jobs", {"a": 1}) is True
+    assert schema.get("list_jobs")["properties"] == {"a": {"type": "integer"}}
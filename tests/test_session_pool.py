@@ -0,0 +1,96 @@
+# --coding:utf-8--
+import threading
+
+from aomaker.cache import config
+from aomaker.base.base_api import BaseApi
+from aomaker.base import session_pool as session_pool_module
+from aomaker.base.session_pool import SessionPool, session_pool
+
+
+class EchoApi(BaseApi):
+
+    def echo(self, headers=None):
+        http_data = {"api_path": "/echo", "method": "get"}
+        if headers:
+            http_data["headers"] = headers
+        return self.send_http(http_data)
+
+
+def test_requests_reuse_keep_alive_connection(http_server):
+    config.set("host", http_server)
+    session_pool.close()
+    connections = {EchoApi().echo()["connection"] for _ in range(5)}
+    assert len(connections) == 1
+
+
+def test_each_thread_has_own_session(http_server):
+    pool = SessionPool()
+    sessions = {}
+
+    def worker(name):
+        sessions[name] = (pool.get_session(http_server + "/a"), pool.get_session(http_server + "/b"))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(first is second for first, second in sessions.values())
+    assert len({id(first) for first, _ in sessions.values()}) == 3
+    pool.close()
+
+
+def test_host_mounted_once_per_session(http_server):
+    pool = SessionPool()
+    session = pool.get_session(http_server + "/a")
+    adapters = dict(session.adapters)
+    pool.get_session(http_server + "/b")
+    assert dict(session.adapters) == adapters
+    assert f"{http_server}/" in adapters
+    pool.close()
+
+
+def test_cookies_are_not_kept_between_requests(http_server):
+    pool = SessionPool()
+    session = pool.get_session(http_server)
+    session.get(http_server + "/login", headers={"X-Set-Cookie": "sid=1; Path=/"})
+    assert "Cookie" not in session.get(http_server + "/echo").json()["headers"]
+    pool.close()
+
+
+def test_close_creates_new_session_on_next_use(http_server):
+    pool = SessionPool()
+    first = pool.get_session(http_server)
+    pool.close()
+    assert pool.get_session(http_server) is not first
+    pool.close()
+
+
+def test_recycled_thread_ident_closes_previous_session(http_server, monkeypatch):
+    pool = SessionPool()
+    # 模拟线程结束后ident被新线程复用
+    get_ident = threading.get_ident
+    workers = threading.local()
+    monkeypatch.setattr(session_pool_module.threading, "get_ident",
+                        lambda: 1 if getattr(workers, "recycled", False) else get_ident())
+    sessions = []
+
+    def worker():
+        workers.recycled = True
+        try:
+            session = pool.get_session(http_server)
+            session.get(http_server + "/echo")
+            sessions.append(session)
+        finally:
+            workers.recycled = False
+
+    for _ in range(2):
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+    first, second = sessions
+    assert first is not second
+    # 旧Session的连接池已释放
+    assert all(not adapter.poolmanager.pools for adapter in first.adapters.values())
+    assert any(adapter.poolmanager.pools for adapter in second.adapters.values())
+    pool.close()
@@ -0,0 +1,119 @@
+# --coding:utf-8--
+import os
+import struct
+import multiprocessing
+from multiprocessing import shared_memory
+
+import pytest
+
+from aomaker import snapshot as snapshot_module
+from aomaker.cache import config, cache
+from aomaker.snapshot import SessionSnapshot, session_snapshot, ENV_NAME, MIN_CAPACITY
+
+
+@pytest.fixture
+def snapshot():
+    """每条用例使用独立的快照，结束时释放共享内存"""
+    session_snapshot.close()
+    snap = SessionSnapshot()
+    yield snap
+    snap.close()
+    os.environ.pop(ENV_NAME, None)
+
+
+def _exists(name: str) -> bool:
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    shm.close()
+    return True
+
+
+def test_publish_and_get(snapshot):
+    snapshot.publish(config_data={"host": "http://a"}, headers={"token": "t"})
+    current = snapshot.get()
+    assert current.config == {"host": "http://a"}
+    assert current.headers == {"token": "t"}
+    assert os.environ[ENV_NAME] == snapshot._shm.name
+
+
+def test_unchanged_version_returns_cached_snapshot(snapshot):
+    snapshot.publish(config_data={"a": 1}, headers={})
+    assert snapshot.get() is snapshot.get()
+
+
+def test_refresh_reads_config_and_shared_headers(snapshot):
+    snapshot.publish(config_data={}, headers={})
+    config.set("host", "http://b")
+    cache.set_shared("headers", {"token": "new"})
+    current = snapshot.refresh()
+    assert current.config["host"] == "http://b"
+    assert current.headers == {"token": "new"}
+
+
+def test_not_published_returns_none(snapshot):
+    os.environ.pop(ENV_NAME, None)
+    assert snapshot.get() is None
+    assert snapshot.refresh() is None
+
+
+def test_reader_gives_up_on_dead_writer(snapshot, monkeypatch):
+    snapshot.publish(config_data={"a": 1}, headers={})
+    # 模拟写入方在写入中途退出：版本号停在奇数
+    version = struct.unpack_from("Q", snapshot._shm.buf, 0)[0]
+    struct.pack_into("Q", snapshot._shm.buf, 0, version + 1)
+    monkeypatch.setattr(snapshot_module, "READ_TIMEOUT", 0.05)
+    reader = SessionSnapshot()
+    assert reader.get() is None
+    assert not reader.published
+
+
+def test_writer_recovers_from_odd_version(snapshot):
+    snapshot.publish(config_data={"a": 1}, headers={})
+    struct.pack_into("Q", snapshot._shm.buf, 0, 5)
+    SessionSnapshot._write_to(snapshot._shm, b'{"config": {"a": 2}}')
+    version = struct.unpack_from("Q", snapshot._shm.buf, 0)[0]
+    assert version == 8
+    assert SessionSnapshot().get().config == {"a": 2}
+
+
+def test_large_payload_moves_to_bigger_block(snapshot):
+    snapshot.publish(config_data={}, headers={})
+    first = snapshot._shm.name
+    big = {"blob": "x" * MIN_CAPACITY}
+    snapshot.refresh(config_data=big, headers={})
+    assert snapshot._shm.name != first
+    # 仍持有旧共享内存名称的读取方跟随迁移记录切换
+    reader = SessionSnapshot()
+    reader._switch(first)
+    assert reader.get().config == big
+    names = [shm.name for shm in snapshot._owned]
+    snapshot.close()
+    assert not any(_exists(name) for name in names)
+
+
+def _grow_in_child(size):
+    session_snapshot.refresh(config_data={"blob": "x" * size}, headers={})
+    os._exit(0)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要fork")
+def test_blocks_created_by_worker_are_unlinked_by_owner():
+    session_snapshot.close()
+    try:
+        session_snapshot.publish(config_data={}, headers={})
+        first = session_snapshot._shm.name
+        process = multiprocessing.get_context("fork").Process(target=_grow_in_child, args=(MIN_CAPACITY,))
+        process.start()
+        process.join()
+        assert process.exitcode == 0
+        # 主进程读取时跟随worker创建的新共享内存
+        assert len(session_snapshot.get().config["blob"]) == MIN_CAPACITY
+        moved = session_snapshot._shm.name
+        assert moved != first
+        assert moved not in {shm.name for shm in session_snapshot._owned}
+    finally:
+        session_snapshot.close()
+    assert not _exists(first)
+    assert not _exists(moved)
@@ -0,0 +1,102 @@
+# --coding:utf-8--
+import sqlite3
+import threading
+
+import pytest
+
+from aomaker.cache import cache, config, schema
+from aomaker.database import sqlite
+from aomaker.database.sqlite import SQLiteDB, retry_on_busy
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = SQLiteDB(str(tmp_path / "test.db"))
+    db.execute_sql("create table kv(key text primary key,value text)")
+    yield db
+    db.close_all()
+
+
+def _in_thread(func):
+    result = {}
+    thread = threading.Thread(target=lambda: result.setdefault("value", func()))
+    thread.start()
+    thread.join()
+    return result["value"]
+
+
+def test_connection_per_thread_in_wal_mode(db):
+    main_connection = db.connection
+    assert db.connection is main_connection
+    assert _in_thread(lambda: db.connection) is not main_connection
+    assert db.query_sql("PRAGMA journal_mode")[0][0] == "wal"
+
+
+def test_tables_on_same_file_share_connection_manager():
+    assert cache.connection_manager is config.connection_manager is schema.connection_manager
+
+
+def test_close_only_closes_current_thread_connection(db):
+    ready, closed = threading.Event(), threading.Event()
+    result = {}
+
+    def worker():
+        db.execute_sql("insert into kv values ('a','1')")
+        ready.set()
+        closed.wait()
+        result["rows"] = db.query_sql("select value from kv where key='a'")
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    ready.wait()
+    connection = db.connection
+    db.close()
+    closed.set()
+    thread.join()
+    assert result["rows"] == [("1",)]
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.execute("select 1")
+    # 关闭后再次使用时重新建立连接
+    assert db.query_sql("select count(*) from kv") == [(1,)]
+
+
+def test_close_all_closes_every_thread_connection(db):
+    connection = _in_thread(lambda: db.connection)
+    db.close_all()
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.execute("select 1")
+
+
+def test_concurrent_writes_from_threads(db):
+    def worker(n):
+        for i in range(50):
+            db.execute_sql("insert into kv values (?,?)", (f"{n}-{i}", str(i)))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert db.query_sql("select count(*) from kv") == [(400,)]
+
+
+def test_retry_on_busy(monkeypatch):
+    monkeypatch.setattr(sqlite, "BUSY_RETRY_INTERVAL", 0)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise sqlite3.OperationalError("database is locked")
+        return "ok"
+
+    assert retry_on_busy(flaky) == "ok"
+    assert len(calls) == 3
+
+
+def test_retry_on_busy_reraises_other_errors():
+    def broken():
+        raise sqlite3.OperationalError("no such table: foo")
+
+    with pytest.raises(sqlite3.OperationalError, match="no such table"):
+        retry_on_busy(broken)
@@ -0,0 +1,94 @@
+# --coding:utf-8--
+import json
+import sqlite3
+
+import pytest
+
+from aomaker.cache import schema
+from aomaker.database.sqlite import DB_PATH
+from aomaker.exceptions import SchemaNotFound
+from aomaker.base import base_testcase
+from aomaker.base.base_testcase import BaseTestcase
+
+JOB_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-07/schema#",
+    "type": "object",
+    "properties": {"id": {"type": "integer"}, "name": {"type": "string"}},
+    "required": ["id"],
+}
+
+
+@pytest.fixture(autouse=True)
+def job_schema():
+    schema.set("job", JOB_SCHEMA)
+    yield
+    base_testcase._validator_cache._validators.clear()
+
+
+def test_valid_instance_passes():
+    BaseTestcase.assert_schema({"id": 1, "name": "a"}, "job")
+
+
+def test_invalid_instance_raises():
+    with pytest.raises(AssertionError):
+        BaseTestcase.assert_schema({"name": "a"}, "job")
+
+
+def test_missing_schema_raises():
+    with pytest.raises(SchemaNotFound):
+        BaseTestcase.assert_schema({}, "missing")
+
+
+def test_validator_compiled_once():
+    first = base_testcase._get_validator("job")
+    BaseTestcase.assert_schema({"id": 1}, "job")
+    assert base_testcase._get_validator("job") is first
+
+
+def test_validator_rebuilt_after_schema_update():
+    first = base_testcase._get_validator("job")
+    schema.update("job", {**JOB_SCHEMA, "required": ["id", "name"]})
+    assert base_testcase._get_validator("job") is not first
+    with pytest.raises(AssertionError):
+        BaseTestcase.assert_schema({"id": 1}, "job")
+
+
+def test_validator_rebuilt_after_other_connection_commits():
+    BaseTestcase.assert_schema({"id": 1}, "job")
+    # 模拟其它进程修改schema表
+    connection = sqlite3.connect(DB_PATH)
+    connection.execute("update schema set schema=? where api_name='job'",
+                       (json.dumps({**JOB_SCHEMA, "required": ["name"]}),))
+    connection.commit()
+    connection.close()
+    with pytest.raises(AssertionError):
+        BaseTestcase.assert_schema({"id": 1}, "job")
+
+
+def test_removed_schema_drops_validator():
+    base_testcase._get_validator("job")
+    schema.clear()
+    with pytest.raises(SchemaNotFound):
+        BaseTestcase.assert_schema({"id": 1}, "job")
+    assert "job" not in base_testcase._validator_cache._validators
+
+
+def test_invalid_schema_rejected():
+    schema.set("broken", {"type": "no-such-type"})
+    with pytest.raises(Exception, match="no-such-type"):
+        BaseTestcase.assert_schema({}, "broken")
+
+
+def test_assert_schema_many_passes():
+    BaseTestcase.assert_schema_many([{"id": 1}, {"id": 2, "name": "b"}], "job")
+
+
+def test_assert_schema_many_reports_every_error():
+    instances = [{"id": 1}, {"name": 1}, {"id": "x"}]
+    with pytest.raises(AssertionError) as exc_info:
+        BaseTestcase.assert_schema_many(instances, "job")
+    msg = str(exc_info.value)
+    assert "错误数：3" in msg
+    assert "[1]: 'id' is a required property" in msg
+    assert "[1].name: 1 is not of type 'string'" in msg
+    assert "[2].id: 'x' is not of type 'integer'" in msg